@@ -8,7 +8,7 @@
 支持手动执行和定时扫描，可视化展示对比结果。
 
 Author: Senior Developer
-Version: 2.7.0
+Version: 2.11.2
 """
 
 import json
@@ -17,7 +17,6 @@ import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pytz
 
@@ -37,23 +36,29 @@ def _now() -> datetime:
 from .quality import (
     parse_quality,
     parse_season_episode,
+    build_quality,
+    builtin_rules_hash,
+    SEASON_EPISODE_FIELDS,
     parse_custom_rules,
     read_tier_scores,
     format_file_size,
     get_patterns,
     SCORE_PROFILES,
-    TARGET_EXTENSIONS,
 )
 from .scanner import (
     resolve_scan_directories,
     collect_target_files,
+    scan_target_files,
     guess_media_title,
     guess_media_year,
     parse_tmdb_id,
+    media_group_key,
     group_by_media,
     compare_and_rank,
     make_version_entry,
 )
+from .scanindex import IndexEntry, ScanIndex, make_rules_key
+from .parsepool import PARSE_BACKENDS, parse_paths
 from .cleaner import execute_cleanup
 from .ui import build_form, build_page
 from .api import send_scan_notification, build_status_text
@@ -86,7 +91,7 @@ class MediaBoardWash(_PluginBase):
     plugin_name = "影视洗版"
     plugin_desc = "扫描 .strm/视频文件，从文件名解析质量信息，去重留优。适用于云盘挂载后清理重复.strm文件。"
     plugin_icon = "mdi-filmstrip-box-multiple"
-    plugin_version = "2.7.0"
+    plugin_version = "2.11.2"
     plugin_author = "Senior Developer"
     author_url = "https://github.com/"
     plugin_config_prefix = "mediaboardwash_"
@@ -107,6 +112,7 @@ class MediaBoardWash(_PluginBase):
     _keep_mode: str = "top_n"  # v2.4.0: 多版本保留策略
     _min_score: int = 0  # 最低保留分数，低于此值强制删除
     _scan_mode: str = "manual"
+    _parse_backend: str = "thread"  # 文件名解析方式: thread / process
 
     # 自定义评分权重
     _res_weight: float = 40.0
@@ -149,6 +155,9 @@ class MediaBoardWash(_PluginBase):
             self._trigger_cleanup = config.get("trigger_cleanup", False)
             self._auto_cleanup = config.get("auto_cleanup", False)
             self._score_profile = config.get("score_profile", "custom")
+            self._parse_backend = config.get("parse_backend") or "thread"
+            if self._parse_backend not in PARSE_BACKENDS:
+                self._parse_backend = "thread"
 
             # 读取自定义评分权重
             self._res_weight = _safe_float(config.get("res_weight"), 40.0)
@@ -262,6 +271,7 @@ class MediaBoardWash(_PluginBase):
             "vid_weight": self._vid_weight,
             "bonus_weight": self._bonus_weight,
             "score_profile": self._score_profile,
+            "parse_backend": self._parse_backend,
             "custom_rules": self._custom_rules_raw,
         }
 
@@ -288,6 +298,13 @@ class MediaBoardWash(_PluginBase):
             bonus_weight=self._bonus_weight,
         )
 
+    def _quality_rules_key(self) -> str:
+        """当前解析规则指纹（自定义规则 + 评分权重 + 内置规则 + 插件版本），用于判断扫描索引中的解析结果是否仍然有效"""
+        return make_rules_key(self._custom_rules, (
+            self._res_weight, self._src_weight, self._aud_weight,
+            self._hdr_weight, self._vid_weight, self._bonus_weight,
+        ), builtin_rules_hash(), self.plugin_version)
+
     def _parse_season_episode(self, filename: str) -> Dict[str, Any]:
         """从文件名解析季/集信息（委托至 quality.parse_season_episode）"""
         return parse_season_episode(filename)
@@ -326,8 +343,8 @@ class MediaBoardWash(_PluginBase):
         return parse_tmdb_id(file_path)
 
     @staticmethod
-    def _group_by_media(items: List[Dict]) -> Dict[str, List[Dict]]:
-        return group_by_media(items)
+    def _group_by_media(items: List[Dict], keys: Optional[List[Optional[str]]] = None) -> Dict[str, List[Dict]]:
+        return group_by_media(items, keys)
 
     def _compare_and_rank(self, groups: Dict[str, List[Dict]]) -> Dict[str, Any]:
         return compare_and_rank(groups, self._keep_count, self._min_score, self._keep_mode)
@@ -365,14 +382,17 @@ class MediaBoardWash(_PluginBase):
         directory: Path,
         dir_index: int,
         total_dirs: int,
+        scan_index: Optional[ScanIndex] = None,
     ) -> Tuple[Dict[str, Any], int]:
         """
         v2.7.0: 处理单个目录：扫描→解析→分组→排名，返回仅含重复项的结果。
+        传入扫描索引时，大小/mtime/inode 与解析规则均未变化的文件直接复用索引中的解析结果。
 
         Args:
             directory: 要处理的目录路径
             dir_index: 当前目录索引（0-based）
             total_dirs: 总目录数
+            scan_index: 增量扫描索引（可选）
 
         Returns:
             (该目录的重复项 results, 该目录的总文件数)
@@ -380,25 +400,10 @@ class MediaBoardWash(_PluginBase):
         dir_name = directory.name
         self._set_progress(dir_index, total_dirs, f"处理目录 {dir_index + 1}/{total_dirs}: {dir_name}...")
 
-        # 1. 扫描该目录文件
+        # 1. 扫描该目录文件（scandir 遍历，每个文件只 stat 一次）
         min_bytes = self._min_size * 1024 * 1024
-        dir_files = []
         try:
-            for root, _, files in os.walk(directory):
-                root_path = Path(root)
-                for f in files:
-                    file_path = root_path / f
-                    ext = file_path.suffix.lower()
-                    if ext not in TARGET_EXTENSIONS:
-                        continue
-                    if ext == ".strm":
-                        dir_files.append(file_path)
-                        continue
-                    try:
-                        if file_path.stat().st_size >= min_bytes:
-                            dir_files.append(file_path)
-                    except OSError:
-                        logger.debug(f"影视洗版: 无法读取文件信息: {file_path}")
+            dir_files = scan_target_files(directory, min_bytes)
         except PermissionError:
             logger.warning(f"影视洗版: 无权限访问目录 {directory}")
             return {}, 0
@@ -406,52 +411,85 @@ class MediaBoardWash(_PluginBase):
             logger.warning(f"影视洗版: 扫描目录 {directory} 出错: {str(e)}")
             return {}, 0
 
+        # 2. 与扫描索引比对：未变化的文件复用解析结果，已消失的文件从索引中删除
+        index_root = str(directory)
+        indexed: Dict[str, IndexEntry] = {}
+        if scan_index:
+            try:
+                indexed = scan_index.load(index_root)
+            except Exception as e:
+                logger.warning(f"影视洗版: 读取扫描索引失败，本次全量解析: {str(e)}")
+        rules_key = self._quality_rules_key()
+        entries: Dict[str, IndexEntry] = {}
+        to_parse: List[Tuple[Path, os.stat_result]] = []
+        for file_path, st in dir_files:
+            path = str(file_path)
+            cached = indexed.get(path)
+            if (cached and cached.size == st.st_size and cached.mtime_ns == st.st_mtime_ns
+                    and cached.inode == st.st_ino and cached.rules_key == rules_key):
+                entries[path] = cached
+            else:
+                to_parse.append((file_path, st))
+        removed = set(indexed) - {str(fp) for fp, _ in dir_files}
+
         if not dir_files:
+            if scan_index and removed:
+                try:
+                    scan_index.apply(index_root, {}, removed)
+                except Exception as e:
+                    logger.warning(f"影视洗版: 写入扫描索引失败: {str(e)}")
             logger.info(f"影视洗版: 目录 [{dir_name}] 无目标文件")
             return {}, 0
 
-        logger.info(f"影视洗版: 目录 [{dir_name}] 发现 {len(dir_files)} 个文件，开始解析...")
+        logger.info(
+            f"影视洗版: 目录 [{dir_name}] 发现 {len(dir_files)} 个文件，"
+            f"需解析 {len(to_parse)} 个，复用索引 {len(entries)} 个，移除 {len(removed)} 个"
+        )
+
+        # 3. 解析新增/变化的文件（线程池 / 进程池），按权重组装质量信息
+        weights = (self._res_weight, self._src_weight, self._aud_weight,
+                   self._hdr_weight, self._vid_weight, self._bonus_weight)
+        parsed: Dict[str, IndexEntry] = {}
+        results = parse_paths([str(fp) for fp, _ in to_parse], self._custom_rules, self._parse_backend)
+        for (file_path, st), res in zip(to_parse, results):
+            if res is None:
+                continue
+            hits, se_values, media_title, media_year, tmdbid = res
+            quality = build_quality(hits, *weights)
+            se = dict(zip(SEASON_EPISODE_FIELDS, se_values))
+            item = {
+                "filepath": str(file_path),
+                "filename": file_path.name,
+                "parent_dir": str(file_path.parent),
+                "size_bytes": st.st_size,
+                "size_display": self._format_file_size(st.st_size),
+                "quality_score": quality["score"],
+                "quality_details": quality,
+                "media_title": media_title,
+                "media_year": media_year,
+                "tmdbid": tmdbid,
+                "season_episode": se,
+                "season_num": se.get("season_num", 0),
+                "episode_num": se.get("episode_num", 0),
+                "is_movie": se.get("is_movie", True),
+            }
+            parsed[str(file_path)] = IndexEntry(
+                st.st_size, st.st_mtime_ns, st.st_ino, rules_key, media_group_key(item), item
+            )
+        entries.update(parsed)
 
-        # 2. 多线程解析质量
-        scanned_items = []
-        def _parse_single_file(file_path):
+        if scan_index:
             try:
-                quality = self._parse_quality(file_path.name)
-                se = self._parse_season_episode(file_path.name)
-                return {
-                    "filepath": str(file_path),
-                    "filename": file_path.name,
-                    "parent_dir": str(file_path.parent),
-                    "size_bytes": file_path.stat().st_size,
-                    "size_display": self._format_file_size(file_path.stat().st_size),
-                    "quality_score": quality["score"],
-                    "quality_details": quality,
-                    "media_title": self._guess_media_title(file_path),
-                    "media_year": self._guess_media_year(file_path),
-                    "tmdbid": self._parse_tmdb_id(file_path),
-                    "season_episode": se,
-                    "season_num": se.get("season_num", 0),
-                    "episode_num": se.get("episode_num", 0),
-                    "is_movie": se.get("is_movie", True),
-                }
+                scan_index.apply(index_root, parsed, removed)
             except Exception as e:
-                logger.debug(f"解析文件质量出错 {file_path.name}: {str(e)}")
-                return None
-
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(_parse_single_file, fp): fp for fp in dir_files}
-            done_count = 0
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    scanned_items.append(result)
-                done_count += 1
-
-        # 3. 分组 + 排名
-        grouped = self._group_by_media(scanned_items)
+                logger.warning(f"影视洗版: 写入扫描索引失败: {str(e)}")
+
+        # 4. 基于合并后的索引分组 + 排名
+        merged = list(entries.values())
+        grouped = self._group_by_media([e.item for e in merged], [e.group_key for e in merged])
         dir_results = self._compare_and_rank(grouped)
 
-        # 4. 仅保留有重复的条目，释放非重复项内存
+        # 5. 仅保留有重复的条目，释放非重复项内存
         dir_dup_items = {}
         for gk, item_data in dir_results.get("items", {}).items():
             if item_data.get("has_duplicates"):
@@ -495,6 +533,13 @@ class MediaBoardWash(_PluginBase):
                 logger.info(f"影视洗版: 扫描目录共 {len(scan_dirs)} 个")
                 self._set_progress(0, len(scan_dirs), "开始逐目录处理...")
 
+                # 增量扫描索引：打开失败时退化为全量解析
+                try:
+                    scan_index = ScanIndex(self.get_data_path() / "scan_index.db")
+                except Exception as e:
+                    logger.warning(f"影视洗版: 打开扫描索引失败，本次全量解析: {str(e)}")
+                    scan_index = None
+
                 # v2.7.0: 逐目录处理，仅收集重复项
                 global_items: Dict[str, Any] = {}
                 global_total_files = 0
@@ -503,27 +548,31 @@ class MediaBoardWash(_PluginBase):
                 global_savings = 0.0
                 dir_stats: Dict[str, int] = {}
 
-                for idx, directory in enumerate(scan_dirs):
-                    dir_results, dir_file_count = self._process_single_directory(
-                        directory, idx, len(scan_dirs),
-                    )
-
-                    # 合并统计
-                    global_total_files += dir_file_count
-                    dir_stats[directory.name] = dir_file_count
-
-                    if dir_results:
-                        global_total_groups += len(dir_results)
-                        global_duplicates += sum(
-                            1 for v in dir_results.values() if v.get("has_duplicates")
-                        )
-                        global_savings += sum(
-                            sum(ver["size_bytes"] for ver in v.get("versions", []) if not ver.get("is_best"))
-                            for v in dir_results.values()
+                try:
+                    for idx, directory in enumerate(scan_dirs):
+                        dir_results, dir_file_count = self._process_single_directory(
+                            directory, idx, len(scan_dirs), scan_index,
                         )
 
-                        # 仅合并重复项到全局
-                        global_items.update(dir_results)
+                        # 合并统计
+                        global_total_files += dir_file_count
+                        dir_stats[directory.name] = dir_file_count
+
+                        if dir_results:
+                            global_total_groups += len(dir_results)
+                            global_duplicates += sum(
+                                1 for v in dir_results.values() if v.get("has_duplicates")
+                            )
+                            global_savings += sum(
+                                sum(ver["size_bytes"] for ver in v.get("versions", []) if not ver.get("is_best"))
+                                for v in dir_results.values()
+                            )
+
+                            # 仅合并重复项到全局
+                            global_items.update(dir_results)
+                finally:
+                    if scan_index:
+                        scan_index.close()
 
                 if global_total_files == 0:
                     logger.warning("影视洗版: 未找到任何 .strm 或视频文件")
@@ -0,0 +1,108 @@
+"""
+影视洗版插件 — 文件名解析后端
+================================
+批量解析文件路径（质量、季集、标题/年份/TMDB），支持三种方式：
+- thread: 线程池（默认，与旧版一致）；
+- process: 进程池，按块分发路径，绕开 GIL，适合 10 万级以上的大库；
+- serial: 当前线程串行解析。
+解析结果为紧凑元组，由调用方按权重组装为字典。
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.log import logger
+
+from .quality import SEASON_EPISODE_FIELDS, get_matcher, parse_season_episode, scan_quality
+from .scanner import guess_media_title, guess_media_year, parse_tmdb_id
+
+
+PARSE_BACKENDS = ("thread", "process", "serial")
+
+# 进程池每个任务的路径数
+PROCESS_CHUNK_SIZE = 2000
+# 待解析文件少于该数量时不启动进程池（进程启动与结果回传的开销大于收益）
+PROCESS_MIN_FILES = 5000
+# 线程池大小（与旧版保持一致）
+THREAD_WORKERS = 10
+
+# 进程池子进程内的自定义规则（由 _init_worker 设置）
+_worker_rules: Optional[dict] = None
+
+
+def parse_path(path: str, custom_rules: dict = None) -> Tuple:
+    """
+    解析单个文件路径，返回紧凑元组：
+        (scan_quality 结果, 季集字段元组（顺序见 SEASON_EPISODE_FIELDS）, 标题, 年份, TMDB ID)
+    """
+    file_path = Path(path)
+    name = file_path.name
+    se = parse_season_episode(name)
+    return (
+        scan_quality(name, custom_rules),
+        tuple(se[k] for k in SEASON_EPISODE_FIELDS),
+        guess_media_title(file_path),
+        guess_media_year(file_path),
+        parse_tmdb_id(file_path),
+    )
+
+
+def _init_worker(custom_rules: Optional[dict]):
+    """子进程初始化：保存规则并预编译，之后每个任务直接复用"""
+    global _worker_rules
+    _worker_rules = custom_rules
+    get_matcher(custom_rules)
+
+
+def _parse_chunk(paths: List[str]) -> List[Optional[Tuple]]:
+    """子进程任务：解析一块路径，单个文件出错时对应位置为 None"""
+    out: List[Optional[Tuple]] = []
+    for path in paths:
+        try:
+            out.append(parse_path(path, _worker_rules))
+        except Exception:
+            out.append(None)
+    return out
+
+
+def _parse_safe(path: str, custom_rules: Optional[dict]) -> Optional[Tuple]:
+    try:
+        return parse_path(path, custom_rules)
+    except Exception as e:
+        logger.debug(f"解析文件质量出错 {Path(path).name}: {str(e)}")
+        return None
+
+
+def parse_paths(
+    paths: List[str],
+    custom_rules: dict = None,
+    backend: str = "thread",
+    workers: Optional[int] = None,
+) -> List[Optional[Tuple]]:
+    """
+    批量解析文件路径，结果与输入顺序一致，解析失败的位置为 None。
+
+    Args:
+        paths: 文件路径列表
+        custom_rules: 自定义评分规则
+        backend: thread / process / serial；process 在文件数不足 PROCESS_MIN_FILES 时改用线程池
+        workers: 进程数（默认 CPU 核数）
+    """
+    if not paths:
+        return []
+    if backend == "process" and len(paths) >= PROCESS_MIN_FILES:
+        chunks = [paths[i:i + PROCESS_CHUNK_SIZE] for i in range(0, len(paths), PROCESS_CHUNK_SIZE)]
+        try:
+            results: List[Optional[Tuple]] = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(custom_rules,)) as executor:
+                for chunk_result in executor.map(_parse_chunk, chunks):
+                    results.extend(chunk_result)
+            return results
+        except Exception as e:
+            logger.warning(f"影视洗版: 多进程解析失败，改用线程池: {str(e)}")
+    if backend == "serial":
+        return [_parse_safe(path, custom_rules) for path in paths]
+    with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+        return list(executor.map(lambda p: _parse_safe(p, custom_rules), paths))
@@ -4,6 +4,7 @@
 从文件名中解析分辨率、片源、音频、HDR、视频编码等质量信息并评分。
 """
 
+import hashlib
 import json
 import re
 from typing import Any, Dict, List, Optional, Tuple
@@ -71,30 +72,92 @@ _FLOAT_ZERO_THRESHOLD = 1e-6  # 浮点零判断阈值
 
 
 # ============================================================
-# 正则编译缓存 (v2.3.0)
+# 预编译质量解析器 (v2.9.0)
 # ============================================================
 
-_compiled_patterns_cache: Dict[str, List[Tuple[re.Pattern, int]]] = {}
+# 参与解析的维度（顺序即 details 中标签的顺序）
+_DIMENSIONS = ("resolution", "source", "audio", "hdr", "video", "bonus")
 
+# 规则版本(hash) -> 解析器；id(custom_rules) -> (规则对象, 解析器)，同一规则对象无需重复计算 hash
+_matcher_cache: Dict[str, "QualityMatcher"] = {}
+_matcher_by_id: Dict[int, Tuple[Any, "QualityMatcher"]] = {}
+_MATCHER_ID_CACHE_MAX = 32
 
-def clear_patterns_cache() -> None:
-    """清除正则编译缓存（当自定义规则变更时调用）。"""
-    _compiled_patterns_cache.clear()
 
+def rules_version(custom_rules: dict = None) -> str:
+    """计算自定义规则版本（内容 hash），规则内容不变则版本不变。"""
+    payload = json.dumps(custom_rules or {}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+_builtin_rules_hash: Optional[str] = None
+
+
+def builtin_rules_hash() -> str:
+    """计算内置评分规则表（各维度 *_PATTERNS）的内容 hash，插件更新修改内置规则后随之变化。"""
+    global _builtin_rules_hash
+    if _builtin_rules_hash is None:
+        payload = json.dumps(
+            [RESOLUTION_PATTERNS, SOURCE_PATTERNS, AUDIO_PATTERNS, HDR_PATTERNS, VIDEO_PATTERNS, BONUS_PATTERNS],
+            ensure_ascii=False,
+        )
+        _builtin_rules_hash = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return _builtin_rules_hash
+
+
+class QualityMatcher:
+    """
+    按规则版本预编译的质量解析器：全部维度的规则在构造时编译一次，
+    解析时单值维度按优先级逐条匹配、命中即停，加分维度累加全部命中规则。
+
+    注意：各规则保持独立编译而不是合并为一个大的分支正则，
+    CPython 的 re 对单条规则可利用字面前缀快速定位，合并后每个位置都要尝试全部分支，实测反而更慢。
+    """
 
-def _get_compiled_patterns(dimension: str, custom_rules: dict = None) -> List[Tuple[re.Pattern, int]]:
+    def __init__(self, custom_rules: dict = None):
+        self._dims: List[Tuple[str, bool, List[Tuple[re.Pattern, int]]]] = [
+            (dim, dim == "bonus", [(re.compile(p, re.IGNORECASE), score) for p, score in get_patterns(dim, custom_rules)])
+            for dim in _DIMENSIONS
+        ]
+
+    def scan(self, name: str) -> Dict[str, List[Tuple[int, str]]]:
+        """
+        返回各维度按规则顺序排列的命中 [(分值, 标签), ...]。
+        单值维度只含最高优先级的命中。
+        """
+        hits: Dict[str, List[Tuple[int, str]]] = {}
+        for dim, accumulate, compiled_list in self._dims:
+            for compiled, score in compiled_list:
+                match = compiled.search(name)
+                if match:
+                    hits.setdefault(dim, []).append((score, _extract_match_label(match)))
+                    if not accumulate:
+                        break
+        return hits
+
+
+def get_matcher(custom_rules: dict = None) -> QualityMatcher:
     """
-    获取预编译的正则模式列表（带缓存）。
-    相同 dimension + custom_rules 组合只编译一次。
+    获取规则对应的解析器：同一规则对象直接命中，新对象按规则版本复用已编译的解析器。
+    原地修改规则字典后需调用 clear_patterns_cache()。
     """
-    cache_key = f"{dimension}:{json.dumps(custom_rules or {}, sort_keys=True)}"
-    if cache_key in _compiled_patterns_cache:
-        return _compiled_patterns_cache[cache_key]
+    entry = _matcher_by_id.get(id(custom_rules))
+    if entry is not None and entry[0] is custom_rules:
+        return entry[1]
+    version = rules_version(custom_rules)
+    matcher = _matcher_cache.get(version)
+    if matcher is None:
+        matcher = _matcher_cache[version] = QualityMatcher(custom_rules)
+    if len(_matcher_by_id) >= _MATCHER_ID_CACHE_MAX:
+        _matcher_by_id.clear()
+    _matcher_by_id[id(custom_rules)] = (custom_rules, matcher)
+    return matcher
 
-    raw_patterns = get_patterns(dimension, custom_rules)
-    compiled = [(re.compile(p, re.IGNORECASE), score) for p, score in raw_patterns]
-    _compiled_patterns_cache[cache_key] = compiled
-    return compiled
+
+def clear_patterns_cache() -> None:
+    """清除已编译的解析器缓存（当自定义规则变更时调用）。"""
+    _matcher_cache.clear()
+    _matcher_by_id.clear()
 
 
 # ============================================================
@@ -536,6 +599,27 @@ def _extract_match_label(match) -> str:
     return match.group(0).upper()
 
 
+# scan_quality 紧凑结果中单值维度的顺序（标签前缀用于 details 展示）
+_SINGLE_DIMENSIONS = (("resolution", "分辨率"), ("source", "片源"), ("audio", "音频"),
+                      ("hdr", "HDR"), ("video", "编码"))
+
+# parse_season_episode 结果字段顺序（用于紧凑元组与字典互转）
+SEASON_EPISODE_FIELDS = ("season", "episode", "display", "season_num", "episode_num", "is_movie")
+
+
+def scan_quality(filename: str, custom_rules: dict = None) -> Tuple:
+    """
+    匹配文件名中的全部质量维度，返回紧凑结果（可跨进程传递，由 build_quality 组装为字典）：
+        (resolution, source, audio, hdr, video, bonus)
+    单值维度为 (分值, 标签) 或 None，bonus 为 ((分值, 标签), ...)。
+    """
+    name = str(filename).replace("_", ".")
+    hits = get_matcher(custom_rules).scan(name)
+    return tuple(
+        hits[dim][0] if dim in hits else None for dim, _ in _SINGLE_DIMENSIONS
+    ) + (tuple(hits.get("bonus", ())),)
+
+
 def parse_quality(
     filename: str,
     custom_rules: dict = None,
@@ -570,7 +654,22 @@ def parse_quality(
             "details": str
         }
     """
-    name = str(filename).replace("_", ".")
+    return build_quality(
+        scan_quality(filename, custom_rules),
+        res_weight, src_weight, aud_weight, hdr_weight, vid_weight, bonus_weight,
+    )
+
+
+def build_quality(
+    hits: Tuple,
+    res_weight: float = 40.0,
+    src_weight: float = 35.0,
+    aud_weight: float = 15.0,
+    hdr_weight: float = 15.0,
+    vid_weight: float = 12.0,
+    bonus_weight: float = 6.0,
+) -> Dict[str, Any]:
+    """将 scan_quality 的紧凑结果按权重计算得分，组装为质量信息字典（格式见 parse_quality）。"""
     result = {
         "score": 0,
         "resolution": {"value": 0, "label": "未知"},
@@ -583,53 +682,17 @@ def parse_quality(
 
     detected_tags = []
 
-    # 解析分辨率（使用预编译正则缓存）
-    for compiled, score in _get_compiled_patterns("resolution", custom_rules):
-        match = compiled.search(name)
-        if match:
-            result["resolution"] = {"value": score, "label": _extract_match_label(match)}
-            detected_tags.append(f"分辨率:{_extract_match_label(match)}")
-            break
-
-    # 解析片源类型
-    for compiled, score in _get_compiled_patterns("source", custom_rules):
-        match = compiled.search(name)
-        if match:
-            result["source"] = {"value": score, "label": _extract_match_label(match)}
-            detected_tags.append(f"片源:{_extract_match_label(match)}")
-            break
-
-    # 解析音频编码
-    for compiled, score in _get_compiled_patterns("audio", custom_rules):
-        match = compiled.search(name)
-        if match:
-            result["audio"] = {"value": score, "label": _extract_match_label(match)}
-            detected_tags.append(f"音频:{_extract_match_label(match)}")
-            break
-
-    # 解析HDR类型
-    for compiled, score in _get_compiled_patterns("hdr", custom_rules):
-        match = compiled.search(name)
-        if match:
-            result["hdr"] = {"value": score, "label": _extract_match_label(match)}
-            detected_tags.append(f"HDR:{_extract_match_label(match)}")
-            break
-
-    # 解析视频编码
-    for compiled, score in _get_compiled_patterns("video", custom_rules):
-        match = compiled.search(name)
-        if match:
-            result["video"] = {"value": score, "label": _extract_match_label(match)}
-            detected_tags.append(f"编码:{_extract_match_label(match)}")
-            break
+    for (dim, tag), hit in zip(_SINGLE_DIMENSIONS, hits):
+        if hit:
+            score, label = hit
+            result[dim] = {"value": score, "label": label}
+            detected_tags.append(f"{tag}:{label}")
 
     # 计算加分
     bonus_score = 0
-    for compiled, score in _get_compiled_patterns("bonus", custom_rules):
-        match = compiled.search(name)
-        if match:
-            bonus_score += score
-            detected_tags.append(f"加分:{_extract_match_label(match)}")
+    for score, label in hits[-1]:
+        bonus_score += score
+        detected_tags.append(f"加分:{label}")
 
     result["bonus"] = bonus_score
 
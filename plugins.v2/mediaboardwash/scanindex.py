@@ -0,0 +1,99 @@
+"""
+影视洗版插件 — 增量扫描索引
+================================
+以文件路径为键，在插件数据目录下的 SQLite 中持久化文件的 大小/mtime/inode 与解析结果，
+再次扫描时仅重新解析新增或变化的文件，并清理已消失的文件。
+"""
+
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from app.log import logger
+
+
+# 索引格式版本：解析结果的结构变化时递增，使旧记录全部失效
+_INDEX_FORMAT = 1
+
+
+class IndexEntry(NamedTuple):
+    """单个文件的索引记录"""
+    size: int
+    mtime_ns: int
+    inode: int
+    rules_key: str
+    group_key: Optional[str]
+    item: Dict[str, Any]
+
+
+def make_rules_key(custom_rules: Optional[dict], weights: Iterable[float],
+                   builtin_hash: str = "", plugin_version: str = "") -> str:
+    """
+    计算解析规则指纹：自定义规则、评分权重、内置规则表或插件版本变化后，已索引的解析结果需要重新计算。
+    插件版本覆盖季集解析、标题/年份识别与分组键等代码逻辑的变化。
+    """
+    payload = json.dumps(
+        {"format": _INDEX_FORMAT, "rules": custom_rules or {}, "weights": list(weights),
+         "builtin": builtin_hash, "version": plugin_version},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ScanIndex:
+    """
+    持久化扫描索引，按扫描根目录读写：
+    - load(root) 读取该根目录下全部记录；
+    - apply(root, upserts, removed) 在一个事务中写入新增/变化的记录并删除已消失的文件。
+    """
+
+    def __init__(self, db_file: Path):
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scan_index ("
+            "path TEXT PRIMARY KEY, root TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "inode INTEGER NOT NULL, rules_key TEXT NOT NULL, group_key TEXT, item TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_index_root ON scan_index(root)")
+        self._conn.commit()
+
+    def load(self, root: str) -> Dict[str, IndexEntry]:
+        """读取根目录下的全部索引记录：{路径: IndexEntry}"""
+        entries: Dict[str, IndexEntry] = {}
+        rows = self._conn.execute(
+            "SELECT path, size, mtime_ns, inode, rules_key, group_key, item FROM scan_index WHERE root = ?",
+            (root,),
+        )
+        for path, size, mtime_ns, inode, rules_key, group_key, item in rows:
+            try:
+                entries[path] = IndexEntry(size, mtime_ns, inode, rules_key, group_key, json.loads(item))
+            except ValueError:
+                logger.debug(f"影视洗版: 扫描索引记录损坏，将重新解析: {path}")
+        return entries
+
+    def apply(self, root: str, upserts: Dict[str, IndexEntry], removed: Iterable[str]):
+        """写入新增/变化的记录，删除已消失的文件"""
+        rows = [
+            (path, root, e.size, e.mtime_ns, e.inode, e.rules_key, e.group_key,
+             json.dumps(e.item, ensure_ascii=False))
+            for path, e in upserts.items()
+        ]
+        removed_rows: List[tuple] = [(path,) for path in removed]
+        if not rows and not removed_rows:
+            return
+        with self._conn:
+            if removed_rows:
+                self._conn.executemany("DELETE FROM scan_index WHERE path = ?", removed_rows)
+            if rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO scan_index"
+                    "(path, root, size, mtime_ns, inode, rules_key, group_key, item) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def close(self):
+        self._conn.close()
@@ -6,6 +6,7 @@
 
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -83,10 +84,106 @@ def resolve_scan_directories(media_dirs: str = "") -> List[Path]:
     return dirs
 
 
+# 扫描时不进入的目录：NAS/系统的回收站、缩略图与元数据目录（隐藏目录同样跳过）
+EXCLUDED_DIR_NAMES = frozenset({
+    "@eaDir", "@Recycle", "#recycle", "#snapshot", "$RECYCLE.BIN",
+    "System Volume Information", "lost+found",
+})
+
+# 按顶层子目录并发扫描的线程数（网络挂载上每次 stat 都是一次往返，并发可叠加等待）
+SCAN_WORKERS = 4
+
+
+def _scan_one_dir(
+    directory: str,
+    min_bytes: int,
+    exclude_dirs: frozenset,
+    out: List[Tuple[Path, os.stat_result]],
+) -> List[str]:
+    """
+    列出单个目录：目标文件以 (路径, stat) 追加到 out，返回需要继续进入的子目录。
+    每个目标文件只调用一次 DirEntry.stat()；目录判断使用 DirEntry 自带的类型信息，
+    排除目录与隐藏目录在进入前剪枝，符号链接目录不进入（与 os.walk 默认行为一致）。
+    """
+    subdirs: List[str] = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            name = entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not name.startswith(".") and name not in exclude_dirs:
+                        subdirs.append(entry.path)
+                    continue
+            except OSError:
+                continue
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in TARGET_EXTENSIONS:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                logger.debug(f"影视洗版: 无法读取文件信息（可能网络挂载断开）: {entry.path}")
+                continue
+            # .strm 文件始终收录，视频文件按最小大小过滤
+            if ext == ".strm" or st.st_size >= min_bytes:
+                out.append((Path(entry.path), st))
+    return subdirs
+
+
+def _walk_target_entries(
+    directory: str,
+    min_bytes: int,
+    exclude_dirs: frozenset,
+) -> List[Tuple[Path, os.stat_result]]:
+    """迭代式深度优先遍历子树（保持目录列表顺序），无法访问的目录记录日志后跳过"""
+    out: List[Tuple[Path, os.stat_result]] = []
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            subdirs = _scan_one_dir(current, min_bytes, exclude_dirs, out)
+        except OSError:
+            logger.debug(f"影视洗版: 无法访问目录，已跳过: {current}")
+            continue
+        stack.extend(reversed(subdirs))
+    return out
+
+
+def scan_target_files(
+    directory: Path,
+    min_bytes: int = 0,
+    workers: int = SCAN_WORKERS,
+    exclude_dirs: frozenset = EXCLUDED_DIR_NAMES,
+) -> List[Tuple[Path, os.stat_result]]:
+    """
+    扫描目录下的 .strm 和视频文件，返回 [(路径, stat)]，每个文件只 stat 一次。
+
+    顶层子目录分发到有界线程池并发遍历（workers <= 1 时串行），结果按目录顺序合并。
+    根目录无法访问时抛出 OSError，子目录错误仅记录日志。
+
+    Args:
+        directory: 要扫描的目录
+        min_bytes: 视频文件最小大小(字节)，.strm 文件不受限
+        workers: 并发线程数
+        exclude_dirs: 不进入的目录名
+    """
+    results: List[Tuple[Path, os.stat_result]] = []
+    subdirs = _scan_one_dir(str(directory), min_bytes, exclude_dirs, results)
+    if workers <= 1 or len(subdirs) <= 1:
+        for subdir in subdirs:
+            results.extend(_walk_target_entries(subdir, min_bytes, exclude_dirs))
+        return results
+    with ThreadPoolExecutor(max_workers=min(workers, len(subdirs))) as executor:
+        for out in executor.map(lambda d: _walk_target_entries(d, min_bytes, exclude_dirs), subdirs):
+            results.extend(out)
+    return results
+
+
 def collect_target_files(
     directories: List[Path],
     min_size: int = 100,
     progress_callback: Optional[callable] = None,
+    workers: int = SCAN_WORKERS,
 ) -> Tuple[List[Path], Dict[str, int]]:
     """
     收集目录下的所有 .strm 和视频文件。
@@ -95,11 +192,13 @@ def collect_target_files(
     视频文件默认需 >= min_size MB。
 
     v2.6.0: 支持多目录串行扫描，逐目录上报进度和统计。
+    v2.10.0: 基于 os.scandir 遍历（见 scan_target_files），每个文件只 stat 一次。
 
     Args:
         directories: 要扫描的目录列表
         min_size: 视频文件最小大小(MB)
         progress_callback: 进度回调函数 (phase, message, current, total)
+        workers: 单个目录内按顶层子目录并发扫描的线程数
 
     Returns:
         (目标文件路径列表, 目录统计字典 {"目录名": 文件数})
@@ -125,29 +224,9 @@ def collect_target_files(
 
         dir_count = 0
         try:
-            for root, _, files in os.walk(directory):
-                root_path = Path(root)
-                for f in files:
-                    file_path = root_path / f
-                    ext = file_path.suffix.lower()
-
-                    if ext not in TARGET_EXTENSIONS:
-                        continue
-
-                    # .strm 文件始终收录
-                    if ext == ".strm":
-                        target_files.append(file_path)
-                        dir_count += 1
-                        continue
-
-                    # 视频文件按最小大小过滤（v2.3.0: 保护网络挂载超时）
-                    try:
-                        if file_path.stat().st_size >= min_bytes:
-                            target_files.append(file_path)
-                            dir_count += 1
-                    except OSError:
-                        logger.debug(f"影视洗版: 无法读取文件信息（可能网络挂载断开）: {file_path}")
-
+            for file_path, _ in scan_target_files(directory, min_bytes, workers):
+                target_files.append(file_path)
+                dir_count += 1
         except PermissionError:
             logger.warning(f"影视洗版: 无权限访问目录 {directory}")
         except Exception as e:
@@ -254,31 +333,43 @@ def guess_media_title(file_path: Path) -> str:
 # 分组与对比算法
 # ============================================================
 
-def group_by_media(items: List[Dict]) -> Dict[str, List[Dict]]:
+def media_group_key(item: Dict) -> Optional[str]:
     """
-    按媒体唯一标识分组：title + year + tmdbid + season + episode。
+    计算媒体分组键: title + year + tmdbid + season + episode，样本文件返回 None。
     MoviePilot 命名规范中，只有这些字段全部相同才是真正的"重复"。
+    """
+    if "sample" in item.get("filename", "").lower():
+        return None  # 跳过样本文件
+
+    title = item.get("media_title") or "未知标题"
+    year = item.get("media_year") or "0000"
+    tmdbid = item.get("tmdbid") or ""
+    s_num = item.get("season_num") or 0
+    e_num = item.get("episode_num") or 0
+
+    key_parts = [title, year]
+    if tmdbid:
+        key_parts.append(tmdbid)
+    key_parts.append(str(s_num))
+    key_parts.append(str(e_num))
+    return "|".join(key_parts)
+
+
+def group_by_media(items: List[Dict], keys: Optional[List[Optional[str]]] = None) -> Dict[str, List[Dict]]:
+    """
+    按媒体唯一标识分组（见 media_group_key）。
     单版本每集始终保留，仅同集多版本才去重。
+
+    Args:
+        items: 文件条目列表
+        keys: 与 items 一一对应的预先计算的分组键（如来自扫描索引），缺省时逐项计算
     """
     groups: Dict[str, List[Dict]] = {}
 
-    for item in items:
-        if "sample" in item.get("filename", "").lower():
-            continue  # 跳过样本文件
-
-        title = item.get("media_title") or "未知标题"
-        year = item.get("media_year") or "0000"
-        tmdbid = item.get("tmdbid") or ""
-        s_num = item.get("season_num") or 0
-        e_num = item.get("episode_num") or 0
-
-        # 分组键: title + year + tmdb + season + episode
-        key_parts = [title, year]
-        if tmdbid:
-            key_parts.append(tmdbid)
-        key_parts.append(str(s_num))
-        key_parts.append(str(e_num))
-        key = "|".join(key_parts)
+    for i, item in enumerate(items):
+        key = keys[i] if keys is not None else media_group_key(item)
+        if key is None:
+            continue
 
         if key not in groups:
             groups[key] = []
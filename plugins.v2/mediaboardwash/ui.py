@@ -531,6 +531,24 @@ def _build_basic_settings() -> list:
                 _textfield_col('md3', 'min_score', '最低保留分数',
                                '低于此分的版本强制删除，不占用保留名额。0=关闭',
                                type='number', min_val=0),
+                {
+                    'component': 'VCol',
+                    'props': {'cols': 12, 'md': 3},
+                    'content': [
+                        {
+                            'component': 'VSelect',
+                            'props': {
+                                'model': 'parse_backend',
+                                'label': '解析方式',
+                                'items': [
+                                    {'title': '多线程', 'value': 'thread'},
+                                    {'title': '多进程(大库)', 'value': 'process'},
+                                ],
+                                'hint': '10万级以上文件的大库可选多进程，充分利用多核；待解析文件较少时自动使用多线程'
+                            }
+                        }
+                    ]
+                },
             ]
         },
     ]
@@ -740,7 +758,7 @@ def build_form() -> Tuple[List[dict], Dict[str, Any]]:
     ], {
         "enabled": False, "onlyonce": False, "notify": True, "auto_cleanup": False,
         "media_dirs": "", "cron": "", "min_size": 100, "keep_count": 1,
-        "min_score": 0,
+        "min_score": 0, "parse_backend": "thread",
         "score_profile": "custom",
         "res_weight": 40, "src_weight": 35, "aud_weight": 15,
         "hdr_weight": 15, "vid_weight": 12, "bonus_weight": 6,
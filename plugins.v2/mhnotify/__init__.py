@@ -1,6 +1,7 @@
 import time
 import re
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from urllib.parse import quote
 
@@ -13,7 +14,6 @@ from app.schemas.types import EventType, NotificationType, MediaType
 from app.core.context import MediaInfo
 from app.modules.themoviedb.tmdbapi import TmdbApi
 from app.chain.download import DownloadChain
-from app.utils.http import RequestUtils
 from app.log import logger
 from app.plugins import _PluginBase
 from app.db import SessionFactory
@@ -33,7 +33,7 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/ListeningLTG/MoviePilot-Plugins/refs/heads/main/icons/mh2.jpg"
     # 插件版本
-    plugin_version = "1.7.7"
+    plugin_version = "1.8.9"
     # 插件作者
     plugin_author = "ListeningLTG"
     # 作者主页
@@ -65,6 +65,14 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
     _wait_notify_count = 0
     #（已废弃）
     _wait_minutes = 5
+    # MH strm 同步去抖：静默期（秒）、定时器与锁
+    _mh_sync_quiet_seconds: int = 60
+    _mh_sync_timer: Optional[threading.Timer] = None
+    _mh_sync_lock = threading.Lock()
+    # 正在触发 MH strm 同步（登录及调用执行接口期间），防止定时兜底或并发事件重复触发
+    _mh_sync_running = False
+    # MH strm 任务列表缓存 (任务名称配置, 过期时间戳, UUID列表)
+    _mh_strm_tasks_cache: Optional[Tuple[Optional[str], int, List[str]]] = None
     # mh订阅辅助开关
     _mh_assist_enabled: bool = False
     # mh订阅辅助：MP订阅完成后自动删除MH订阅
@@ -197,8 +205,8 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
 
             # 打印当前记录的sid信息
             try:
-                pending = self.get_data(self._ASSIST_PENDING_KEY) or {}
-                watch = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                pending = self._assist_pending().snapshot()
+                watch = self._assist_watch().snapshot()
                 
                 if pending:
                     pending_details = []
@@ -415,7 +423,46 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
         ], defaults
 
     def get_page(self) -> List[dict]:
-        pass
+        """插件详情页：MH 接口调用统计"""
+        rows = self._mh_client().stats()
+        if not rows:
+            return [{
+                "component": "VAlert",
+                "props": {"type": "info", "variant": "tonal", "text": "暂无 MH 接口调用统计"}
+            }]
+        body = [
+            {"component": "tr", "content": [
+                {"component": "td", "text": r["endpoint"]},
+                {"component": "td", "text": str(r["calls"])},
+                {"component": "td", "text": str(r["errors"])},
+                {"component": "td", "text": f"{r['avg_ms']:.0f}"},
+                {"component": "td", "text": f"{r['max_ms']:.0f}"},
+                {"component": "td", "text": str(r["last_status"] if r["last_status"] is not None else "-")},
+            ]}
+            for r in rows
+        ]
+        return [{
+            "component": "VCard",
+            "props": {"class": "mb-4"},
+            "content": [
+                {"component": "VCardTitle", "text": "MH 接口调用统计"},
+                {"component": "VCardText", "content": [{
+                    "component": "VTable",
+                    "props": {"density": "compact"},
+                    "content": [
+                        {"component": "thead", "content": [{"component": "tr", "content": [
+                            {"component": "th", "text": "接口"},
+                            {"component": "th", "text": "调用次数"},
+                            {"component": "th", "text": "错误次数"},
+                            {"component": "th", "text": "平均耗时(ms)"},
+                            {"component": "th", "text": "最大耗时(ms)"},
+                            {"component": "th", "text": "最近状态"},
+                        ]}]},
+                        {"component": "tbody", "content": body}
+                    ]
+                }]}
+            ]
+        }]
 
     @eventmanager.register(EventType.SubscribeAdded)
     def on_subscribe_added(self, event: Event):
@@ -443,6 +490,7 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
         监听 MP 整理完成和刮削完成事件，触发 MH 生成 strm 任务
         需要在配置中开启 'MP事件触发' 开关
         支持按存储类型过滤
+        事件只计数并推迟去抖定时器，静默期结束后统一触发一次
         """
         if not self._enabled or not self._mp_event_enabled:
             return
@@ -450,27 +498,6 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
         if not event or not event.event_type:
             return
         
-        # 辅助函数：将事件对象递归转换为字典
-        def __to_dict(_event):
-            if _event is None:
-                return None
-            elif isinstance(_event, dict):
-                return {k: __to_dict(v) for k, v in _event.items()}
-            elif isinstance(_event, list):
-                return [__to_dict(item) for item in _event]
-            elif isinstance(_event, tuple):
-                return tuple(__to_dict(list(_event)))
-            elif isinstance(_event, set):
-                return set(__to_dict(list(_event)))
-            elif hasattr(_event, 'to_dict'):
-                return __to_dict(_event.to_dict())
-            elif hasattr(_event, '__dict__'):
-                return __to_dict(_event.__dict__)
-            elif isinstance(_event, (int, float, str, bool, type(None))):
-                return _event
-            else:
-                return str(_event)
-        
         # 获取事件类型
         version = getattr(settings, "VERSION_FLAG", "v1")
         event_type = event.event_type if version == "v1" else event.event_type.value
@@ -479,29 +506,24 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
         if event_type not in ["transfer.complete", "metadata.scrape", EventType.TransferComplete, EventType.DownloadAdded]:
             return
         
-        # 解析事件数据
-        event_data = __to_dict(event.event_data)
+        # 直接读取需要的字段，避免整份事件数据深拷贝
+        event_data = event.event_data
         storage = None
         name = None
         
         try:
             # 整理完成事件
             if event_type in ["transfer.complete", EventType.TransferComplete]:
-                transferinfo = event_data.get("transferinfo", {})
-                success = transferinfo.get("success", False)
-                if not success:
+                transferinfo = self._event_value(event_data, "transferinfo")
+                if not self._event_value(transferinfo, "success"):
                     return
-                
-                target_diritem = transferinfo.get("target_diritem", {})
-                target_item = transferinfo.get("target_item", {})
-                storage = target_diritem.get("storage")
-                name = target_item.get("name")
+                storage = self._event_value(transferinfo, "target_diritem", "storage")
+                name = self._event_value(transferinfo, "target_item", "name")
             
             # 刮削完成事件
             elif event_type in ["metadata.scrape", EventType.DownloadAdded]:
-                fileitem = event_data.get("fileitem", {})
-                storage = fileitem.get("storage") if isinstance(fileitem, dict) else None
-                name = event_data.get("name")
+                storage = self._event_value(event_data, "fileitem", "storage")
+                name = self._event_value(event_data, "name")
         
         except Exception as e:
             logger.error(f"mhnotify: 解析事件数据失败: {e}")
@@ -513,29 +535,33 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
                 logger.debug(f"mhnotify: 存储类型 [{storage}] 不在监听列表中，忽略事件")
                 return
         
-        logger.info(f"mhnotify: 收到 MP 事件 [{event_type}]，存储: [{storage}]，文件: [{name}]")
-        
-        # 增加待通知计数
-        self._wait_notify_count += 1
-        self._last_event_time = self._get_time()
+        logger.debug(f"mhnotify: 收到 MP 事件 [{event_type}]，存储: [{storage}]，文件: [{name}]")
         
-        # 检查是否有正在运行的整理任务
-        if self._has_running_transfers():
-            logger.info("mhnotify: 检测到正在运行的整理任务，延迟触发")
-            # 设置等待窗口
-            now_ts = self._get_time()
-            wait_seconds = self._mp_event_wait_minutes * 60
-            self._next_notify_time = now_ts + wait_seconds
-        else:
-            logger.info("mhnotify: 无运行中的整理任务，将在下次调度时立即触发")
-            # 清零等待时间，下次调度立即触发
-            self._next_notify_time = 0
+        # 增加待通知计数，并把触发时间推迟到静默期之后
+        with self._mh_sync_lock:
+            self._wait_notify_count += 1
+            self._last_event_time = self._get_time()
+        self._schedule_mh_sync(self._mh_sync_quiet_seconds)
+
+    @staticmethod
+    def _event_value(obj: Any, *keys: str) -> Any:
+        """按路径读取事件数据中的字段，兼容字典与对象"""
+        for key in keys:
+            if obj is None:
+                return None
+            if isinstance(obj, dict):
+                obj = obj.get(key)
+            else:
+                obj = getattr(obj, key, None)
+        return obj
 
     def stop_service(self):
         """
         退出插件
         """
-        pass
+        self._cancel_mh_sync_timer()
+        self._mh_keyword_queue().close()
+        self._assist_commit()
 
     def _get_time(self):
         return int(time.time())
@@ -581,10 +607,7 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
         try:
             if not self._mh_domain or not self._mh_username:
                 return []
-            token = self._mh_login()
-            if not token:
-                return []
-            listeners = self._mh_get_listeners(token)
+            listeners = self._mh_keyword_queue().listeners(refresh=True)
             return [
                 {"title": l.get("source_name") or l.get("id"), "value": l.get("id")}
                 for l in listeners if l.get("id")
@@ -616,105 +639,134 @@ class MHNotify(MHApiMixin, MHAssistMixin, CloudDownloadMixin, AliTo115Mixin, _Pl
             logger.warning(f"mhnotify: 检测整理任务状态异常：{e}，按无运行处理")
             return False
 
+    def _schedule_mh_sync(self, delay: int):
+        """
+        推迟 MH strm 同步触发时间：只保留一个定时器，到期时若触发时间被推后则重新计时
+        """
+        with self._mh_sync_lock:
+            self._next_notify_time = max(self._next_notify_time, self._get_time() + delay)
+            if self._mh_sync_timer and self._mh_sync_timer.is_alive():
+                return
+            timer = threading.Timer(max(0, self._next_notify_time - self._get_time()), self._on_mh_sync_timer)
+            timer.daemon = True
+            self._mh_sync_timer = timer
+            timer.start()
+
+    def _on_mh_sync_timer(self):
+        """去抖定时器到期：静默期内无新事件且无运行中的整理任务时触发一次"""
+        with self._mh_sync_lock:
+            self._mh_sync_timer = None
+            if self._wait_notify_count <= 0:
+                self._next_notify_time = 0
+                return
+            remaining = self._next_notify_time - self._get_time()
+        if remaining > 0:
+            self._schedule_mh_sync(remaining)
+            return
+        if self._has_running_transfers():
+            logger.info(f"MP整理任务仍在运行，延长等待窗口 {self._mp_event_wait_minutes} 分钟")
+            self._schedule_mh_sync(self._mp_event_wait_minutes * 60)
+            return
+        self._notify_mh()
+
+    def _cancel_mh_sync_timer(self):
+        with self._mh_sync_lock:
+            timer, self._mh_sync_timer = self._mh_sync_timer, None
+        if timer:
+            timer.cancel()
+
+    def _mh_strm_task_uuids(self, access_token: str, refresh: bool = False) -> Optional[List[str]]:
+        """
+        获取需要触发的 cloud_strm_sync 计划任务 UUID，结果按任务名称配置缓存
+        :return: UUID 列表，获取任务列表失败时返回 None
+        """
+        now_ts = self._get_time()
+        cached = self._mh_strm_tasks_cache
+        if not refresh and cached and cached[0] == self._mh_job_names and now_ts < cached[1]:
+            return cached[2]
+        list_res = self._mh_request("get", "/api/v1/scheduled/tasks", access_token)
+        if not list_res or list_res.status_code != 200:
+            logger.error(f"获取 MediaHelper 任务列表失败：{getattr(list_res, 'status_code', 'N/A')} - {getattr(list_res, 'text', '')}")
+            return None
+        try:
+            tasks = (list_res.json() or {}).get("data", []) or []
+        except Exception:
+            tasks = []
+        # 过滤 cloud_strm_sync 任务
+        strm_tasks = [t for t in tasks if t.get('task') == 'cloud_strm_sync' and t.get('enabled')]
+        name_filters = []
+        if self._mh_job_names:
+            name_filters = [n.strip() for n in self._mh_job_names.split(',') if n.strip()]
+        if name_filters:
+            selected_uuids = [t.get('uuid') for t in strm_tasks if (t.get('name') or '') in name_filters]
+        else:
+            selected_uuids = [t.get('uuid') for t in strm_tasks if '115网盘' in (t.get('name') or '')]
+        self._mh_strm_tasks_cache = (self._mh_job_names, now_ts + self._mh_token_ttl_seconds, selected_uuids)
+        return selected_uuids
+
+    def _mh_execute_scheduled_task(self, access_token: str, uuid: str) -> Optional[int]:
+        """触发单个 MH 计划任务，返回 HTTP 状态码"""
+        exec_res = self._mh_request(
+            "post", f"/api/v1/scheduled/execute/{uuid}", access_token,
+            endpoint="POST /api/v1/scheduled/execute/{uuid}",
+            headers={"Content-Type": "application/json;charset=UTF-8", "Origin": self._mh_domain},
+            json={}
+        )
+        if exec_res is None:
+            logger.error(f"触发任务失败：{uuid} - 未获取到返回信息")
+            return None
+        if exec_res.status_code in (200, 204):
+            logger.info(f"已触发 MediaHelper 计划任务：{uuid}")
+        else:
+            logger.error(f"触发任务失败：{uuid} - {exec_res.status_code} - {exec_res.text}")
+        return exec_res.status_code
+
     def _notify_mh(self):
+        """
+        触发 MH strm 同步：复用缓存的登录 token 与任务列表，并发触发所有 cloud_strm_sync 任务
+        也作为定时服务的兜底入口：有待通知且等待窗口已过、去抖定时器未运行时补发
+        """
+        pending = 0
+        triggered = False
         try:
-            # 当有待通知时，根据是否存在运行中整理任务决定立即触发或进入等待窗口
-            now_ts = self._get_time()
-            if self._wait_notify_count > 0:
-                # 若启用 MP 事件触发，检查 MP 事件等待窗口
-                if self._mp_event_enabled and self._next_notify_time:
-                    if now_ts < self._next_notify_time:
-                        # 如果仍有运行中的整理任务，延长等待时间
-                        if self._has_running_transfers():
-                            wait_seconds = self._mp_event_wait_minutes * 60
-                            self._next_notify_time = now_ts + wait_seconds
-                            logger.info(f"MP整理任务仍在运行，延长等待窗口 {self._mp_event_wait_minutes} 分钟")
-                        else:
-                            logger.info(f"MP事件等待窗口未到期（{self._next_notify_time - now_ts}s），暂不触发通知")
-                        return
-                    else:
-                        # 到期后清零窗口
-                        self._next_notify_time = 0
-                # 登录获取 access_token
-                login_url = f"{self._mh_domain}/api/v1/auth/login"
-                login_payload = {
-                    "username": self._mh_username,
-                    "password": self._mh_password
-                }
-                headers = {
-                    "Accept": "application/json, text/plain, */*",
-                    "Content-Type": "application/json;charset=UTF-8",
-                    "Origin": self._mh_domain,
-                    "Accept-Language": "zh-CN",
-                    "User-Agent": "MoviePilot/Plugin MHNotify"
-                }
-                login_res = RequestUtils(headers=headers).post(login_url, json=login_payload)
-                if not login_res or login_res.status_code != 200:
-                    logger.error(f"MediaHelper 登录失败：{getattr(login_res, 'status_code', 'N/A')} - {getattr(login_res, 'text', '')}")
+            with self._mh_sync_lock:
+                if self._mh_sync_running or self._wait_notify_count <= 0:
                     return
-                try:
-                    login_data = login_res.json()
-                    access_token = (login_data or {}).get("data", {}).get("access_token")
-                except Exception:
-                    access_token = None
-                if not access_token:
-                    logger.error("MediaHelper 登录成功但未获取到 access_token")
+                now_ts = self._get_time()
+                timer_alive = self._mh_sync_timer is not None and self._mh_sync_timer.is_alive()
+                if self._next_notify_time and now_ts < self._next_notify_time:
+                    if not timer_alive:
+                        logger.info(f"MP事件等待窗口未到期（{self._next_notify_time - now_ts}s），暂不触发通知")
                     return
-                # 获取任务列表并筛选 strm 任务
-                tasks_url = f"{self._mh_domain}/api/v1/scheduled/tasks"
-                list_headers = {
-                    "Accept": "application/json, text/plain, */*",
-                    "Authorization": f"Bearer {access_token}",
-                    "User-Agent": "MoviePilot/Plugin MHNotify",
-                    "Accept-Language": "zh-CN"
-                }
-                list_res = RequestUtils(headers=list_headers).get_res(tasks_url)
-                if not list_res or list_res.status_code != 200:
-                    logger.error(f"获取 MediaHelper 任务列表失败：{getattr(list_res, 'status_code', 'N/A')} - {getattr(list_res, 'text', '')}")
-                try:
-                    list_data = list_res.json() or {}
-                    tasks = list_data.get("data", [])
-                except Exception:
-                    tasks = []
-                # 过滤 cloud_strm_sync 任务
-                strm_tasks = [t for t in tasks if t.get('task') == 'cloud_strm_sync' and t.get('enabled')]
-                selected_uuids = []
-                name_filters = []
-                if self._mh_job_names:
-                    name_filters = [n.strip() for n in self._mh_job_names.split(',') if n.strip()]
-                if name_filters:
-                    selected_uuids = [t.get('uuid') for t in strm_tasks if (t.get('name') or '') in name_filters]
-                else:
-                    selected_uuids = [t.get('uuid') for t in strm_tasks if '115网盘' in (t.get('name') or '')]
-                if not selected_uuids:
-                    logger.warning("未找到可执行的 strm 任务（cloud_strm_sync），请检查任务名称或在配置中填写任务UUID列表")
+                if timer_alive:
                     return
-                # 逐个触发，间隔5秒
-                exec_headers = {
-                    "Accept": "application/json, text/plain, */*",
-                    "Content-Type": "application/json;charset=UTF-8",
-                    "Authorization": f"Bearer {access_token}",
-                    "Origin": self._mh_domain,
-                    "Accept-Language": "zh-CN",
-                    "User-Agent": "MoviePilot/Plugin MHNotify"
-                }
-                for uuid in selected_uuids:
-                    exec_url = f"{self._mh_domain}/api/v1/scheduled/execute/{uuid}"
-                    exec_res = RequestUtils(headers=exec_headers).post(exec_url, json={})
-                    if exec_res and exec_res.status_code in (200, 204):
-                        logger.info(f"已触发 MediaHelper 计划任务：{uuid}")
-                        success_any = True
-                    elif exec_res is not None:
-                        logger.error(f"触发任务失败：{uuid} - {exec_res.status_code} - {exec_res.text}")
-                    else:
-                        logger.error(f"触发任务失败：{uuid} - 未获取到返回信息")
-                    time.sleep(5)
-                if success_any:
-                    self._wait_notify_count = 0
-            else:
-                if self._wait_notify_count > 0:
-                    logger.info(
-                        f"等待通知数量：{self._wait_notify_count}，最后事件时间：{self._last_event_time}")
+                self._next_notify_time = 0
+                # 在任何网络请求之前取走待通知计数并标记运行中，失败时于 finally 中归还
+                pending = self._wait_notify_count
+                self._wait_notify_count = 0
+                self._mh_sync_running = True
+            logger.info(f"mhnotify: 共 {pending} 个 MP 事件待通知，开始触发 MediaHelper strm 任务")
+            access_token = self._mh_login()
+            if not access_token:
+                logger.error("MediaHelper 登录失败，未获取到 access_token")
+                return
+            selected_uuids = self._mh_strm_task_uuids(access_token)
+            if not selected_uuids:
+                if selected_uuids is not None:
+                    logger.warning("未找到可执行的 strm 任务（cloud_strm_sync），请检查任务名称或在配置中填写任务UUID列表")
+                return
+            with ThreadPoolExecutor(max_workers=min(len(selected_uuids), 4)) as executor:
+                codes = list(executor.map(lambda u: self._mh_execute_scheduled_task(access_token, u), selected_uuids))
+            if any(code == 404 for code in codes):
+                # 任务可能已被删除或重建，下次重新获取任务列表
+                self._mh_strm_tasks_cache = None
+            triggered = any(code in (200, 204) for code in codes)
         except Exception as e:
             logger.error(f"通知MediaHelper发生异常：{e}")
-
+        finally:
+            if pending:
+                with self._mh_sync_lock:
+                    self._mh_sync_running = False
+                    if not triggered:
+                        # 触发失败，归还本次取走的事件数，由下次兜底重试；触发期间新到的事件已累加在计数上
+                        self._wait_notify_count += pending
@@ -1,13 +1,120 @@
+import heapq
 import re
+import threading
+import time
+from hashlib import sha1
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from urllib.parse import quote
-from typing import Tuple, Optional
+from typing import Any, Dict, Tuple, Optional
 
 from app.core.event import Event
 from app.log import logger
 
 
+class RangeHashService:
+    """
+    115 秒传二次校验的区间哈希服务：
+    - 复用同一个 httpx 连接池（安装了 h2 时启用 HTTP/2），避免每次校验都新建 TLS 连接；
+    - 阿里云盘下载链接按 file_id 短时缓存，上传前获取的链接可直接用于二次校验，请求失败时刷新重试一次；
+    - 以较大的块读取并计算 SHA1，按文件统计校验次数、字节数与耗时。
+    """
+
+    def __init__(self, ali_client, url_ttl: int = 60, chunk_size: int = 1024 * 1024, max_connections: int = 8):
+        self._ali_client = ali_client
+        self._url_ttl = url_ttl
+        self._chunk_size = chunk_size
+        self._max_connections = max_connections
+        self._lock = threading.Lock()
+        self._client = None
+        # file_id -> (url_info, 过期时间)
+        self._urls: Dict[str, Tuple[Any, float]] = {}
+        # file_id -> {"checks", "bytes", "latency"}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _http(self):
+        with self._lock:
+            if self._client is None:
+                import httpx
+                try:
+                    import h2  # noqa: F401
+                    http2 = True
+                except ImportError:
+                    http2 = False
+                self._client = httpx.Client(
+                    http2=http2,
+                    follow_redirects=True,
+                    timeout=120,
+                    limits=httpx.Limits(max_connections=self._max_connections,
+                                        max_keepalive_connections=self._max_connections),
+                    headers={
+                        "Referer": "https://www.aliyundrive.com/",
+                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+                    }
+                )
+            return self._client
+
+    def url_info(self, file_id: str, refresh: bool = False):
+        """获取文件下载信息（url/size/content_hash），短时缓存"""
+        now = time.time()
+        if not refresh:
+            with self._lock:
+                cached = self._urls.get(file_id)
+            if cached and cached[1] > now:
+                return cached[0]
+        info = self._ali_client.get_download_url(file_id=file_id)
+        if info and getattr(info, "url", None):
+            with self._lock:
+                self._urls[file_id] = (info, now + self._url_ttl)
+        return info
+
+    def _sha1_range(self, url: str, sign_check: str) -> Tuple[str, int]:
+        _sha1 = sha1()
+        total = 0
+        with self._http().stream("GET", url, headers={"Range": f"bytes={sign_check}"}) as r:
+            r.raise_for_status()
+            for chunk in r.iter_bytes(chunk_size=self._chunk_size):
+                _sha1.update(chunk)
+                total += len(chunk)
+        return _sha1.hexdigest().upper(), total
+
+    def hash_range(self, file_id: str, sign_check: str) -> str:
+        """计算文件指定区间的 SHA1（大写），链接失效时刷新后重试一次"""
+        start = time.time()
+        try:
+            url = self.url_info(file_id).url
+            try:
+                digest, size = self._sha1_range(url, sign_check)
+            except Exception as e:
+                logger.debug(f"mhnotify: 二次校验读取失败，刷新下载链接后重试: {e}")
+                url = self.url_info(file_id, refresh=True).url
+                digest, size = self._sha1_range(url, sign_check)
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                stat = self._stats.setdefault(file_id, {"checks": 0, "bytes": 0, "latency": 0.0})
+                stat["checks"] += 1
+                stat["latency"] += elapsed
+        with self._lock:
+            stat["bytes"] += size
+        return digest
+
+    def stats(self, file_id: str) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats.get(file_id) or {"checks": 0, "bytes": 0, "latency": 0.0})
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            self._urls.clear()
+        if client is not None:
+            client.close()
+
+
 class AliTo115Mixin:
 
+    # 秒传并发数
+    _ALI2115_WORKERS = 4
+
     def handle_ali_to_115(self, event: Event):
         """远程命令触发：阿里云盘分享秒传到115"""
         if not event:
@@ -92,11 +199,11 @@ class AliTo115Mixin:
         :param channel: 消息通道
         :param userid: 用户ID
         """
-        from hashlib import sha1
-        from time import sleep
+        from time import sleep, monotonic
         from urllib.parse import urlparse
         from pathlib import Path
         
+        hasher = None
         try:
             # 导入依赖
             try:
@@ -282,9 +389,10 @@ class AliTo115Mixin:
             
             logger.info(f"mhnotify: 找到 {len(share_files)} 个媒体/字幕文件待秒传")
             
-            # 获取已转存文件的下载链接和SHA1
-            download_url_list = []
+            # 定位已转存文件（按 (相对路径, 文件名) 建索引，遍历时 O(1) 匹配）
+            matched_files = []
             remove_list = []
+            seen_ids = set()
             
             def walk_files(parent_file_id, callback, current_rel_path=""):
                 """遍历阿里云盘目录"""
@@ -298,39 +406,23 @@ class AliTo115Mixin:
                 except Exception as e:
                     logger.warning(f"mhnotify: 遍历文件夹异常: {e}")
             
-            file_info_list = list(share_files)
+            pending_files = {(f.get("rel_path"), f.get("name")): f for f in share_files}
             
             def collect_file_info(file, rel_path):
-                nonlocal file_info_list
                 # 记录所有遍历到的文件ID，以便后续删除
-                if file.file_id not in remove_list:
+                if file.file_id not in seen_ids:
+                    seen_ids.add(file.file_id)
                     remove_list.append(file.file_id)
                 
-                # 检查是否是我们需要的目标文件
+                # 检查是否是我们需要的目标文件（匹配文件名与相对路径）
                 if file.type == "file":
-                    # 匹配文件名与相对路径
-                    matched_info = None
-                    for info in file_info_list:
-                        if info.get("name") == file.name and info.get("rel_path") == rel_path:
-                            matched_info = info
-                            break
-                    
+                    matched_info = pending_files.pop((rel_path, file.name), None)
                     if matched_info:
-                        try:
-                            url_info = ali_client.get_download_url(file_id=file.file_id)
-                            if url_info and url_info.url:
-                                info = {
-                                    "url": url_info.url,
-                                    "size": url_info.size,
-                                    "name": matched_info.get("name"),
-                                    "rel_path": rel_path,
-                                    "sha1": str(url_info.content_hash).upper(),
-                                    "file_id": file.file_id
-                                }
-                                download_url_list.append(info)
-                                file_info_list = [i for i in file_info_list if i != matched_info]
-                        except Exception as e:
-                            logger.warning(f"mhnotify: 获取文件 {file.name} 下载链接失败: {e}")
+                        matched_files.append({
+                            "name": matched_info.get("name"),
+                            "rel_path": rel_path,
+                            "file_id": file.file_id
+                        })
 
             # 第一次全量刷新目录缓存，确保能获取到最新转存的文件
             # 注意：ali_client.get_file_list 默认可能有缓存，尝试强制遍历
@@ -338,19 +430,19 @@ class AliTo115Mixin:
             
             # 最多尝试10次获取所有文件信息 (增加重试次数)
             for attempt in range(10):
-                if not file_info_list:
+                if not pending_files:
                     break
                 walk_files(ali_folder_id, collect_file_info)
-                if file_info_list:
-                    logger.info(f"mhnotify: 尚有 {len(file_info_list)} 个文件未获取到下载信息，等待重试 ({attempt+1}/10)...")
+                if pending_files:
+                    logger.info(f"mhnotify: 尚有 {len(pending_files)} 个文件未在转存目录中找到，等待重试 ({attempt+1}/10)...")
                     sleep(3)
             
-            if not download_url_list:
+            if not matched_files:
                 logger.error("mhnotify: 未能获取任何文件的下载信息")
                 # 尝试列出当前目录下的文件，辅助排查
                 try:
                     logger.info("mhnotify: 当前阿里云盘临时目录下的文件列表:")
-                    def log_file(f):
+                    def log_file(f, _rel_path=""):
                         logger.info(f"  - {f.name} ({f.type})")
                     walk_files(ali_folder_id, log_file)
                 except:
@@ -364,105 +456,90 @@ class AliTo115Mixin:
                 )
                 return
             
-            logger.info(f"mhnotify: 获取到 {len(download_url_list)} 个文件的下载信息")
+            logger.info(f"mhnotify: 在转存目录中找到 {len(matched_files)} 个待秒传文件")
             
             # 执行秒传到115
             success_count = 0
             fail_count = 0
             
-            # 创建用于二次校验的辅助函数
-            def calculate_sha1_range(url: str, sign_check: str) -> str:
-                """计算指定范围的 sha1"""
-                import httpx
-                headers = {
-                    "Range": f"bytes={sign_check}",
-                    "Referer": "https://www.aliyundrive.com/",
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }
-                with httpx.stream("GET", url, headers=headers, follow_redirects=True, timeout=120) as r:
-                    r.raise_for_status()
-                    _sha1 = sha1()
-                    for chunk in r.iter_bytes(chunk_size=8192):
-                        _sha1.update(chunk)
-                    return _sha1.hexdigest().upper()
-            
-            def make_read_range_func(file_id: str, fallback_url: str):
-                """创建一个读取范围数据的函数，每次调用时实时获取新的下载链接"""
-                def read_range_bytes_or_hash(sign_check: str) -> str:
-                    # 每次二次校验时都重新获取下载链接（阿里云盘链接过期很快）
-                    try:
-                        url_info = ali_client.get_download_url(file_id=file_id)
-                        url = url_info.url
-                        logger.debug(f"mhnotify: 获取新的下载链接进行二次校验")
-                    except Exception as e:
-                        logger.warning(f"mhnotify: 二次校验时获取下载链接失败: {e}，使用备用链接")
-                        url = fallback_url
-                    return calculate_sha1_range(url, sign_check)
-                return read_range_bytes_or_hash
-            
-            # 115 目录缓存 (rel_path -> cid)
+            # 二次校验：共享连接池与下载链接缓存，各上传线程并发校验
+            hasher = RangeHashService(ali_client)
+            
+            # 115 目录缓存 (rel_path -> cid)，上传前统一创建，避免并发上传时重复建目录
             cid_cache = {"": target_cid}
+            for rel_path in sorted({f["rel_path"] for f in matched_files if f["rel_path"]}):
+                try:
+                    full_dest_path = f"{target_path}/{rel_path}".replace('//', '/')
+                    mkdir_resp = p115_client.fs_makedirs_app(full_dest_path, pid=0)
+                    if mkdir_resp and mkdir_resp.get("cid"):
+                        cid_cache[rel_path] = int(mkdir_resp.get("cid"))
+                except Exception as e:
+                    logger.warning(f"mhnotify: 确保115目录 {rel_path} 存在失败: {e}")
 
-            def upload_to_115(file_info: dict):
-                """上传文件到115"""
+            def upload_to_115(file_info: dict, refresh: bool = False):
+                """上传文件到115（重试时重新获取下载链接与 SHA1）"""
                 file_id = file_info.get("file_id")
-                file_name = file_info.get("name")
-                fallback_url = file_info.get("url")
-                rel_path = file_info.get("rel_path", "")
-                
-                # 获取或创建115目标子目录
-                dest_cid = target_cid
-                if rel_path:
-                    if rel_path in cid_cache:
-                        dest_cid = cid_cache[rel_path]
-                    else:
-                        try:
-                            full_dest_path = f"{target_path}/{rel_path}".replace('//', '/')
-                            mkdir_resp = p115_client.fs_makedirs_app(full_dest_path, pid=0)
-                            if mkdir_resp and mkdir_resp.get("cid"):
-                                dest_cid = int(mkdir_resp.get("cid"))
-                                cid_cache[rel_path] = dest_cid
-                        except Exception as e:
-                            logger.warning(f"mhnotify: 确保115目录 {rel_path} 存在失败: {e}")
-                
-                # 创建专属于这个文件的读取函数
-                read_range_func = make_read_range_func(file_id, fallback_url)
+                url_info = hasher.url_info(file_id, refresh=refresh)
+                if not url_info or not url_info.url:
+                    raise Exception("获取下载链接失败")
                 
                 return p115_client.upload_file_init(
-                    filename=file_name,
-                    filesize=file_info.get("size"),
-                    filesha1=file_info.get("sha1"),
-                    pid=dest_cid,
-                    read_range_bytes_or_hash=read_range_func,
+                    filename=file_info.get("name"),
+                    filesize=url_info.size,
+                    filesha1=str(url_info.content_hash).upper(),
+                    pid=cid_cache.get(file_info.get("rel_path", ""), target_cid),
+                    read_range_bytes_or_hash=lambda sign_check: hasher.hash_range(file_id, sign_check),
                 )
             
-            # 顺序上传（避免并发时下载链接混乱）
-            for file_info in download_url_list:
-                file_name = file_info.get("name")
-                retries = 0
-                max_retries = 3
-                
-                while retries <= max_retries:
-                    try:
-                        result = upload_to_115(file_info)
-                        if result and isinstance(result, dict) and result.get("status") == 2:
-                            logger.info(f"mhnotify: 文件 '{file_name}' 秒传成功")
-                            success_count += 1
-                            break
-                        else:
+            # 并发上传：失败的文件按各自的退避时间重新排队，不阻塞其他文件
+            max_retries = 3
+            workers = max(1, min(self._ALI2115_WORKERS, len(matched_files)))
+            ready_queue = [(0.0, idx, 0) for idx in range(len(matched_files))]  # (可执行时间, 文件序号, 已重试次数)
+            heapq.heapify(ready_queue)
+            running = {}
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mhnotify-ali2115") as executor:
+                while ready_queue or running:
+                    now = monotonic()
+                    while ready_queue and len(running) < workers and ready_queue[0][0] <= now:
+                        _, idx, retries = heapq.heappop(ready_queue)
+                        running[executor.submit(upload_to_115, matched_files[idx], retries > 0)] = (idx, retries)
+                    if not running:
+                        sleep(max(0.0, ready_queue[0][0] - now))
+                        continue
+                    timeout = None
+                    if ready_queue and len(running) < workers:
+                        timeout = max(0.0, ready_queue[0][0] - now)
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        idx, retries = running.pop(future)
+                        file_name = matched_files[idx].get("name")
+                        try:
+                            result = future.result()
+                            if result and isinstance(result, dict) and result.get("status") == 2:
+                                check = hasher.stats(matched_files[idx].get("file_id"))
+                                if check["checks"]:
+                                    logger.info(f"mhnotify: 文件 '{file_name}' 秒传成功（二次校验 {check['checks']} 次，"
+                                                f"{check['bytes']} 字节，耗时 {check['latency']:.2f}s）")
+                                else:
+                                    logger.info(f"mhnotify: 文件 '{file_name}' 秒传成功")
+                                success_count += 1
+                                continue
                             status_code = result.get("status", "N/A") if isinstance(result, dict) else "N/A"
                             logger.warning(f"mhnotify: 文件 '{file_name}' 上传状态异常 (status: {status_code})")
-                    except Exception as exc:
-                        logger.warning(f"mhnotify: 文件 '{file_name}' 上传异常: {exc}")
-                    
-                    retries += 1
-                    if retries <= max_retries:
-                        delay = 2 * (2 ** (retries - 1))
-                        logger.info(f"mhnotify: 文件 '{file_name}' 将在 {delay} 秒后进行第 {retries} 次重试...")
-                        sleep(delay)
-                    else:
-                        logger.error(f"mhnotify: 文件 '{file_name}' 已达到最大重试次数，放弃上传")
-                        fail_count += 1
+                        except Exception as exc:
+                            logger.warning(f"mhnotify: 文件 '{file_name}' 上传异常: {exc}")
+                        
+                        retries += 1
+                        if retries <= max_retries:
+                            delay = 2 * (2 ** (retries - 1))
+                            logger.info(f"mhnotify: 文件 '{file_name}' 将在 {delay} 秒后进行第 {retries} 次重试...")
+                            heapq.heappush(ready_queue, (monotonic() + delay, idx, retries))
+                        else:
+                            logger.error(f"mhnotify: 文件 '{file_name}' 已达到最大重试次数，放弃上传")
+                            fail_count += 1
+            if pending_files:
+                fail_count += len(pending_files)
+                logger.warning(f"mhnotify: {len(pending_files)} 个文件未在转存目录中找到，计为失败")
             # 清理阿里云盘临时文件
             try:
                 logger.info("mhnotify: 开始清理阿里云盘临时文件...")
@@ -521,6 +598,9 @@ class AliTo115Mixin:
                 text=f"秒传过程中发生错误: {str(e)}",
                 userid=userid
             )
+        finally:
+            if hasher:
+                hasher.close()
 
     @staticmethod
     def _extract_ali_share_code(url: str) -> Tuple[Optional[str], Optional[str]]:
@@ -1,15 +1,469 @@
-from typing import List, Tuple, Dict, Any, Optional, Union
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Tuple, Dict, Any, Optional, Union, Callable
 
 from app.core.config import settings
 from app.core.event import Event
+from app.db import SessionFactory
+from app.db.subscribe_oper import SubscribeOper
 from app.schemas.types import NotificationType
+from app.utils.http import RequestUtils
 from app.log import logger
 
 
+class _OfflineWatch:
+    """单个 info_hash 的订阅记录"""
+
+    def __init__(self, info_hash: str, name: str, not_before: float, deadline: float):
+        self.info_hash = info_hash
+        self.name = name
+        self.not_before = not_before
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.on_progress: List[Callable[[Dict[str, Any]], None]] = []
+        self.missing = 0
+
+
+class OfflineTaskTracker:
+    """
+    115 离线任务统一跟踪器：
+    - 单个后台线程按固定间隔分页拉取一次全部离线任务列表（stat=11），所有订阅共享同一次查询结果；
+    - 按 info_hash 分发：下载中回调 on_progress，结束（完成/失败/删除/超时）时完成对应 Future；
+    - Future 的结果与回调在工作线程池中执行，耗时的后处理不会阻塞轮询；
+    - 没有订阅时线程自动退出，再次订阅时重新启动。
+    """
+
+    DONE = "done"
+    FAILED = "failed"
+    DELETED = "deleted"
+    TIMEOUT = "timeout"
+
+    # task_lists 的 stat 参数：11=所有任务，1=失败任务
+    STAT_ALL = 11
+    STAT_FAILED = 1
+
+    def __init__(self, fetch_page: Callable[[int, int], Optional[Dict[str, Any]]],
+                 interval: int = 30, settle: int = 15, max_missing: int = 3,
+                 max_pages: int = 50, workers: int = 4):
+        """
+        :param fetch_page: 拉取单页任务列表的函数 (stat, page) -> 响应字典，失败返回 None
+        :param interval: 轮询间隔（秒）
+        :param settle: 新任务提交后等待多久再开始查询（秒），让任务进入下载队列
+        :param max_missing: 任务连续多少轮未出现在列表中才认为已删除/失败
+        :param max_pages: 单轮最多翻页数
+        :param workers: 回调工作线程数
+        """
+        self._fetch_page = fetch_page
+        self._interval = interval
+        self._settle = settle
+        self._max_missing = max_missing
+        self._max_pages = max_pages
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._watches: Dict[str, _OfflineWatch] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {"polls": 0, "pages": 0, "errors": 0}
+
+    def bind(self, fetch_page: Callable[[int, int], Optional[Dict[str, Any]]]):
+        """插件重载后切换到新实例的查询函数（使用最新的 Cookie）"""
+        self._fetch_page = fetch_page
+
+    def watch(self, info_hash: str, name: str = "",
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+              timeout: int = 86400) -> Future:
+        """
+        订阅离线任务状态，同一 info_hash 重复订阅共享同一个 Future
+        :return: Future，结果为 {"state", "info_hash", "name", "task"}
+        """
+        key = str(info_hash or "").lower()
+        now = time.time()
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                watch = _OfflineWatch(key, name, now + self._settle, now + timeout)
+                self._watches[key] = watch
+            if on_progress:
+                watch.on_progress.append(on_progress)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="mhnotify-offline")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mhnotify-offline-tracker", daemon=True)
+                self._thread.start()
+        return watch.future
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """在回调线程池中执行任务"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="mhnotify-offline")
+            return self._executor.submit(fn, *args, **kwargs)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._watches:
+                    self._thread = None
+                    return
+                now = time.time()
+                due = {k: w for k, w in self._watches.items() if w.not_before <= now}
+                next_due = min(w.not_before for w in self._watches.values())
+            if due:
+                try:
+                    self._poll(due)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"mhnotify: 离线任务跟踪轮询异常: {e}")
+                delay = self._interval
+            else:
+                delay = max(1.0, next_due - time.time())
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _scan(self, stat: int, wanted: set) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+        """
+        分页查找任务，找齐或翻到最后一页即停止
+        :return: ({info_hash: task}, 是否完整遍历)
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        remaining = set(wanted)
+        for page in range(1, self._max_pages + 1):
+            result = self._fetch_page(stat, page)
+            self.stats["pages"] += 1
+            if not result or not result.get("state"):
+                self.stats["errors"] += 1
+                return found, False
+            tasks = result.get("tasks") or []
+            for task in tasks:
+                key = str(task.get("info_hash") or "").lower()
+                if key in remaining:
+                    found[key] = task
+                    remaining.discard(key)
+            try:
+                page_count = int(result.get("page_count") or 1)
+            except (TypeError, ValueError):
+                page_count = 1
+            if not remaining or not tasks or page >= page_count:
+                return found, True
+        return found, False
+
+    def _poll(self, due: Dict[str, _OfflineWatch]):
+        self.stats["polls"] += 1
+        found, complete = self._scan(self.STAT_ALL, set(due))
+        now = time.time()
+        missing: List[_OfflineWatch] = []
+        for key, watch in due.items():
+            task = found.get(key)
+            if task is not None:
+                watch.missing = 0
+                status = task.get("status", 0)
+                # 2=已完成，-1=失败，0/1=等待/下载中
+                if status == 2:
+                    self._resolve(watch, self.DONE, task)
+                    continue
+                if isinstance(status, int) and status < 0:
+                    self._resolve(watch, self.FAILED, task)
+                    continue
+                for callback in list(watch.on_progress):
+                    try:
+                        callback(task)
+                    except Exception as e:
+                        logger.debug(f"mhnotify: 离线任务进度回调异常: {e}")
+            elif complete:
+                watch.missing += 1
+                if watch.missing >= self._max_missing:
+                    missing.append(watch)
+            if watch.deadline <= now:
+                self._resolve(watch, self.TIMEOUT, task)
+
+        if missing:
+            # 任务列表中连续多轮找不到，再查一次失败列表区分失败与删除
+            failed, _ = self._scan(self.STAT_FAILED, {w.info_hash for w in missing})
+            for watch in missing:
+                task = failed.get(watch.info_hash)
+                self._resolve(watch, self.FAILED if task else self.DELETED, task)
+
+    def _resolve(self, watch: _OfflineWatch, state: str, task: Optional[Dict[str, Any]]):
+        with self._lock:
+            if self._watches.get(watch.info_hash) is not watch:
+                return
+            self._watches.pop(watch.info_hash, None)
+            executor = self._executor
+        result = {"state": state, "info_hash": watch.info_hash, "name": watch.name, "task": task}
+        executor.submit(watch.future.set_result, result)
+
+
+class SmallFilePruner:
+    """
+    115 目录小文件清理：
+    - 优先用 p115client 的 iter_files 一次性递归列出整棵目录树的文件，不可用时有限并发逐目录分页列出；
+    - 先汇总整棵树需要删除的文件，再分批调用 fs_delete，批次之间限速；
+    - 批量删除失败时对半拆分重试，单个文件删除失败不影响其余文件。
+    """
+
+    # 小于阈值也保留的字幕文件
+    KEEP_EXTS = ('.srt', '.ass', '.sup')
+
+    def __init__(self, client, min_size: int = 10 * 1024 * 1024, workers: int = 4,
+                 page_size: int = 1000, batch_size: int = 500, min_interval: float = 1.0):
+        self._client = client
+        self._min_size = min_size
+        self._workers = max(1, workers)
+        self._page_size = page_size
+        self._batch_size = max(1, batch_size)
+        self._min_interval = min_interval
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+        self.stats = {"dirs": 0, "files": 0, "planned": 0, "delete_calls": 0, "failed": 0}
+
+    @staticmethod
+    def _parse_item(item: Dict[str, Any]) -> Optional[Tuple[bool, int, str, int]]:
+        """
+        兼容 iter_files / fs_files 新旧字段格式，返回 (是否目录, ID, 名称, 大小)
+        """
+        if not isinstance(item, dict):
+            return None
+        # 根据 p115client 的逻辑：
+        # - 如果有 'n' 字段: 没有 'fid' 的是目录
+        # - 如果有 'fn' 字段: fc == "0" 是目录，fc == "1" 是文件
+        if 'is_dir' in item:
+            is_dir = bool(item.get('is_dir'))
+        elif 'n' in item:
+            is_dir = 'fid' not in item
+        elif 'fn' in item:
+            is_dir = item.get('fc') in ('0', 0)
+        else:
+            is_dir = item.get('file_category') in ('0', 0)
+
+        if is_dir:
+            item_id = item.get('cid') or item.get('id') or item.get('category_id')
+            name = item.get('n') or item.get('fn') or item.get('name') or item.get('category_name') or ''
+            size = 0
+        else:
+            item_id = item.get('fid') or item.get('file_id') or item.get('id')
+            name = item.get('n') or item.get('fn') or item.get('name') or item.get('file_name') or ''
+            size = item.get('s') or item.get('fs') or item.get('size') or item.get('file_size') or 0
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            size = 0
+        return is_dir, item_id, name, size
+
+    def _list_dir(self, cid: int) -> Tuple[List[int], List[Tuple[int, str, int]]]:
+        """分页列出单个目录，返回 (子目录ID列表, 文件列表)"""
+        subdirs: List[int] = []
+        files: List[Tuple[int, str, int]] = []
+        offset = 0
+        while True:
+            try:
+                resp = self._client.fs_files(cid=cid, limit=self._page_size, offset=offset)
+            except Exception as e:
+                logger.warning(f"mhnotify: fs_files 调用失败 (cid={cid}): {e}")
+                break
+            items = []
+            if isinstance(resp, dict):
+                items = resp.get('data', []) or resp.get('files', [])
+            if not items:
+                break
+            for item in items:
+                parsed = self._parse_item(item)
+                if not parsed:
+                    continue
+                is_dir, item_id, name, size = parsed
+                if is_dir:
+                    subdirs.append(item_id)
+                else:
+                    files.append((item_id, name, size))
+            if len(items) < self._page_size:
+                break
+            offset += self._page_size
+        return subdirs, files
+
+    def _walk(self, cid: int) -> List[Tuple[int, str, int]]:
+        """有限并发逐目录遍历整棵目录树"""
+        files: List[Tuple[int, str, int]] = []
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="mhnotify-prune") as executor:
+            pending = {executor.submit(self._list_dir, cid)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subdirs, dir_files = future.result()
+                    self.stats["dirs"] += 1
+                    files.extend(dir_files)
+                    for sub_cid in subdirs:
+                        pending.add(executor.submit(self._list_dir, sub_cid))
+        return files
+
+    def _list_tree(self, cid: int) -> List[Tuple[int, str, int]]:
+        """列出目录树下的全部文件 (ID, 名称, 大小)"""
+        try:
+            from p115client.tool.iterdir import iter_files  # type: ignore
+        except ImportError:
+            logger.warning("mhnotify: iter_files 导入失败，使用逐目录遍历...")
+            return self._walk(cid)
+        try:
+            files = []
+            for attr in iter_files(self._client, cid):
+                parsed = self._parse_item(attr)
+                if parsed and not parsed[0]:
+                    files.append(parsed[1:])
+            return files
+        except Exception as e:
+            logger.warning(f"mhnotify: iter_files 调用失败: {e}，使用逐目录遍历...")
+            return self._walk(cid)
+
+    def _wait_rate_limit(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait_time = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self._min_interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def _delete(self, batch: List[Tuple[int, str, int]]) -> List[Tuple[int, str, int]]:
+        """删除一批文件，返回删除成功的文件；失败时对半拆分重试"""
+        self._wait_rate_limit()
+        self.stats["delete_calls"] += 1
+        error = None
+        try:
+            resp = self._client.fs_delete([file_id for file_id, _, _ in batch])
+            ok = not isinstance(resp, dict) or bool(resp.get('state', True))
+            if not ok:
+                error = resp.get('error') or resp.get('errno')
+        except Exception as e:
+            ok = False
+            error = e
+        if ok:
+            return batch
+        if len(batch) == 1:
+            self.stats["failed"] += 1
+            logger.warning(f"mhnotify: 删除文件失败 {batch[0][1]}: {error}")
+            return []
+        mid = len(batch) // 2
+        return self._delete(batch[:mid]) + self._delete(batch[mid:])
+
+    def run(self, cid: int) -> Tuple[int, int]:
+        """
+        清理目录树中的小文件
+        :return: (删除文件数量, 删除文件总大小字节数)
+        """
+        files = self._list_tree(cid)
+        self.stats["files"] = len(files)
+        plan = [
+            f for f in files
+            if f[2] < self._min_size and not f[1].lower().endswith(self.KEEP_EXTS)
+        ]
+        self.stats["planned"] = len(plan)
+        if not plan:
+            return 0, 0
+        logger.info(f"mhnotify: 扫描 {len(files)} 个文件，计划删除 {len(plan)} 个小文件")
+        removed: List[Tuple[int, str, int]] = []
+        for i in range(0, len(plan), self._batch_size):
+            batch = plan[i:i + self._batch_size]
+            for _, name, size in batch:
+                logger.debug(f"mhnotify: 准备删除小文件: {name} ({size/1024/1024:.2f}MB)")
+            removed.extend(self._delete(batch))
+        return len(removed), sum(size for _, _, size in removed)
+
+
+_BTL_SIZE_RE = re.compile(r"^\s*([\d\.]+)\s*([a-zA-Z]+)\s*$")
+_BTL_SIZE_UNITS = {
+    "B": 1, "BYTE": 1, "BYTES": 1,
+    "KB": 1024, "K": 1024, "KIB": 1024,
+    "MB": 1024 ** 2, "M": 1024 ** 2, "MIB": 1024 ** 2,
+    "GB": 1024 ** 3, "G": 1024 ** 3, "GIB": 1024 ** 3,
+    "TB": 1024 ** 4, "T": 1024 ** 4, "TIB": 1024 ** 4,
+}
+_MAGNET_BTIH_RE = re.compile(r"xt=urn:btih:([0-9a-fA-F]{40}|[a-zA-Z2-7]{32})(?:&|$)")
+
+
+def _btl_size_bytes(item: Dict[str, Any]) -> int:
+    """解析 BTL 资源大小（zsize 如 "39.76 GB" 或纯字节数），无法解析时返回 0"""
+    s = str(item.get("zsize") or item.get("size") or item.get("file_size") or item.get("filesize") or "").strip()
+    if not s:
+        return 0
+    if s.isdigit():
+        return int(s)
+    m = _BTL_SIZE_RE.match(s)
+    if not m:
+        return 0
+    try:
+        return int(float(m.group(1)) * _BTL_SIZE_UNITS.get(m.group(2).upper(), 1))
+    except ValueError:
+        return 0
+
+
+def _btl_features(name_u: str) -> Tuple[str, str, str]:
+    """从大写资源名中提取 (分辨率, HDR, 编码)"""
+    res = ""
+    for r in ("2160P", "1080P", "720P", "480P"):
+        if r in name_u:
+            res = r.lower()
+            break
+    hdr = ""
+    for h in ("DV", "HDR10+", "HDR10", "HDR", "HDR VIVID"):
+        if h in name_u:
+            hdr = h
+            break
+    codec = ""
+    if any(k in name_u for k in ("H265", "X265", "HEVC")):
+        codec = "H265"
+    elif any(k in name_u for k in ("H264", "X264", "AVC")):
+        codec = "H264"
+    elif "AV1" in name_u:
+        codec = "AV1"
+    return res, hdr, codec
+
+
 class CloudDownloadMixin:
 
+    # 离线任务跟踪器（类级别共享）
+    _offline_tracker_inst: Optional[OfflineTaskTracker] = None
+    _offline_tracker_lock = threading.Lock()
+
+    # BTL 搜索/详情结果缓存（类级别共享）：key -> (过期时间, 结果)
+    _btl_cache: Dict[Tuple[str, ...], Tuple[float, List[Dict[str, Any]]]] = {}
+    _btl_cache_lock = threading.Lock()
+    _btl_cache_ttl = 1800
+    # 质量优先级缓存：(access_token, 过期时间, 配置)
+    _quality_priority_cache: Optional[Tuple[str, float, Dict[str, Any]]] = None
+    _quality_priority_ttl = 600
+    # 云下载辅助并行探测的候选数
+    _offline_probe_top_k = 5
+
+    def _btl_cache_get(self, key: Tuple[str, ...]) -> Optional[List[Dict[str, Any]]]:
+        with CloudDownloadMixin._btl_cache_lock:
+            cached = CloudDownloadMixin._btl_cache.get(key)
+            if cached and cached[0] > time.time():
+                return list(cached[1])
+        return None
+
+    def _btl_cache_put(self, key: Tuple[str, ...], value: List[Dict[str, Any]]):
+        """缓存非空结果，同时清理已过期的条目"""
+        if not value:
+            return
+        now = time.time()
+        with CloudDownloadMixin._btl_cache_lock:
+            cache = CloudDownloadMixin._btl_cache
+            for k in [k for k, v in cache.items() if v[0] <= now]:
+                cache.pop(k, None)
+            cache[key] = (now + self._btl_cache_ttl, list(value))
+
     def _btl_get_video_detail(self, access_token: str, douban_id: Union[str, int]) -> List[Dict[str, Any]]:
         try:
+            cache_key = ("detail", str(douban_id))
+            cached = self._btl_cache_get(cache_key)
+            if cached is not None:
+                logger.info(f"mhnotify: BTL详情命中缓存 id={douban_id} 资源条数={len(cached)}")
+                return cached
             base = "https://web5.mukaku.com/prod/api/v1/getVideoDetail"
             params = {
                 "id": str(douban_id),
@@ -53,13 +507,20 @@ class CloudDownloadMixin:
                     break
                 except Exception:
                     time.sleep(1 + i)
-            return seeds if isinstance(seeds, list) else []
+            seeds = seeds if isinstance(seeds, list) else []
+            self._btl_cache_put(cache_key, seeds)
+            return seeds
         except Exception:
             logger.info("mhnotify: BTL详情调用异常")
             return []
 
     def _btl_get_video_list(self, title: str, page: int = 1, limit: int = 24, app_id:str= "83768d9ad4" , identity: str="23734adac0301bccdcb107c4aa21f96c") -> List[Dict[str, Any]]:
         try:
+            cache_key = ("list", title, str(page), str(limit))
+            cached = self._btl_cache_get(cache_key)
+            if cached is not None:
+                logger.info(f"mhnotify: BTL getVideoList 命中缓存 sb={title} 条目数={len(cached)}")
+                return cached
             base = "https://web5.mukaku.com/prod/api/v1/getVideoList"
             params = {
                 "sb": title,
@@ -95,17 +556,21 @@ class CloudDownloadMixin:
                     break
                 except Exception:
                     time.sleep(1 + i)
-            return inner if isinstance(inner, list) else []
+            inner = inner if isinstance(inner, list) else []
+            self._btl_cache_put(cache_key, inner)
+            return inner
         except Exception:
             logger.info("mhnotify: BTL getVideoList 调用异常")
             return []
 
     def _get_quality_priority(self, access_token: str) -> Dict[str, Any]:
+        cached = CloudDownloadMixin._quality_priority_cache
+        if cached and cached[0] == access_token and cached[1] > time.time():
+            return cached[2]
         try:
-            url = f"{self._mh_domain}/api/v1/task_rules/subscription"
-            headers = self._auth_headers(access_token)
-            logger.info(f"mhnotify: 获取质量优先级配置 GET {url}")
-            res = RequestUtils(headers=headers).get_res(url)
+            path = "/api/v1/task_rules/subscription"
+            logger.info(f"mhnotify: 获取质量优先级配置 GET {self._mh_domain}{path}")
+            res = self._mh_request("get", path, access_token)
             if not res or res.status_code != 200:
                 logger.error(f"mhnotify: 获取质量优先级失败 status={getattr(res, 'status_code', 'N/A')} body={getattr(res, 'text', '')[:200]}")
                 return {}
@@ -115,6 +580,7 @@ class CloudDownloadMixin:
             hp = qp.get("hdr_priority") or []
             cp = qp.get("codec_priority") or []
             logger.info(f"mhnotify: 质量优先级摘要 resolution={rp} hdr={hp} codec={cp}")
+            CloudDownloadMixin._quality_priority_cache = (access_token, time.time() + self._quality_priority_ttl, qp)
             return qp
         except Exception:
             logger.error("mhnotify: 获取质量优先级异常", exc_info=True)
@@ -226,123 +692,144 @@ class CloudDownloadMixin:
                 result += group_list
         return result
 
+    def _resolve_btl_candidates(self, access_token: str, douban_id: Optional[Union[str, int]],
+                                title: str) -> Tuple[Optional[Union[str, int]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        云下载辅助资源解析：质量优先级与 BTL 搜索/详情并行获取（均带缓存），随后排序
+        :param douban_id: 豆瓣ID，缺失时按标题搜索电影条目回退
+        :return: (豆瓣ID, BTL资源列表, 排序后的候选列表)
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="mhnotify-qp") as executor:
+            qp_future = executor.submit(self._get_quality_priority, access_token)
+            if not douban_id and title:
+                try:
+                    for rec in self._btl_get_video_list(title) or []:
+                        r_type = int(rec.get("type") or 0)
+                        r_title = str(rec.get("title") or "").strip()
+                        if r_type == 1 and r_title and r_title == title:
+                            douban_id = rec.get("doub_id") or rec.get("douban_id") or rec.get("id") or rec.get("db_id")
+                            break
+                    if douban_id:
+                        logger.info(f"mhnotify: BTL getVideoList 匹配到豆瓣ID={douban_id}")
+                    else:
+                        logger.info("mhnotify: BTL getVideoList 未匹配到电影条目或标题不一致")
+                except Exception:
+                    douban_id = None
+            details = self._btl_get_video_detail(access_token, douban_id) if douban_id else []
+            try:
+                qp = qp_future.result() or {}
+            except Exception:
+                qp = {}
+        logger.info(f"mhnotify: 云下载辅助：质量优先级已获取 keys={list(qp.keys()) if isinstance(qp, dict) else []}")
+        logger.info(f"mhnotify: 云下载辅助：BTL资源条数={len(details)}")
+        candidates = self._select_btl_resources_by_quality_priority(details, qp) if details else []
+        return douban_id, details, candidates
+
     def _select_btl_resources_by_quality_priority(self, resources: List[Dict[str, Any]], qp: Dict[str, Any]) -> List[Dict[str, Any]]:
+        def rank_map(values: List[str]) -> Dict[str, int]:
+            ranks: Dict[str, int] = {}
+            for i, v in enumerate(values):
+                ranks.setdefault(v, i)
+            return ranks
         try:
-            res_pri: List[str] = [str(x).lower() for x in (qp.get("resolution_priority") or [])]
-            hdr_pri: List[str] = [str(x).upper() for x in (qp.get("hdr_priority") or [])]
-            codec_pri: List[str] = [str(x).upper() for x in (qp.get("codec_priority") or [])]
+            res_rank = rank_map([str(x).lower() for x in (qp.get("resolution_priority") or [])])
+            hdr_rank = rank_map([str(x).upper() for x in (qp.get("hdr_priority") or [])])
+            codec_rank = rank_map([str(x).upper() for x in (qp.get("codec_priority") or [])])
+            res_miss = len(qp.get("resolution_priority") or []) + 1
+            hdr_miss = len(qp.get("hdr_priority") or []) + 1
+            codec_miss = len(qp.get("codec_priority") or []) + 1
             exclude_res = set([str(x).lower() for x in (qp.get("exclude_resolutions") or [])])
             exclude_hdr = set([str(x).upper() for x in (qp.get("exclude_hdr_types") or [])])
             exclude_codec = set([str(x).upper() for x in (qp.get("exclude_codecs") or [])])
         except Exception:
-            res_pri, hdr_pri, codec_pri = [], [], []
+            res_rank, hdr_rank, codec_rank = {}, {}, {}
+            res_miss, hdr_miss, codec_miss = 1, 1, 1
             exclude_res, exclude_hdr, exclude_codec = set(), set(), set()
-        def parse_size_bytes(v: Dict[str, Any]) -> int:
-            s = str(v.get("zsize") or v.get("size") or v.get("file_size") or v.get("filesize") or "").strip()
-            if not s:
-                return 0
-            if s.isdigit():
-                try:
-                    return int(s)
-                except Exception:
-                    return 0
-            try:
-                import re
-                m = re.match(r"^\s*([\d\.]+)\s*([a-zA-Z]+)\s*$", s)
-                if not m:
-                    return 0
-                num = float(m.group(1)); unit = m.group(2).upper()
-                if unit in ("B", "BYTE", "BYTES", "字节"):
-                    factor = 1
-                elif unit in ("KB", "K", "KIB"):
-                    factor = 1024
-                elif unit in ("MB", "M", "MIB"):
-                    factor = 1024 ** 2
-                elif unit in ("GB", "G", "GIB"):
-                    factor = 1024 ** 3
-                elif unit in ("TB", "T", "TIB"):
-                    factor = 1024 ** 4
-                else:
-                    factor = 1
-                return int(num * factor)
-            except Exception:
-                return 0
-        def extract_features(x: Dict[str, Any]) -> Tuple[str, str, str]:
-            name = str(x.get("zname") or x.get("name") or "")
-            name_u = name.upper()
-            # resolution
-            res = ""
-            for r in ["2160P", "1080P", "720P", "480P"]:
-                if r in name_u:
-                    res = r.lower()
-                    break
-            # hdr
-            hdr = ""
-            for h in ["DV", "HDR10+", "HDR10", "HDR", "HDR VIVID"]:
-                if h in name_u:
-                    hdr = h
-                    break
-            # codec
-            codec = ""
-            if any(k in name_u for k in ["H265", "X265", "HEVC"]):
-                codec = "H265"
-            elif any(k in name_u for k in ["H264", "X264", "AVC"]):
-                codec = "H264"
-            elif "AV1" in name_u:
-                codec = "AV1"
-            return res, hdr, codec
-        def excluded(x: Dict[str, Any]) -> bool:
+        # 每个候选只解析一次名称/大小，生成紧凑排序键：各维度按优先级下标（越小越优，缺失视为末位），再按大小倒序
+        keyed: List[Tuple[Tuple[int, int, int, int, int], Dict[str, Any]]] = []
+        for pos, x in enumerate(resources):
             g = str(x.get("definition_group") or "")
             n = str(x.get("zname") or x.get("name") or "")
-            if ("无字" in n) or ("無字" in n) or ("无字片源" in n):
-                return True
+            name_u = n.upper()
+            if ("无字" in n) or ("無字" in n):
+                continue
             if g.strip().lower() == "3d" or "3D" in g:
-                return True
-            if ("蓝光原盘" in g) and ("REMUX" not in n.upper()):
-                return True
-            res, hdr, codec = extract_features(x)
-            if res and res in exclude_res:
-                return True
-            if hdr and hdr in exclude_hdr:
-                return True
-            if codec and codec in exclude_codec:
-                return True
-            return False
-        # 过滤
-        filtered = [r for r in resources if not excluded(r)]
-        # 打分：各维度按列表下标值，越小越优；缺失视为末位
-        def pri_index(value: str, lst: List[str], normalize_upper: bool = False) -> int:
-            if not value:
-                return len(lst) + 1
-            val = value.upper() if normalize_upper else value
-            try:
-                return lst.index(val) if not normalize_upper else lst.index(val)
-            except ValueError:
-                return len(lst) + 1
-        def sort_key(x: Dict[str, Any]) -> Tuple[int, int, int, int]:
-            res, hdr, codec = extract_features(x)
-            ri = pri_index(res, res_pri)  # res_pri 已为小写
-            hi = pri_index(hdr, hdr_pri, normalize_upper=True)
-            ci = pri_index(codec, codec_pri, normalize_upper=True)
-            size = parse_size_bytes(x)
-            return (ri, hi, ci, -size)
-        try:
-            sorted_list = sorted(filtered, key=sort_key)
-        except Exception:
-            # 兜底：仅按大小
-            sorted_list = sorted(filtered, key=lambda x: parse_size_bytes(x), reverse=True)
+                continue
+            if ("蓝光原盘" in g) and ("REMUX" not in name_u):
+                continue
+            res, hdr, codec = _btl_features(name_u)
+            if (res and res in exclude_res) or (hdr and hdr in exclude_hdr) or (codec and codec in exclude_codec):
+                continue
+            key = (
+                res_rank.get(res, res_miss) if res else res_miss,
+                hdr_rank.get(hdr, hdr_miss) if hdr else hdr_miss,
+                codec_rank.get(codec, codec_miss) if codec else codec_miss,
+                -_btl_size_bytes(x),
+                pos,
+            )
+            keyed.append((key, x))
+        keyed.sort(key=lambda kx: kx[0])
+        sorted_list = [x for _, x in keyed]
         logger.info(f"mhnotify: 质量优先级排序完成，候选={len(sorted_list)}")
         if sorted_list:
             top = sorted_list[0]
             logger.info(f"mhnotify: 首选资源 name={str(top.get('zname') or top.get('name') or '')[:80]} size={str(top.get('zsize') or '')}")
         return sorted_list
 
+    @staticmethod
+    def _probe_offline_link(url: str) -> Optional[bool]:
+        """
+        无副作用地探测链接能否添加离线任务：磁力/ed2k 校验格式，HTTP 链接仅读取首字节判断是否为种子
+        HTTP 链接可能直接指向媒体文件（115 同样支持），因此非 bencode 内容视为无法判断而非不可用
+        :return: True 可用，False 不可用，None 无法判断
+        """
+        lower = url.lower()
+        if lower.startswith("magnet:"):
+            return bool(_MAGNET_BTIH_RE.search(url))
+        if lower.startswith("ed2k://"):
+            return lower.startswith("ed2k://|file|") and url.count("|") >= 5
+        if lower.startswith(("http://", "https://")):
+            res = RequestUtils(headers={"Range": "bytes=0-0"}, timeout=10).get_res(url, stream=True)
+            if res is None:
+                return None
+            try:
+                if res.status_code in (404, 410):
+                    return False
+                if res.status_code not in (200, 206):
+                    return None
+                first = next(res.iter_content(chunk_size=1), b"")
+                return True if first[:1] == b"d" else None
+            finally:
+                res.close()
+        return None
+
+    def _probe_offline_candidates(self, urls: List[str]) -> List[Optional[bool]]:
+        """并行探测多个候选链接，结果与输入顺序一致"""
+        if not urls:
+            return []
+
+        def probe(u: str) -> Optional[bool]:
+            try:
+                return self._probe_offline_link(u)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="mhnotify-probe") as executor:
+            return list(executor.map(probe, urls))
+
     def _try_cloud_download_with_candidates(self, candidates: List[Dict[str, Any]], sid: Union[str, int], mh_uuid: str) -> bool:
-        total = len(candidates or [])
-        for idx, item in enumerate(candidates or [], start=1):
-            url = str(item.get("zlink") or item.get("link") or "")
-            if not url:
-                continue
+        items = [(item, str(item.get("zlink") or item.get("link") or "")) for item in candidates or []]
+        items = [(item, url) for item, url in items if url]
+        # 前 K 个候选并行探测，明确不可用的跳过，可用的排在无法判断的之前（组内保持优先级顺序）
+        top = items[:self._offline_probe_top_k]
+        verdicts = self._probe_offline_candidates([url for _, url in top])
+        skipped = sum(1 for v in verdicts if v is False)
+        if skipped:
+            logger.info(f"mhnotify: 云下载候选探测：前 {len(top)} 个中 {skipped} 个链接不可用，已跳过")
+        ordered = [iv for iv, v in zip(top, verdicts) if v] + [iv for iv, v in zip(top, verdicts) if v is None]
+        ordered += items[len(top):]
+        total = len(ordered)
+        for idx, (item, url) in enumerate(ordered, start=1):
             name = str(item.get("zname") or item.get("name") or "")
             size = str(item.get("zsize") or "")
             logger.info(f"mhnotify: 尝试云下载候选 {idx}/{total} name={name[:80]} size={size}")
@@ -517,13 +1004,8 @@ class CloudDownloadMixin:
                         if self._cloud_download_organize:
                             logger.info(f"mhnotify: 云下载移动整理已启用，将等待任务完成后处理...")
                         
-                        # 启动异步任务监控下载完成并处理
-                        import threading
-                        threading.Thread(
-                            target=self._monitor_and_remove_small_files,
-                            args=(client, info_hash, target_cid, task_name, target_path),
-                            daemon=True
-                        ).start()
+                        # 交给共享的离线任务跟踪器，任务结束后回调处理
+                        self._watch_offline_task(client, info_hash, target_cid, task_name, target_path)
                     except Exception as e:
                         logger.warning(f"mhnotify: 启动后处理任务失败: {e}")
                 
@@ -542,26 +1024,27 @@ class CloudDownloadMixin:
 
     def _monitor_batch_downloads(self, tasks: List[Dict[str, Any]]):
         """
-        批量监控多个离线下载任务，等待全部完成后统一清理和整理
-        如果某个任务10分钟内仍在下载中，将其独立出去单独监控
+        批量监控多个离线下载任务，全部结束后统一清理和整理
+        如果某个任务下载超过10分钟仍未完成，将其独立出去单独处理
+        任务状态由共享的离线任务跟踪器推送，本方法只注册订阅，不阻塞
         :param tasks: 任务信息列表，每个元素包含 client, info_hash, target_cid, task_name, target_path
         """
-        import time
-        import threading
-        
         if not tasks:
             return
-        
+
         logger.info(f"mhnotify: 开始批量监控 {len(tasks)} 个离线下载任务")
-        
-        # 等待15秒，让任务进入下载队列
-        logger.info(f"mhnotify: 等待15秒，让任务进入下载队列...")
-        time.sleep(15)
-        
-        # 任务状态跟踪
-        task_status = {}  # info_hash -> {"completed": bool, "success": bool, "actual_cid": int, "is_directory": bool, "split_out": bool}
-        task_first_seen_downloading = {}  # info_hash -> 首次发现在下载中的时间戳
-        
+
+        tracker = self._offline_tracker()
+        split_timeout = 600  # 10分钟后将慢任务独立出去
+        progress_log_interval = 120  # 每2分钟记录一次进度
+        lock = threading.Lock()
+        finished = threading.Event()
+
+        # info_hash -> {"completed": bool, "success": bool, "actual_cid": int, "is_directory": bool, "split_out": bool}
+        task_status = {}
+        first_seen_downloading = {}  # info_hash -> 首次发现在下载中的时间戳
+        last_logged = {}  # info_hash -> 上次记录进度的时间戳
+        futures: Dict[str, Future] = {}
         for task in tasks:
             task_status[task["info_hash"]] = {
                 "completed": False,
@@ -571,167 +1054,158 @@ class CloudDownloadMixin:
                 "task_name": task["task_name"],
                 "split_out": False  # 是否已被独立出去
             }
-        
-        client = tasks[0]["client"]  # 使用第一个任务的client
-        target_path = tasks[0]["target_path"]  # 假设所有任务保存到同一目录
-        
-        # 超时配置
-        split_timeout = 600  # 10分钟后将慢任务独立出去
-        check_interval = 30  # 检查间隔：30秒（为了更快检测超时）
-        max_checks = 1440  # 最多检查12小时（30秒 * 1440 = 12小时）
-        
-        # ========== 第一阶段：监控所有任务下载完成 ==========
-        logger.info(f"mhnotify: 第一阶段 - 监控所有任务下载状态（10分钟超时后独立慢任务）...")
-        
-        for check_round in range(max_checks):
-            all_done = True  # 所有任务都已完成或被独立出去
-            current_time = time.time()
-            
-            for task in tasks:
-                info_hash = task["info_hash"]
+
+        def maybe_finish():
+            with lock:
+                if finished.is_set():
+                    return
+                if not all(s["completed"] or s["split_out"] for s in task_status.values()):
+                    return
+                finished.set()
+            logger.info(f"mhnotify: 批量监控的任务已全部处理完成")
+            tracker.submit(self._finish_batch_downloads, tasks, task_status)
+
+        def on_progress(task: Dict[str, Any], offline_task: Dict[str, Any]):
+            info_hash = task["info_hash"]
+            now = time.time()
+            percent = offline_task.get('percentDone', 0) or 0
+            with lock:
                 status = task_status[info_hash]
-                
-                # 已完成或已独立出去的任务跳过
                 if status["completed"] or status["split_out"]:
-                    continue
-                
-                all_done = False
-                
+                    return
+                if info_hash not in first_seen_downloading:
+                    first_seen_downloading[info_hash] = now
+                    last_logged[info_hash] = now
+                    logger.info(f"mhnotify: 任务开始下载: {task['task_name']}")
+                downloading_duration = now - first_seen_downloading[info_hash]
+                split = downloading_duration >= split_timeout
+                if split:
+                    status["split_out"] = True
+                elif now - last_logged[info_hash] >= progress_log_interval:
+                    last_logged[info_hash] = now
+                    remaining = int((split_timeout - downloading_duration) / 60)
+                    logger.info(f"mhnotify: 正在下载: {task['task_name']} - {percent:.1f}%（{remaining}分钟后独立）")
+            if split:
+                # 超过10分钟，独立出去单独处理，完成后单独通知
+                logger.info(f"mhnotify: 任务 {task['task_name']} 下载超过10分钟（{percent:.1f}%），独立出去单独监控")
+                futures[info_hash].add_done_callback(
+                    lambda f: self._handle_offline_task_result(
+                        task["client"], info_hash, task["target_cid"], task["task_name"], task["target_path"], f.result()
+                    )
+                )
+                maybe_finish()
+
+        def on_done(task: Dict[str, Any], future: Future):
+            result = future.result()
+            state = result.get("state")
+            offline_task = result.get("task") or {}
+            with lock:
+                status = task_status[task["info_hash"]]
+                if status["split_out"]:
+                    return
+                status["completed"] = True
+                if state == OfflineTaskTracker.DONE:
+                    status["success"] = True
+                    actual_cid = offline_task.get('file_id', '')
+                    if actual_cid:
+                        try:
+                            status["actual_cid"] = int(actual_cid)
+                        except:
+                            pass
+                    status["is_directory"] = (offline_task.get('file_category', 1) == 0)
+            if state == OfflineTaskTracker.DONE:
+                logger.info(f"mhnotify: 任务已完成: {task['task_name']}")
+            elif state == OfflineTaskTracker.FAILED:
+                logger.warning(f"mhnotify: 任务失败: {task['task_name']}")
+            elif state == OfflineTaskTracker.DELETED:
+                logger.warning(f"mhnotify: 任务可能已被删除: {task['task_name']}")
+            else:
+                logger.warning(f"mhnotify: 任务监控超时: {task['task_name']}")
+            maybe_finish()
+
+        for task in tasks:
+            futures[task["info_hash"]] = tracker.watch(
+                task["info_hash"], task["task_name"],
+                on_progress=(lambda t: lambda offline_task: on_progress(t, offline_task))(task),
+                timeout=43200  # 最多监控12小时
+            )
+        for task in tasks:
+            futures[task["info_hash"]].add_done_callback((lambda t: lambda f: on_done(t, f))(task))
+
+    def _finish_batch_downloads(self, tasks: List[Dict[str, Any]], task_status: Dict[str, Dict]):
+        """
+        批量任务全部结束（或被独立出去）后：统一清理小文件、移动整理并发送汇总通知
+        """
+        try:
+            client = tasks[0]["client"]  # 使用第一个任务的client
+            target_path = tasks[0]["target_path"]  # 假设所有任务保存到同一目录
+
+            # ========== 统计结果（只统计未被独立出去的任务） ==========
+            batch_tasks = [t for t in tasks if not task_status[t["info_hash"]]["split_out"]]
+            success_tasks = [t["info_hash"] for t in batch_tasks if task_status[t["info_hash"]]["success"]]
+            failed_tasks = [t["info_hash"] for t in batch_tasks if task_status[t["info_hash"]]["completed"] and not task_status[t["info_hash"]]["success"]]
+            split_tasks = [t for t in tasks if task_status[t["info_hash"]]["split_out"]]
+
+            logger.info(f"mhnotify: 批量任务统计 - 成功: {len(success_tasks)}, 失败: {len(failed_tasks)}, 独立监控: {len(split_tasks)}")
+
+            # 如果没有成功的任务，直接发送通知并结束
+            if not success_tasks:
+                if split_tasks:
+                    # 有任务被独立出去，发送部分通知
+                    self._send_batch_cloud_download_notification(
+                        tasks=batch_tasks,
+                        task_status=task_status,
+                        removed_count=0,
+                        removed_size_mb=0,
+                        split_count=len(split_tasks)
+                    )
+                logger.info(f"mhnotify: 批量监控无成功任务，结束")
+                return
+
+            # ========== 统一清理小文件 ==========
+            total_removed_count = 0
+            total_removed_size = 0
+
+            if self._cloud_download_remove_small_files:
+                logger.info(f"mhnotify: 开始统一清理小文件...")
+                time.sleep(5)  # 等待文件列表同步
+
+                for info_hash in success_tasks:
+                    status = task_status[info_hash]
+                    if status["is_directory"]:
+                        try:
+                            removed_count, removed_size = self._remove_small_files_in_directory(client, status["actual_cid"])
+                            total_removed_count += removed_count
+                            total_removed_size += removed_size
+                            if removed_count > 0:
+                                logger.info(f"mhnotify: 任务 {status['task_name']} 清理了 {removed_count} 个小文件")
+                        except Exception as e:
+                            logger.warning(f"mhnotify: 清理任务 {status['task_name']} 小文件异常: {e}")
+
+            # ========== 统一执行一次移动整理 ==========
+            if self._cloud_download_organize and target_path:
+                logger.info(f"mhnotify: 开始统一移动整理...")
                 try:
-                    # 先查正在下载列表
-                    downloading_task = self._query_downloading_task_by_hash(client, info_hash)
-                    
-                    if downloading_task and downloading_task.get('status', 0) == 1:
-                        # 仍在下载中
-                        percent = downloading_task.get('percentDone', 0)
-                        
-                        # 记录首次发现下载中的时间
-                        if info_hash not in task_first_seen_downloading:
-                            task_first_seen_downloading[info_hash] = current_time
-                            logger.info(f"mhnotify: 任务开始下载: {task['task_name']}")
-                        
-                        # 检查是否超过10分钟
-                        downloading_duration = current_time - task_first_seen_downloading[info_hash]
-                        if downloading_duration >= split_timeout:
-                            # 超过10分钟，独立出去单独监控
-                            logger.info(f"mhnotify: 任务 {task['task_name']} 下载超过10分钟（{percent:.1f}%），独立出去单独监控")
-                            status["split_out"] = True
-                            
-                            # 启动独立的监控线程
-                            threading.Thread(
-                                target=self._monitor_and_remove_small_files,
-                                args=(client, info_hash, task["target_cid"], task["task_name"], task["target_path"]),
-                                daemon=True
-                            ).start()
-                        else:
-                            # 每2分钟记录一次进度
-                            if check_round % 4 == 0:
-                                remaining = int((split_timeout - downloading_duration) / 60)
-                                logger.info(f"mhnotify: 正在下载: {task['task_name']} - {percent:.1f}%（{remaining}分钟后独立）")
-                        continue
-                    
-                    # 不在下载列表，查已完成列表
-                    current_task = self._query_offline_task_by_hash(client, info_hash)
-                    
-                    if current_task and isinstance(current_task, dict):
-                        task_api_status = current_task.get('status', 0)
-                        if task_api_status == 2:
-                            # 已完成
-                            status["completed"] = True
-                            status["success"] = True
-                            actual_cid = current_task.get('file_id', '')
-                            if actual_cid:
-                                try:
-                                    status["actual_cid"] = int(actual_cid)
-                                except:
-                                    pass
-                            file_category = current_task.get('file_category', 1)
-                            status["is_directory"] = (file_category == 0)
-                            logger.info(f"mhnotify: 任务已完成: {task['task_name']}")
-                        elif task_api_status == 1:
-                            # 失败
-                            status["completed"] = True
-                            status["success"] = False
-                            logger.warning(f"mhnotify: 任务失败: {task['task_name']}")
+                    access_token = self._get_mh_access_token()
+                    if access_token:
+                        self._organize_cloud_download(access_token, target_path)
                     else:
-                        # 两处都找不到，可能被删除
-                        status["completed"] = True
-                        status["success"] = False
-                        logger.warning(f"mhnotify: 任务可能已被删除: {task['task_name']}")
-                        
+                        logger.error(f"mhnotify: 无法获取MH access token，跳过移动整理")
                 except Exception as e:
-                    logger.warning(f"mhnotify: 查询任务 {task['task_name']} 异常: {e}")
-            
-            if all_done:
-                logger.info(f"mhnotify: 批量监控的任务已全部处理完成")
-                break
-            
-            time.sleep(check_interval)
-        
-        # ========== 第二阶段：统计结果（只统计未被独立出去的任务） ==========
-        batch_tasks = [t for t in tasks if not task_status[t["info_hash"]]["split_out"]]
-        success_tasks = [t["info_hash"] for t in batch_tasks if task_status[t["info_hash"]]["success"]]
-        failed_tasks = [t["info_hash"] for t in batch_tasks if task_status[t["info_hash"]]["completed"] and not task_status[t["info_hash"]]["success"]]
-        split_tasks = [t for t in tasks if task_status[t["info_hash"]]["split_out"]]
-        
-        logger.info(f"mhnotify: 批量任务统计 - 成功: {len(success_tasks)}, 失败: {len(failed_tasks)}, 独立监控: {len(split_tasks)}")
-        
-        # 如果没有成功的任务，直接发送通知并结束
-        if not success_tasks:
-            if split_tasks:
-                # 有任务被独立出去，发送部分通知
-                self._send_batch_cloud_download_notification(
-                    tasks=batch_tasks,
-                    task_status=task_status,
-                    removed_count=0,
-                    removed_size_mb=0,
-                    split_count=len(split_tasks)
-                )
-            logger.info(f"mhnotify: 批量监控无成功任务，结束")
-            return
-        
-        # ========== 第三阶段：统一清理小文件 ==========
-        total_removed_count = 0
-        total_removed_size = 0
-        
-        if self._cloud_download_remove_small_files and success_tasks:
-            logger.info(f"mhnotify: 开始统一清理小文件...")
-            time.sleep(5)  # 等待文件列表同步
-            
-            for info_hash in success_tasks:
-                status = task_status[info_hash]
-                if status["is_directory"]:
-                    try:
-                        removed_count, removed_size = self._remove_small_files_in_directory(client, status["actual_cid"])
-                        total_removed_count += removed_count
-                        total_removed_size += removed_size
-                        if removed_count > 0:
-                            logger.info(f"mhnotify: 任务 {status['task_name']} 清理了 {removed_count} 个小文件")
-                    except Exception as e:
-                        logger.warning(f"mhnotify: 清理任务 {status['task_name']} 小文件异常: {e}")
-        
-        # ========== 第四阶段：统一执行一次移动整理 ==========
-        if self._cloud_download_organize and target_path and success_tasks:
-            logger.info(f"mhnotify: 开始统一移动整理...")
-            try:
-                access_token = self._get_mh_access_token()
-                if access_token:
-                    self._organize_cloud_download(access_token, target_path)
-                else:
-                    logger.error(f"mhnotify: 无法获取MH access token，跳过移动整理")
-            except Exception as e:
-                logger.error(f"mhnotify: 移动整理异常: {e}")
-        
-        # ========== 第五阶段：发送汇总通知 ==========
-        self._send_batch_cloud_download_notification(
-            tasks=batch_tasks,
-            task_status=task_status,
-            removed_count=total_removed_count,
-            removed_size_mb=total_removed_size / 1024 / 1024,
-            split_count=len(split_tasks)
-        )
-        
-        logger.info(f"mhnotify: 批量离线下载监控任务结束")
+                    logger.error(f"mhnotify: 移动整理异常: {e}")
+
+            # ========== 发送汇总通知 ==========
+            self._send_batch_cloud_download_notification(
+                tasks=batch_tasks,
+                task_status=task_status,
+                removed_count=total_removed_count,
+                removed_size_mb=total_removed_size / 1024 / 1024,
+                split_count=len(split_tasks)
+            )
+
+            logger.info(f"mhnotify: 批量离线下载监控任务结束")
+        except Exception as e:
+            logger.error(f"mhnotify: 批量离线下载后处理异常: {e}", exc_info=True)
 
     def _send_batch_cloud_download_notification(self, tasks: List[Dict[str, Any]], 
                                                   task_status: Dict[str, Dict],
@@ -788,341 +1262,157 @@ class CloudDownloadMixin:
         except Exception as e:
             logger.error(f"mhnotify: 发送批量云下载通知失败: {e}", exc_info=True)
 
-    def _monitor_and_remove_small_files(self, client, info_hash: str, target_cid: int, task_name: str, target_path: str = ""):
+    def _offline_tracker(self) -> OfflineTaskTracker:
+        """
+        获取共享的离线任务跟踪器（类级别单例，插件重载后仍继续跟踪已提交的任务）
         """
-        监控离线下载任务完成后删除小文件
+        with CloudDownloadMixin._offline_tracker_lock:
+            tracker = CloudDownloadMixin._offline_tracker_inst
+            if tracker is None:
+                tracker = CloudDownloadMixin._offline_tracker_inst = OfflineTaskTracker(self._query_offline_task_page)
+            else:
+                tracker.bind(self._query_offline_task_page)
+            return tracker
+
+    def _watch_offline_task(self, client, info_hash: str, target_cid: int, task_name: str, target_path: str = ""):
+        """
+        订阅单个离线下载任务，完成后删除小文件、移动整理并通知
         :param client: P115Client实例
         :param info_hash: 任务hash
         :param target_cid: 目标目录ID
         :param task_name: 任务名称
         :param target_path: 云下载目标路径
         """
+        logger.info(f"mhnotify: 开始监控离线下载任务: {task_name}")
+        progress_log_interval = 600  # 每10分钟记录一次进度
+        last_logged = [0.0]
+
+        def on_progress(offline_task: Dict[str, Any]):
+            now = time.time()
+            if now - last_logged[0] >= progress_log_interval:
+                last_logged[0] = now
+                logger.info(f"mhnotify: 正在下载: {task_name} - {offline_task.get('percentDone', 0) or 0:.1f}%")
+
+        future = self._offline_tracker().watch(info_hash, task_name, on_progress=on_progress)
+        future.add_done_callback(
+            lambda f: self._handle_offline_task_result(client, info_hash, target_cid, task_name, target_path, f.result())
+        )
+
+    def _handle_offline_task_result(self, client, info_hash: str, target_cid: int, task_name: str,
+                                    target_path: str, result: Dict[str, Any]):
+        """
+        处理单个离线任务的最终状态（由离线任务跟踪器回调）
+        :param result: 跟踪器结果 {"state", "info_hash", "name", "task"}
+        """
+        state = result.get("state")
+        current_task = result.get("task") or {}
         try:
-            import time
-            logger.info(f"mhnotify: 开始监控离线下载任务: {task_name}")
-            
-            # 添加任务后等待15秒，让任务有时间出现在下载列表中
-            logger.info(f"mhnotify: 等待15秒，让任务进入下载队列...")
-            time.sleep(15)
-            
-            # ========== 第一阶段：监控正在下载 ==========
-            # 使用 stat=12 查询正在下载的任务
-            logger.info(f"mhnotify: 第一阶段 - 监控正在下载状态...")
-            
-            normal_check_interval = 120  # 正常检查间隔：2分钟
-            max_downloading_checks = 720  # 最多检查24小时
-            
-            task_found = False  # 标记是否至少找到过一次任务
-            not_found_count = 0  # 连续未找到任务的次数
-            max_not_found_after_found = 3  # 任务出现后最多容忍3次未找到才认为已完成
-            
-            for i in range(max_downloading_checks):
-                try:
-                    # 查询正在下载的任务（stat=12）
-                    downloading_task = self._query_downloading_task_by_hash(client, info_hash)
-                    
-                    if downloading_task:
-                        # 找到任务了
-                        task_found = True
-                        not_found_count = 0  # 重置未找到计数
-                        
-                        percent = downloading_task.get('percentDone', 0)
-                        status = downloading_task.get('status', 0)
-                        
-                        # status=1 表示正在下载
-                        if status == 1:
-                            # 使用正常检查间隔（2分钟）
-                            if i % 5 == 0:  # 每10分钟记录一次进度
-                                logger.info(f"mhnotify: 正在下载: {task_name} - {percent:.1f}%")
-                            time.sleep(normal_check_interval)
-                            continue
-                        else:
-                            # status != 1，可能下载完成或失败，跳出循环
-                            logger.info(f"mhnotify: 任务状态变化 (status={status})，进入下一阶段...")
-                            break
+            if state == OfflineTaskTracker.DONE:
+                logger.info(f"mhnotify: 离线下载任务已完成: {task_name}")
+
+                # 从任务信息中获取实际文件/文件夹ID（file_id）
+                # file_id 是下载完成后的文件或文件夹的实际ID
+                actual_cid = current_task.get('file_id', '')
+                if actual_cid:
+                    try:
+                        actual_cid = int(actual_cid)
+                    except:
+                        actual_cid = target_cid
+                else:
+                    actual_cid = target_cid
+
+                logger.info(f"mhnotify: 实际文件/文件夹ID: {actual_cid}")
+
+                # 检查 file_category，只有文件夹才需要清理小文件
+                file_category = current_task.get('file_category', 1)
+                is_directory = (file_category == 0)
+
+                # 记录清理结果用于通知
+                removed_count = 0
+                removed_size_mb = 0.0
+
+                # 如果开启了剔除小文件，先删除小文件
+                if self._cloud_download_remove_small_files:
+                    if is_directory:
+                        logger.info(f"mhnotify: 检测到文件夹，开始清理小文件...")
+                        time.sleep(5)  # 等待5秒确保文件列表同步
+                        removed_count, removed_size = self._remove_small_files_in_directory(client, actual_cid)
+                        removed_size_mb = removed_size / 1024 / 1024
                     else:
-                        # 正在下载列表中未找到任务
-                        not_found_count += 1
-                        
-                        if not task_found:
-                            # 任务从未在下载列表中找到过，直接进入第二阶段查找已完成任务
-                            logger.info(f"mhnotify: 未在下载列表中找到任务，进入已完成检查阶段...")
-                            break
-                        else:
-                            # 任务之前找到过，现在找不到了
-                            if not_found_count >= max_not_found_after_found:
-                                # 连续多次找不到，说明已完成或失败，进入第二阶段
-                                logger.info(f"mhnotify: 任务已不在下载列表中，进入已完成检查阶段...")
-                                break
-                            else:
-                                logger.debug(f"mhnotify: 暂时未找到任务 ({not_found_count}/{max_not_found_after_found})，继续等待...")
-                                time.sleep(normal_check_interval)
-                                continue
-                        
-                except Exception as e:
-                    logger.warning(f"mhnotify: 查询正在下载任务异常: {e}")
-                    # 出现异常直接进入第二阶段
-                    logger.info(f"mhnotify: 查询异常，进入已完成检查阶段...")
-                    break
-            
-            # ========== 第二阶段：检查已完成任务 ==========
-            logger.info(f"mhnotify: 第二阶段 - 检查已完成任务...")
-            
-            # 等待3秒，确保任务状态同步
-            time.sleep(3)
-            
-            # 使用 stat=11 查询所有任务（包括已完成）
-            max_completed_checks = 5  # 最多检查5次
-            completed_check_interval = 10  # 10秒
-            consecutive_failures = 0
-            max_consecutive_failures = 3
-            
-            for i in range(max_completed_checks):
-                try:
-                    # 使用115 Web API查询离线任务列表（stat=11 查询所有任务）
-                    current_task = self._query_offline_task_by_hash(client, info_hash)
-                    
-                    # 类型检查：确保返回的是字典
-                    if current_task and not isinstance(current_task, dict):
-                        logger.warning(f"mhnotify: 查询任务返回类型错误: {type(current_task)}")
-                        current_task = None
-                    
-                    if not current_task:
-                        # 未找到任务
-                        consecutive_failures += 1
-                        logger.warning(f"mhnotify: 未找到已完成任务 {info_hash[:16]}... (尝试 {consecutive_failures}/{max_consecutive_failures})")
-                        
-                        if consecutive_failures >= max_consecutive_failures:
-                            # 连续多次未找到，进一步检查失败列表
-                            failed_task = self._query_offline_failed_task_by_hash(client, info_hash)
-                            if failed_task:
-                                logger.error(f"mhnotify: 任务 {info_hash[:16]}... 在失败列表中存在，发送失败通知")
-                                self._send_cloud_download_failed_notification(task_name)
-                            else:
-                                logger.error(f"mhnotify: 未找到云下载任务，可能已被删除")
-                                self._send_cloud_download_deleted_notification(task_name)
-                                try:
-                                    mapping = self.get_data(self._ASSIST_CLOUD_MAP_KEY) or {}
-                                    info = mapping.get(info_hash)
-                                    if info:
-                                        sid = info.get("sid")
-                                        with SessionFactory() as db:
-                                            SubscribeOper(db=db).update(int(sid), {"state": "R"})
-                                        mapping.pop(info_hash, None)
-                                        self.save_data(self._ASSIST_CLOUD_MAP_KEY, mapping)
-                                        logger.info(f"mhnotify: 云下载任务已删除，已恢复MP订阅启用 sid={sid}")
-                                except Exception:
-                                    pass
-                            break
-                        
-                        time.sleep(completed_check_interval)
-                        continue
-                    
-                    # 查询成功，重置失败计数
-                    consecutive_failures = 0
-                    
-                    # 检查任务状态：2=已完成, 1=失败, 0=下载中
-                    status = current_task.get('status', 0)
-                    if status == 2:
-                        logger.info(f"mhnotify: 离线下载任务已完成: {task_name}")
-                        
-                        # 从任务信息中获取实际文件/文件夹ID（file_id）
-                        # file_id 是下载完成后的文件或文件夹的实际ID
-                        actual_cid = current_task.get('file_id', '')
-                        if actual_cid:
-                            try:
-                                actual_cid = int(actual_cid)
-                            except:
-                                actual_cid = target_cid
-                        else:
-                            actual_cid = target_cid
-                        
-                        logger.info(f"mhnotify: 实际文件/文件夹ID: {actual_cid}")
-                        
-                        # 检查 file_category，只有文件夹才需要清理小文件
-                        file_category = current_task.get('file_category', 1)
-                        is_directory = (file_category == 0)
-                        
-                        # 记录清理结果用于通知
-                        removed_count = 0
-                        removed_size_mb = 0.0
-                        
-                        # 如果开启了剔除小文件，先删除小文件
-                        if self._cloud_download_remove_small_files:
-                            if is_directory:
-                                logger.info(f"mhnotify: 检测到文件夹，开始清理小文件...")
-                                time.sleep(5)  # 等待5秒确保文件列表同步
-                                removed_count, removed_size = self._remove_small_files_in_directory(client, actual_cid)
-                                removed_size_mb = removed_size / 1024 / 1024
-                            else:
-                                logger.info(f"mhnotify: 检测到单个文件，跳过小文件清理")
-                        
-                        # 如果开启了移动整理，执行移动整理
-                        if self._cloud_download_organize and target_path:
-                            logger.info(f"mhnotify: 开始移动整理...")
-                            # 获取MH access token
-                            access_token = self._get_mh_access_token()
-                            if access_token:
-                                self._organize_cloud_download(access_token, target_path)
-                            else:
-                                logger.error(f"mhnotify: 无法获取MH access token，跳过移动整理")
-                        
-                        # 发送云下载完成通知
-                        self._send_cloud_download_notification(task_name, removed_count, removed_size_mb)
-                        
-                        try:
-                            mapping = self.get_data(self._ASSIST_CLOUD_MAP_KEY) or {}
-                            info = mapping.get(info_hash)
-                            if info:
-                                sid = info.get("sid")
-                                mh_uuid = info.get("mh_uuid")
-                                # 不在此处删除MH，改为完成MP订阅后由 SubscribeComplete 事件删除MH
-                                with SessionFactory() as db:
-                                    sub = SubscribeOper(db=db).get(int(sid))
-                                if sub:
-                                    self._finish_mp_subscribe(sub)
-                                mapping.pop(info_hash, None)
-                                self.save_data(self._ASSIST_CLOUD_MAP_KEY, mapping)
-                                logger.info(f"mhnotify: 云下载辅助完成，已完成MP订阅，MH删除由事件触发 sid={sid}")
-                        except Exception:
-                            pass
-                        
-                        break
-                    elif status == 1:
-                        logger.warning(f"mhnotify: 离线下载任务失败: {task_name}")
-                        self._send_cloud_download_failed_notification(task_name)
-                        try:
-                            mapping = self.get_data(self._ASSIST_CLOUD_MAP_KEY) or {}
-                            info = mapping.get(info_hash)
-                            if info:
-                                sid = info.get("sid")
-                                with SessionFactory() as db:
-                                    SubscribeOper(db=db).update(int(sid), {"state": "R"})
-                                mapping.pop(info_hash, None)
-                                self.save_data(self._ASSIST_CLOUD_MAP_KEY, mapping)
-                                logger.info(f"mhnotify: 云下载辅助失败，已恢复MP订阅启用 sid={sid}")
-                        except Exception:
-                            pass
-                        break
+                        logger.info(f"mhnotify: 检测到单个文件，跳过小文件清理")
+
+                # 如果开启了移动整理，执行移动整理
+                if self._cloud_download_organize and target_path:
+                    logger.info(f"mhnotify: 开始移动整理...")
+                    # 获取MH access token
+                    access_token = self._get_mh_access_token()
+                    if access_token:
+                        self._organize_cloud_download(access_token, target_path)
                     else:
-                        # status 不为 2 也不为 1，继续等待
-                        logger.info(f"mhnotify: 任务状态: {status}，继续等待...")
-                        time.sleep(completed_check_interval)
-                        
-                except Exception as e:
-                    consecutive_failures += 1
-                    logger.warning(f"mhnotify: 检查已完成任务异常 ({consecutive_failures}/{max_consecutive_failures}): {e}")
-                    
-                    if consecutive_failures >= max_consecutive_failures:
-                        logger.error(f"mhnotify: 连续{max_consecutive_failures}次检查失败，停止监控任务: {task_name}")
-                        break
-                    
-                    time.sleep(completed_check_interval)
-            
+                        logger.error(f"mhnotify: 无法获取MH access token，跳过移动整理")
+
+                # 发送云下载完成通知
+                self._send_cloud_download_notification(task_name, removed_count, removed_size_mb)
+
+                try:
+                    mapping = self.get_data(self._ASSIST_CLOUD_MAP_KEY) or {}
+                    info = mapping.pop(info_hash, None)
+                    if info:
+                        sid = info.get("sid")
+                        # 不在此处删除MH，改为完成MP订阅后由 SubscribeComplete 事件删除MH
+                        with SessionFactory() as db:
+                            sub = SubscribeOper(db=db).get(int(sid))
+                        if sub:
+                            self._finish_mp_subscribe(sub)
+                        self.save_data(self._ASSIST_CLOUD_MAP_KEY, mapping)
+                        logger.info(f"mhnotify: 云下载辅助完成，已完成MP订阅，MH删除由事件触发 sid={sid}")
+                except Exception:
+                    pass
+            elif state in (OfflineTaskTracker.FAILED, OfflineTaskTracker.DELETED):
+                if state == OfflineTaskTracker.FAILED:
+                    logger.warning(f"mhnotify: 离线下载任务失败: {task_name}")
+                    self._send_cloud_download_failed_notification(task_name)
+                else:
+                    logger.error(f"mhnotify: 未找到云下载任务，可能已被删除")
+                    self._send_cloud_download_deleted_notification(task_name)
+                try:
+                    mapping = self.get_data(self._ASSIST_CLOUD_MAP_KEY) or {}
+                    info = mapping.pop(info_hash, None)
+                    if info:
+                        sid = info.get("sid")
+                        with SessionFactory() as db:
+                            SubscribeOper(db=db).update(int(sid), {"state": "R"})
+                        self.save_data(self._ASSIST_CLOUD_MAP_KEY, mapping)
+                        logger.info(f"mhnotify: 云下载辅助未完成，已恢复MP订阅启用 sid={sid}")
+                except Exception:
+                    pass
+            else:
+                logger.warning(f"mhnotify: 离线下载任务监控超时，停止监控: {task_name}")
+
             logger.info(f"mhnotify: 离线下载监控任务结束: {task_name} (Hash: {info_hash[:16]}...)")
-            
         except Exception as e:
-            logger.error(f"mhnotify: 监控离线下载任务异常: {e}", exc_info=True)
+            logger.error(f"mhnotify: 处理离线下载任务结果异常: {e}", exc_info=True)
 
-    def _query_offline_task_by_hash(self, client, info_hash: str) -> Optional[Dict[str, Any]]:
+    def _query_offline_task_page(self, stat: int, page: int = 1) -> Optional[Dict[str, Any]]:
         """
-        使用115 Web API查询离线任务（通过info_hash匹配）
-        :param client: P115Client实例
-        :param info_hash: 任务hash
-        :return: 任务信息字典或None
+        使用115 Web API查询一页离线任务列表
+        :param stat: 11=所有任务，12=正在下载，1=失败任务
+        :param page: 页码，从1开始
+        :return: 响应字典（含 tasks、page_count 等）或None
         """
         try:
-            # 构造请求参数
-            # 参考 115-ol-list.txt，需要 page, stat, uid, sign, time 参数
-            import time as time_module
-            import hashlib
-            
-            # 获取用户ID（从cookie或client中获取）
-            uid = None
-            try:
-                # 尝试从client获取用户信息
-                user_info = client.fs_userinfo()
-                if user_info and isinstance(user_info, dict):
-                    uid = user_info.get('user_id')
-            except:
-                pass
-            
-            if not uid:
-                # 从cookie中解析UID
-                cookie_dict = {}
-                for item in self._p115_cookie.split(';'):
-                    item = item.strip()
-                    if '=' in item:
-                        k, v = item.split('=', 1)
-                        cookie_dict[k.strip()] = v.strip()
-                uid_str = cookie_dict.get('UID', '')
-                if uid_str and '_' in uid_str:
-                    uid = uid_str.split('_')[0]
-            
-            if not uid:
-                logger.warning(f"mhnotify: 无法获取115用户ID")
-                return None
-            
-            # 构造签名（参考115-ol-list API）
-            timestamp = int(time_module.time())
-            # 签名算法：md5(uid + time)，实际算法可能不同，这里先尝试简单方式
-            sign_str = f"{uid}{timestamp}"
-            sign = hashlib.md5(sign_str.encode()).hexdigest()
-            
-            # 调用离线任务列表API
-            # stat=11表示查询所有任务（包括已完成）
-            url = "https://115.com/web/lixian/?ct=lixian&ac=task_lists"
-            params = {
-                'page': 1,
-                'stat': 11,  # 11=所有任务
-                'uid': uid,
-                'sign': sign,
-                'time': timestamp
-            }
-            
-            # 使用RequestUtils发送请求
-            headers = {
-                "Accept": "application/json, text/javascript, */*; q=0.01",
-                "Cookie": self._p115_cookie,
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            
-            response = RequestUtils(headers=headers).post_res(url, data=params)
-            if not response or response.status_code != 200:
-                logger.debug(f"mhnotify: 查询离线任务列表失败: {response.status_code if response else 'No response'}")
-                return None
-            
-            result = response.json()
-            if not result or not result.get('state'):
-                logger.debug(f"mhnotify: 离线任务列表响应异常: {result}")
-                return None
-            
-            # 查找匹配的任务
-            tasks = result.get('tasks', [])
-            for task in tasks:
-                if task.get('info_hash', '').lower() == info_hash.lower():
-                    return task
-            
-            return None
-        
-        except Exception as e:
-            logger.debug(f"mhnotify: 查询离线任务异常: {e}")
-            return None
-
-    def _query_offline_failed_task_by_hash(self, client, info_hash: str) -> Optional[Dict[str, Any]]:
-        try:
-            import time as time_module
-            import hashlib
             uid = self._get_115_uid()
             if not uid:
                 logger.warning(f"mhnotify: 无法获取115用户ID")
                 return None
-            timestamp = int(time_module.time())
+
+            # 构造签名（参考115-ol-list API）：md5(uid + time)
+            timestamp = int(time.time())
             sign = hashlib.md5(f"{uid}{timestamp}".encode()).hexdigest()
             url = "https://115.com/web/lixian/?ct=lixian&ac=task_lists"
             params = {
-                'page': 1,
-                'stat': 1,
+                'page': page,
+                'stat': stat,
                 'uid': uid,
                 'sign': sign,
                 'time': timestamp
@@ -1134,218 +1424,44 @@ class CloudDownloadMixin:
             }
             response = RequestUtils(headers=headers).post_res(url, data=params)
             if not response or response.status_code != 200:
-                logger.debug(f"mhnotify: 查询失败任务列表失败: {response.status_code if response else 'No response'}")
+                logger.debug(f"mhnotify: 查询离线任务列表失败: {response.status_code if response else 'No response'}")
                 return None
             result = response.json()
             if not result or not result.get('state'):
-                logger.debug(f"mhnotify: 失败任务列表响应异常: {result}")
+                logger.debug(f"mhnotify: 离线任务列表响应异常: {result}")
                 return None
-            tasks = result.get('tasks', [])
-            for task in tasks:
-                if task.get('info_hash', '').lower() == info_hash.lower():
-                    return task
-            return None
+            return result
         except Exception as e:
-            logger.debug(f"mhnotify: 查询失败任务异常: {e}")
+            logger.debug(f"mhnotify: 查询离线任务列表异常: {e}")
             return None
 
     def _remove_small_files_in_directory(self, client, cid: int) -> Tuple[int, int]:
         """
-        删除目录中小于10MB的文件（递归遍历子目录）
+        删除目录中小于10MB的文件（递归遍历子目录，汇总后批量删除）
         :param client: P115Client实例
         :param cid: 目录ID (文件夹的file_id)
         :return: (删除文件数量, 删除文件总大小字节数)
         """
         try:
             logger.info(f"mhnotify: 开始递归清理小文件，根目录cid={cid}")
-            
-            min_size = 10 * 1024 * 1024  # 10MB
-            removed_count = 0
-            removed_size = 0
-            
-            # 使用 p115client.tool.iterdir 的 iter_files 递归遍历所有文件
-            try:
-                from p115client.tool.iterdir import iter_files  # type: ignore
-                logger.info("mhnotify: 使用 iter_files 递归遍历目录...")
-                
-                # iter_files 会递归返回所有文件（不含目录）
-                for attr in iter_files(client, cid):
-                    try:
-                        # attr 是一个 dict，包含 id, parent_id, name, size, is_dir 等
-                        if not isinstance(attr, dict):
-                            continue
-                        
-                        # iter_files 只返回文件，但还是检查一下
-                        is_dir = attr.get('is_dir', False)
-                        if is_dir:
-                            continue
-                        
-                        file_id = attr.get('id') or attr.get('fid') or attr.get('file_id')
-                        file_name = attr.get('name') or attr.get('n') or attr.get('fn') or ''
-                        file_size = attr.get('size') or attr.get('fs') or attr.get('s') or 0
-                        
-                        if isinstance(file_size, str):
-                            try:
-                                file_size = int(file_size)
-                            except:
-                                file_size = 0
-                        
-                        if not file_id:
-                            logger.debug(f"mhnotify: 文件无ID，跳过: {file_name}")
-                            continue
-                        
-                        logger.debug(f"mhnotify: 检查文件: {file_name}, 大小: {file_size/1024/1024:.2f}MB")
-                        
-                        # 如果文件小于10MB，且不是字幕文件（srt, ass, sup），则删除
-                        if file_size < min_size:
-                            # 检查扩展名，忽略字幕文件
-                            if any(file_name.lower().endswith(ext) for ext in ('.srt', '.ass', '.sup')):
-                                logger.debug(f"mhnotify: 跳过字幕文件: {file_name}")
-                                continue
-
-                            try:
-                                logger.info(f"mhnotify: 准备删除小文件: {file_name} ({file_size/1024/1024:.2f}MB)")
-                                client.fs_delete(file_id)
-                                removed_count += 1
-                                removed_size += file_size
-                                logger.info(f"mhnotify: 成功删除小文件: {file_name}")
-                            except Exception as e:
-                                logger.warning(f"mhnotify: 删除文件失败 {file_name}: {e}")
-                    except Exception as e:
-                        logger.debug(f"mhnotify: 处理文件项异常: {e}")
-                        continue
-                        
-            except ImportError:
-                logger.warning("mhnotify: iter_files 导入失败，使用备用方案...")
-                # 备用方案：手动递归遍历
-                removed_count, removed_size = self._remove_small_files_recursive(client, cid, min_size)
-            except Exception as e:
-                logger.warning(f"mhnotify: iter_files 调用失败: {e}，使用备用方案...")
-                removed_count, removed_size = self._remove_small_files_recursive(client, cid, min_size)
-            
+            start = time.time()
+            pruner = SmallFilePruner(client)
+            removed_count, removed_size = pruner.run(cid)
+            stats = pruner.stats
+
             if removed_count > 0:
-                logger.info(f"mhnotify: 云下载小文件清理完成，共删除 {removed_count} 个文件，释放空间 {removed_size/1024/1024:.2f}MB")
+                logger.info(f"mhnotify: 云下载小文件清理完成，共删除 {removed_count} 个文件，释放空间 {removed_size/1024/1024:.2f}MB"
+                            f"（扫描 {stats['files']} 个文件，删除请求 {stats['delete_calls']} 次，失败 {stats['failed']} 个，"
+                            f"耗时 {time.time() - start:.1f}s）")
             else:
                 logger.info(f"mhnotify: 云下载目录中没有小于10MB的文件需要删除")
-            
+
             return removed_count, removed_size
-                
+
         except Exception as e:
             logger.error(f"mhnotify: 删除小文件异常: {e}", exc_info=True)
             return 0, 0
 
-    def _remove_small_files_recursive(self, client, cid: int, min_size: int) -> Tuple[int, int]:
-        """
-        备用方案：手动递归遍历目录删除小文件
-        :param client: P115Client实例
-        :param cid: 目录ID
-        :param min_size: 最小文件大小阈值（字节）
-        :return: (删除数量, 删除大小)
-        """
-        removed_count = 0
-        removed_size = 0
-        
-        # 使用栈实现非递归遍历，避免深层递归导致栈溢出
-        dir_stack = [cid]
-        
-        while dir_stack:
-            current_cid = dir_stack.pop()
-            logger.debug(f"mhnotify: 遍历目录 cid={current_cid}")
-            
-            offset = 0
-            limit = 1000
-            
-            while True:
-                try:
-                    # 调用 fs_files 获取目录内容
-                    resp = client.fs_files(cid=current_cid, limit=limit, offset=offset)
-                except Exception as e:
-                    logger.warning(f"mhnotify: fs_files 调用失败 (cid={current_cid}): {e}")
-                    break
-                
-                # 处理响应
-                items = []
-                if isinstance(resp, dict):
-                    items = resp.get('data', []) or resp.get('files', [])
-                elif hasattr(resp, '__iter__'):
-                    try:
-                        items = list(resp)
-                    except:
-                        break
-                
-                if not items:
-                    break
-                
-                for item in items:
-                    if not isinstance(item, dict):
-                        continue
-                    
-                    # 判断是文件还是目录
-                    # 根据 p115client 的逻辑：
-                    # - 如果有 'n' 字段: 没有 'fid' 的是目录
-                    # - 如果有 'fn' 字段: fc == "0" 是目录，fc == "1" 是文件
-                    is_dir = False
-                    if 'n' in item:
-                        # 新格式：没有 fid 的是目录
-                        is_dir = 'fid' not in item
-                    elif 'fn' in item:
-                        # 老格式：fc 字段
-                        fc = item.get('fc')
-                        is_dir = (fc == '0' or fc == 0)
-                    else:
-                        # 其他格式：检查 file_category
-                        fc = item.get('file_category')
-                        is_dir = (fc == 0 or fc == '0')
-                    
-                    if is_dir:
-                        # 是目录，获取目录ID并加入栈
-                        sub_cid = item.get('cid') or item.get('id') or item.get('category_id')
-                        if sub_cid:
-                            try:
-                                sub_cid = int(sub_cid)
-                                dir_stack.append(sub_cid)
-                                dir_name = item.get('n') or item.get('fn') or item.get('name') or item.get('category_name') or ''
-                                logger.debug(f"mhnotify: 发现子目录: {dir_name} (cid={sub_cid})")
-                            except:
-                                pass
-                    else:
-                        # 是文件，检查大小
-                        file_id = item.get('fid') or item.get('file_id') or item.get('id')
-                        file_name = item.get('n') or item.get('fn') or item.get('name') or item.get('file_name') or ''
-                        file_size = item.get('s') or item.get('fs') or item.get('size') or item.get('file_size') or 0
-                        
-                        if isinstance(file_size, str):
-                            try:
-                                file_size = int(file_size)
-                            except:
-                                file_size = 0
-                        
-                        if not file_id:
-                            continue
-                        
-                        logger.debug(f"mhnotify: 检查文件: {file_name}, 大小: {file_size/1024/1024:.2f}MB")
-                        
-                        if file_size < min_size:
-                            # 检查扩展名，忽略字幕文件
-                            if any(file_name.lower().endswith(ext) for ext in ('.srt', '.ass', '.sup')):
-                                logger.debug(f"mhnotify: 跳过字幕文件: {file_name}")
-                                continue
-
-                            try:
-                                logger.info(f"mhnotify: 准备删除小文件: {file_name} ({file_size/1024/1024:.2f}MB)")
-                                client.fs_delete(file_id)
-                                removed_count += 1
-                                removed_size += file_size
-                                logger.info(f"mhnotify: 成功删除小文件: {file_name}")
-                            except Exception as e:
-                                logger.warning(f"mhnotify: 删除文件失败 {file_name}: {e}")
-                
-                if len(items) < limit:
-                    break
-                offset += limit
-        
-        return removed_count, removed_size
-
     def _send_cloud_download_notification(self, task_name: str, removed_count: int, removed_size_mb: float):
         """
         发送云下载完成通知
@@ -1376,69 +1492,20 @@ class CloudDownloadMixin:
 
     def _get_mh_access_token(self, max_retries: int = 5) -> Optional[str]:
         """
-        获取MH access token，支持重试
+        获取MH access token，支持重试（复用登录缓存）
         :param max_retries: 最大重试次数（默认5次）
         :return: access token或None
         """
         for attempt in range(1, max_retries + 1):
-            try:
-                login_url = f"{self._mh_domain}/api/v1/auth/login"
-                login_payload = {
-                    "username": self._mh_username,
-                    "password": self._mh_password
-                }
-                headers = {
-                    "Accept": "application/json, text/plain, */*",
-                    "Content-Type": "application/json;charset=UTF-8",
-                    "Origin": self._mh_domain,
-                    "Accept-Language": "zh-CN",
-                    "User-Agent": "MoviePilot/Plugin MHNotify"
-                }
-                login_res = RequestUtils(headers=headers).post(login_url, json=login_payload)
-                if not login_res or login_res.status_code != 200:
-                    if attempt < max_retries:
-                        wait_time = 2 ** (attempt - 1)
-                        logger.warning(f"mhnotify: MH登录失败（第{attempt}/{max_retries}次），{wait_time}秒后重试...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error(f"mhnotify: MH登录失败，已重试{max_retries}次")
-                        return None
-                
-                try:
-                    login_data = login_res.json()
-                    access_token = login_data.get("data", {}).get("access_token")
-                    if access_token:
-                        if attempt > 1:
-                            logger.info(f"mhnotify: MH登录成功（第{attempt}次尝试）")
-                        return access_token
-                    else:
-                        if attempt < max_retries:
-                            wait_time = 2 ** (attempt - 1)
-                            logger.warning(f"mhnotify: 未获取到 access token（第{attempt}/{max_retries}次），{wait_time}秒后重试...")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            logger.error(f"mhnotify: 未获取到 access token，已重试{max_retries}次")
-                            return None
-                except Exception as parse_err:
-                    if attempt < max_retries:
-                        wait_time = 2 ** (attempt - 1)
-                        logger.warning(f"mhnotify: 解析MH登录响应失败（第{attempt}/{max_retries}次）: {parse_err}，{wait_time}秒后重试...")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error(f"mhnotify: 解析MH登录响应失败，已重试{max_retries}次")
-                        return None
-            except Exception as e:
-                if attempt < max_retries:
-                    wait_time = 2 ** (attempt - 1)
-                    logger.warning(f"mhnotify: 获取MH access token异常（第{attempt}/{max_retries}次）: {e}，{wait_time}秒后重试...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error(f"mhnotify: 获取MH access token异常，已重试{max_retries}次: {e}")
-                    return None
+            access_token = self._mh_login()
+            if access_token:
+                if attempt > 1:
+                    logger.info(f"mhnotify: MH登录成功（第{attempt}次尝试）")
+                return access_token
+            if attempt < max_retries:
+                wait_time = 2 ** (attempt - 1)
+                logger.warning(f"mhnotify: MH登录失败（第{attempt}/{max_retries}次），{wait_time}秒后重试...")
+                time.sleep(wait_time)
         
         logger.error(f"mhnotify: MH登录失败，已达到最大重试次数{max_retries}")
         return None
@@ -1453,16 +1520,8 @@ class CloudDownloadMixin:
             logger.info(f"mhnotify: 开始云下载移动整理流程，目标路径: {target_path}")
             
             # 1. 获取115网盘账户信息
-            cloud_url = f"{self._mh_domain}/api/v1/cloud-accounts?active_only=true"
-            headers = {
-                "Accept": "application/json, text/plain, */*",
-                "Authorization": f"Bearer {access_token}",
-                "User-Agent": "MoviePilot/Plugin MHNotify",
-                "Accept-Language": "zh-CN"
-            }
-            
             logger.info(f"mhnotify: 正在获取云账户列表...")
-            cloud_res = RequestUtils(headers=headers).get_res(cloud_url)
+            cloud_res = self._mh_request("get", "/api/v1/cloud-accounts?active_only=true", access_token)
             
             if not cloud_res:
                 logger.error(f"mhnotify: 获取云账户列表失败 - 响应为空")
@@ -1500,7 +1559,6 @@ class CloudDownloadMixin:
             logger.info(f"mhnotify: 找到115网盘账户: {drive115_account.get('name')}, ID: {account_identifier}")
             
             # 2. 提交网盘目录分析任务
-            analyze_url = f"{self._mh_domain}/api/v1/library-tool/analyze-cloud-directory-async"
             analyze_payload = {
                 "cloud_type": "drive115",
                 "account_identifier": account_identifier,
@@ -1510,7 +1568,8 @@ class CloudDownloadMixin:
             logger.info(f"mhnotify: 正在提交网盘分析任务...")
             logger.debug(f"mhnotify: 分析任务参数: {analyze_payload}")
             
-            analyze_res = RequestUtils(headers=headers).post_res(analyze_url, json=analyze_payload)
+            analyze_res = self._mh_request("post", "/api/v1/library-tool/analyze-cloud-directory-async", access_token,
+                                           json=analyze_payload)
             
             if not analyze_res:
                 logger.error(f"mhnotify: 提交网盘分析任务失败 - 响应为空")
@@ -1544,8 +1603,9 @@ class CloudDownloadMixin:
                 time.sleep(2)
                 elapsed += 2
                 
-                progress_url = f"{self._mh_domain}/api/v1/library-tool/analysis-task/{task_id}/progress"
-                progress_res = RequestUtils(headers=headers).get_res(progress_url)
+                progress_res = self._mh_request("get", f"/api/v1/library-tool/analysis-task/{task_id}/progress", access_token,
+                                                endpoint="GET /api/v1/library-tool/analysis-task/{task_id}/progress",
+                                                retries=0)
                 
                 if not progress_res or progress_res.status_code != 200:
                     logger.warning(f"mhnotify: 查询分析进度失败，继续等待...")
@@ -1581,9 +1641,8 @@ class CloudDownloadMixin:
             time.sleep(3)
             
             # 4. 获取默认目录配置
-            defaults_url = f"{self._mh_domain}/api/v1/subscription/config/cloud-defaults"
             logger.info(f"mhnotify: 正在获取默认目录配置...")
-            defaults_res = RequestUtils(headers=headers).get_res(defaults_url)
+            defaults_res = self._mh_request("get", "/api/v1/subscription/config/cloud-defaults", access_token)
             
             if not defaults_res:
                 logger.error(f"mhnotify: 获取默认目录配置失败 - 响应为空")
@@ -1612,7 +1671,7 @@ class CloudDownloadMixin:
             logger.info(f"mhnotify: 等待3秒后提交文件整理任务...")
             time.sleep(3)
             
-            organize_url = f"{self._mh_domain}/api/v1/library-tool/organize-files-async"
+            organize_path = "/api/v1/library-tool/organize-files-async"
             organize_payload = {
                 "task_id": task_id,  # 使用网盘分析任务的task_id
                 "cloud_type": "drive115",
@@ -1626,12 +1685,12 @@ class CloudDownloadMixin:
             }
             
             logger.info(f"mhnotify: 准备提交文件整理任务")
-            logger.info(f"mhnotify: 请求URL: {organize_url}")
+            logger.info(f"mhnotify: 请求URL: {self._mh_domain}{organize_path}")
             logger.info(f"mhnotify: 请求参数: {organize_payload}")
             logger.info(f"mhnotify: 请求头Authorization: Bearer {access_token[:20]}...")
             
             try:
-                organize_res = RequestUtils(headers=headers).post_res(organize_url, json=organize_payload)
+                organize_res = self._mh_request("post", organize_path, access_token, json=organize_payload)
                 
                 # 检查响应对象
                 if organize_res is None:
@@ -1702,77 +1761,19 @@ class CloudDownloadMixin:
         except Exception as e:
             logger.error(f"mhnotify: 云下载移动整理异常: {e}", exc_info=True)
 
-    def _query_downloading_task_by_hash(self, client, info_hash: str) -> Optional[Dict[str, Any]]:
-        """
-        使用115 Web API查询正在下载的离线任务（通过info_hash匹配）
-        :param client: P115Client实例
-        :param info_hash: 任务hash
-        :return: 任务信息字典或None
-        """
-        try:
-            # 构造请求参数
-            # 参考 115-downing.txt，stat=12 表示查询正在下载的任务
-            import time as time_module
-            import hashlib
-            
-            # 获取用户ID
-            uid = self._get_115_uid()
-            if not uid:
-                logger.warning(f"mhnotify: 无法获取115用户ID")
-                return None
-            
-            # 构造签名
-            timestamp = int(time_module.time())
-            sign_str = f"{uid}{timestamp}"
-            sign = hashlib.md5(sign_str.encode()).hexdigest()
-            
-            # 调用离线任务列表API（stat=12 表示正在下载）
-            url = "https://115.com/web/lixian/?ct=lixian&ac=task_lists"
-            params = {
-                'page': 1,
-                'stat': 12,  # 12=正在下载
-                'uid': uid,
-                'sign': sign,
-                'time': timestamp
-            }
-            
-            # 使用RequestUtils发送请求
-            headers = {
-                "Accept": "application/json, text/javascript, */*; q=0.01",
-                "Cookie": self._p115_cookie,
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            
-            response = RequestUtils(headers=headers).post_res(url, data=params)
-            if not response or response.status_code != 200:
-                logger.debug(f"mhnotify: 查询正在下载任务失败: {response.status_code if response else 'No response'}")
-                return None
-            
-            result = response.json()
-            if not result or not result.get('state'):
-                logger.debug(f"mhnotify: 正在下载任务列表响应异常: {result}")
-                return None
-            
-            # 查找匹配的任务
-            tasks = result.get('tasks', [])
-            for task in tasks:
-                if task.get('info_hash', '').lower() == info_hash.lower():
-                    return task
-            
-            return None
-            
-        except Exception as e:
-            logger.debug(f"mhnotify: 查询正在下载任务异常: {e}")
-            return None
-
     def _get_115_uid(self) -> Optional[str]:
         """
-        从 cookie 中获取 115 用户 ID
+        获取 115 用户 ID：优先从 cookie 解析，失败时调用用户信息接口；结果按 cookie 缓存
         :return: 用户ID或None
         """
+        cookie = self._p115_cookie or ""
+        cached = getattr(self, "_p115_uid_cache", None)
+        if cached and cached[0] == cookie:
+            return cached[1]
+        uid = None
         try:
             cookie_dict = {}
-            for item in self._p115_cookie.split(';'):
+            for item in cookie.split(';'):
                 item = item.strip()
                 if '=' in item:
                     k, v = item.split('=', 1)
@@ -1780,12 +1781,20 @@ class CloudDownloadMixin:
             
             uid_str = cookie_dict.get('UID', '')
             if uid_str and '_' in uid_str:
-                return uid_str.split('_')[0]
-            
-            return None
+                uid = uid_str.split('_')[0]
         except Exception as e:
             logger.warning(f"mhnotify: 解析UID失败: {e}")
-            return None
+        if not uid and cookie:
+            try:
+                from p115client import P115Client
+                user_info = P115Client(cookie, app="web").fs_userinfo()
+                if user_info and isinstance(user_info, dict) and user_info.get('user_id'):
+                    uid = str(user_info.get('user_id'))
+            except Exception as e:
+                logger.debug(f"mhnotify: 获取115用户信息失败: {e}")
+        if uid:
+            self._p115_uid_cache = (cookie, uid)
+        return uid
 
     def _send_cloud_download_deleted_notification(self, task_name: str):
         """
@@ -1934,16 +1943,10 @@ class CloudDownloadMixin:
                 userid=event_data.get("user")
             )
             
-            # 启动批量监控线程
+            # 订阅批量任务状态，由共享的离线任务跟踪器统一监控
             if need_monitor and batch_tasks:
                 try:
-                    import threading
-                    logger.info(f"mhnotify: 启动批量监控线程，监控 {len(batch_tasks)} 个任务")
-                    threading.Thread(
-                        target=self._monitor_batch_downloads,
-                        args=(batch_tasks,),
-                        daemon=True
-                    ).start()
+                    logger.info(f"mhnotify: 启动批量监控，监控 {len(batch_tasks)} 个任务")
+                    self._monitor_batch_downloads(batch_tasks)
                 except Exception as e:
-                    logger.warning(f"mhnotify: 启动批量监控线程失败: {e}")
-
+                    logger.warning(f"mhnotify: 启动批量监控失败: {e}")
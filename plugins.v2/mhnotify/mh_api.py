@@ -1,12 +1,439 @@
+import copy
+import json
+import random
+import threading
 import time
-from typing import List, Dict, Any, Optional, Union
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+from urllib.parse import quote
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
 
 from app.utils.http import RequestUtils
 from app.log import logger
 
 
+class MHSubscriptionSnapshot:
+    """
+    MH 订阅列表快照：一次拉取全量列表，按 uuid / tmdb_id / 名称建立索引，
+    供同一调度周期内的多次查找复用；写操作就地同步，避免重复拉取
+    """
+
+    def __init__(self, subscriptions: List[Dict[str, Any]]):
+        self.by_uuid: Dict[str, Dict[str, Any]] = {}
+        self.by_tmdb: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_name: Dict[str, List[Dict[str, Any]]] = {}
+        for rec in subscriptions:
+            uid = self.uuid_of(rec)
+            if uid:
+                self.by_uuid[uid] = rec
+            tmdb_id = str((rec.get("params") or {}).get("tmdb_id") or "")
+            if tmdb_id:
+                self.by_tmdb.setdefault(tmdb_id, []).append(rec)
+            name = self.name_of(rec)
+            if name:
+                self.by_name.setdefault(name, []).append(rec)
+
+    @staticmethod
+    def uuid_of(rec: Dict[str, Any]) -> Optional[str]:
+        return rec.get("uuid") or (rec.get("task") or {}).get("uuid")
+
+    @staticmethod
+    def name_of(rec: Dict[str, Any]) -> str:
+        params = rec.get("params") or {}
+        return (rec.get("name") or (rec.get("task") or {}).get("name") or params.get("title") or "").strip().lower()
+
+    def get(self, uuid: str) -> Optional[Dict[str, Any]]:
+        return self.by_uuid.get(uuid)
+
+    def find_by_tmdb(self, tmdb_id: Union[str, int]) -> List[Dict[str, Any]]:
+        return list(self.by_tmdb.get(str(tmdb_id), []))
+
+    def find_by_name(self, title: str) -> List[Dict[str, Any]]:
+        return list(self.by_name.get(str(title).strip().lower(), []))
+
+    def discard(self, uuid: str):
+        """订阅已删除：从全部索引中移除"""
+        rec = self.by_uuid.pop(uuid, None)
+        if rec is None:
+            return
+        for index in (self.by_tmdb, self.by_name):
+            for key, recs in list(index.items()):
+                if rec in recs:
+                    recs.remove(rec)
+                    if not recs:
+                        index.pop(key, None)
+
+    def patch(self, uuid: str, params: Dict[str, Any]):
+        """订阅参数已更新：合并到快照记录（tmdb_id/名称不会因季更新而变化）"""
+        rec = self.by_uuid.get(uuid)
+        if rec is not None:
+            rec["params"] = {**(rec.get("params") or {}), **params}
+
+
+class MHApiClient:
+    """
+    MH 接口客户端：所有请求共享一个带连接池的会话（keep-alive），
+    无响应或 5xx 时按指数退避加随机抖动重试（默认仅幂等请求），并按接口统计调用耗时与错误数
+    """
+
+    def __init__(self, retries: int = 2, backoff: float = 0.5, pool_size: int = 8):
+        self._retries = retries
+        self._backoff = backoff
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        # 接口 -> {calls, errors, total_ms, max_ms, last_status}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def request(self, method: str, url: str, endpoint: str, headers: Dict[str, str],
+                timeout: Optional[int] = None, retries: Optional[int] = None, **kwargs) -> Optional[Response]:
+        """
+        发送请求，返回响应（全部失败时返回 None 或最后一次响应）
+        :param method: get/post/put/delete
+        :param endpoint: 统计用的接口名称，如 "GET /api/v1/subscription/list"
+        :param retries: 重试次数，默认 GET/PUT/DELETE 使用客户端配置，POST 不重试
+        """
+        method = method.lower()
+        if retries is None:
+            retries = self._retries if method in ("get", "put", "delete") else 0
+        res = None
+        for attempt in range(retries + 1):
+            start = time.time()
+            res = getattr(RequestUtils(headers=headers, session=self._session, timeout=timeout), f"{method}_res")(url, **kwargs)
+            self._record(endpoint, res, (time.time() - start) * 1000)
+            if res is not None and res.status_code < 500:
+                return res
+            if attempt < retries:
+                delay = self._backoff * (2 ** attempt) + random.uniform(0, self._backoff)
+                logger.debug(f"mhnotify: {endpoint} 请求失败 status={getattr(res, 'status_code', None)}，{delay:.1f}秒后重试")
+                time.sleep(delay)
+        return res
+
+    def _record(self, endpoint: str, res: Optional[Response], elapsed_ms: float):
+        with self._lock:
+            stat = self._stats.setdefault(endpoint, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_status": None})
+            stat["calls"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            stat["last_status"] = getattr(res, "status_code", None)
+            if res is None or res.status_code >= 400:
+                stat["errors"] += 1
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """按调用次数倒序返回各接口统计"""
+        with self._lock:
+            rows = [
+                {
+                    "endpoint": endpoint,
+                    "calls": s["calls"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["calls"], 1) if s["calls"] else 0.0,
+                    "max_ms": round(s["max_ms"], 1),
+                    "last_status": s["last_status"],
+                }
+                for endpoint, s in self._stats.items()
+            ]
+        return sorted(rows, key=lambda r: r["calls"], reverse=True)
+
+
+class ListenerKeywordQueue:
+    """
+    TG 转发监听关键词同步队列：短时间窗口内的添加/移除按监听配置合并，到期后每个监听配置只 PUT 一次；
+    监听列表缓存在内存中，写入前重新拉取并比对版本，版本变化时在最新配置上重放合并后的操作
+    """
+
+    def __init__(self, fetch: Callable[[], Optional[List[Dict[str, Any]]]],
+                 put: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 window: float = 3.0, cache_ttl: int = 600, max_attempts: int = 2):
+        """
+        :param fetch: 拉取监听列表，失败时返回 None
+        :param put: 写入监听配置，成功时返回写入后的配置，失败时返回 None
+        :param window: 合并窗口（秒）
+        """
+        self._fetch = fetch
+        self._put = put
+        self._window = window
+        self._cache_ttl = cache_ttl
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # 串行化 flush，保证后一次 flush 基于前一次写入后的缓存
+        self._flush_lock = threading.Lock()
+        # 监听 ID -> 字段 -> {关键词: 是否移除}，同一关键词以最后一次操作为准
+        self._pending: Dict[str, Dict[str, Dict[str, bool]]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache_order: List[str] = []
+        self._fetched_at = 0.0
+        self.stats = {"queued": 0, "flushes": 0, "puts": 0, "conflicts": 0, "failed": 0}
+
+    def bind(self, fetch: Callable[[], Optional[List[Dict[str, Any]]]],
+             put: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]):
+        """插件重载后绑定新的拉取/写入函数"""
+        self._fetch = fetch
+        self._put = put
+
+    @staticmethod
+    def _version(listener: Dict[str, Any]) -> Any:
+        """监听配置版本：优先使用接口返回的版本/更新时间，否则以过滤条件内容作为版本"""
+        for key in ("version", "updated_at", "update_time"):
+            if listener.get(key) is not None:
+                return listener.get(key)
+        return json.dumps(listener.get("filter") or {}, sort_keys=True, ensure_ascii=False)
+
+    def _refresh(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """重新拉取监听列表并替换缓存，失败时返回 None"""
+        listeners = self._fetch()
+        if listeners is None:
+            return None
+        with self._lock:
+            self._cache = {l.get("id"): l for l in listeners if l.get("id")}
+            self._cache_order = [l.get("id") for l in listeners if l.get("id")]
+            self._fetched_at = time.time()
+            return dict(self._cache)
+
+    def listeners(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """获取监听列表（缓存过期或指定刷新时重新拉取，拉取失败时返回旧缓存）"""
+        with self._lock:
+            fresh = self._cache_order and time.time() - self._fetched_at < self._cache_ttl
+        if refresh or not fresh:
+            self._refresh()
+        with self._lock:
+            return [copy.deepcopy(self._cache[lid]) for lid in self._cache_order if lid in self._cache]
+
+    def enqueue(self, listener_id: str, field: str, keyword: str, remove: bool = False):
+        """登记一次关键词变更，窗口到期后统一写入"""
+        if not listener_id or not keyword:
+            return
+        with self._lock:
+            ops = self._pending.setdefault(listener_id, {}).setdefault(field, {})
+            ops.pop(keyword, None)
+            ops[keyword] = remove
+            self.stats["queued"] += 1
+            if self._timer and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(self._window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @staticmethod
+    def _apply(listener: Dict[str, Any], fields: Dict[str, Dict[str, bool]]) -> Tuple[Dict[str, Any], bool]:
+        """在监听配置副本上应用合并后的操作，返回 (新配置, 是否有变化)"""
+        payload = copy.deepcopy(listener)
+        flt = payload.setdefault("filter", {})
+        changed = False
+        for field, ops in fields.items():
+            current = list(flt.get(field) or [])
+            for keyword, remove in ops.items():
+                if remove and keyword in current:
+                    current = [k for k in current if k != keyword]
+                    changed = True
+                elif not remove and keyword not in current:
+                    current.append(keyword)
+                    changed = True
+            flt[field] = current
+        return payload, changed
+
+    def flush(self) -> Dict[str, bool]:
+        """
+        写入所有待同步的变更：与缓存比对无变化的监听配置不发请求；
+        有变化时拉取一次最新列表核对版本，版本不一致则基于最新配置重新合并，写入失败时重试
+        :return: {监听 ID: 是否成功}
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._timer = None
+                if not pending:
+                    return {}
+                self.stats["flushes"] += 1
+                cached = dict(self._cache)
+            results: Dict[str, bool] = {}
+            latest = None
+            if not cached:
+                latest = self._refresh()
+                cached = latest or {}
+            # 基于缓存判断哪些监听配置需要写入
+            dirty = {}
+            for lid, fields in pending.items():
+                base = cached.get(lid)
+                if base is None:
+                    dirty[lid] = None
+                    continue
+                _, changed = self._apply(base, fields)
+                if changed:
+                    dirty[lid] = base
+                else:
+                    results[lid] = True
+            if not dirty:
+                return results
+
+            for attempt in range(self._max_attempts):
+                if attempt or latest is None:
+                    latest = self._refresh()
+                if latest is None:
+                    logger.warning("mhnotify: 拉取转发监听列表失败，关键词同步取消")
+                    break
+                retry = {}
+                for lid, base in dirty.items():
+                    target = latest.get(lid)
+                    if target is None:
+                        logger.warning(f"mhnotify: 未找到转发监听配置 id={lid}")
+                        results[lid] = False
+                        continue
+                    if base is not None and self._version(base) != self._version(target):
+                        with self._lock:
+                            self.stats["conflicts"] += 1
+                        logger.debug(f"mhnotify: 转发监听[{lid}]已被修改，基于最新配置重新合并关键词")
+                    payload, changed = self._apply(target, pending[lid])
+                    if not changed:
+                        results[lid] = True
+                        continue
+                    with self._lock:
+                        self.stats["puts"] += 1
+                    saved = self._put(payload)
+                    if saved is None:
+                        retry[lid] = target
+                        continue
+                    with self._lock:
+                        self._cache[lid] = saved
+                    results[lid] = True
+                    logger.info(f"mhnotify: 转发监听[{lid}]关键词已同步 {self._summary(pending[lid])}")
+                dirty = retry
+                if not dirty:
+                    break
+            for lid in dirty:
+                results[lid] = False
+            failed = [lid for lid, ok in results.items() if not ok]
+            if failed:
+                with self._lock:
+                    self.stats["failed"] += len(failed)
+                logger.warning(f"mhnotify: 转发监听关键词同步失败 -> {failed}")
+            return results
+
+    @staticmethod
+    def _summary(fields: Dict[str, Dict[str, bool]]) -> str:
+        parts = []
+        for field, ops in fields.items():
+            field_name = "白名单" if field == "keywords" else "黑名单"
+            added = [k for k, remove in ops.items() if not remove]
+            removed = [k for k, remove in ops.items() if remove]
+            for sign, keywords in (("+", added), ("-", removed)):
+                if keywords:
+                    more = f" 等{len(keywords)}个" if len(keywords) > 5 else ""
+                    parts.append(f"{field_name}{sign}{keywords[:5]}{more}")
+        return " ".join(parts)
+
+    def close(self):
+        """取消定时器并立即写入剩余变更"""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer:
+            timer.cancel()
+        self.flush()
+
+
 class MHApiMixin:
 
+    # 调度周期内的订阅列表快照，按线程隔离（仅开启快照的线程使用）：status -> MHSubscriptionSnapshot
+    _mh_snapshot_local = threading.local()
+
+    # MH 接口客户端（类级别共享，插件重载后继续复用连接池与统计）
+    _mh_client_inst: Optional[MHApiClient] = None
+    _mh_client_lock = threading.Lock()
+
+    # TG 转发关键词同步队列（类级别共享，持有监听列表缓存）
+    _mh_keyword_queue_inst: Optional[ListenerKeywordQueue] = None
+    _mh_keyword_queue_lock = threading.Lock()
+
+    def _mh_client(self) -> MHApiClient:
+        with MHApiMixin._mh_client_lock:
+            if MHApiMixin._mh_client_inst is None:
+                MHApiMixin._mh_client_inst = MHApiClient()
+            return MHApiMixin._mh_client_inst
+
+    def _mh_keyword_queue(self) -> ListenerKeywordQueue:
+        """获取共享的转发关键词同步队列（类级别单例，重新绑定到当前插件实例）"""
+        with MHApiMixin._mh_keyword_queue_lock:
+            queue = MHApiMixin._mh_keyword_queue_inst
+            if queue is None:
+                queue = MHApiMixin._mh_keyword_queue_inst = ListenerKeywordQueue(
+                    self._mh_fetch_listeners, self._mh_put_listener)
+            else:
+                queue.bind(self._mh_fetch_listeners, self._mh_put_listener)
+            return queue
+
+    def _mh_request(self, method: str, path: str, access_token: Optional[str] = None,
+                    endpoint: Optional[str] = None, headers: Optional[Dict[str, str]] = None,
+                    **kwargs) -> Optional[Response]:
+        """
+        调用 MH 接口：复用连接池，401 时清除缓存 token 重新登录并重试一次
+        :param path: 以 /api 开头的接口路径（可带查询参数）
+        :param endpoint: 统计用的接口名称，默认 "方法 路径"（不含查询参数）
+        """
+        url = f"{self._mh_domain}{path}"
+        endpoint = endpoint or f"{method.upper()} {path.split('?')[0]}"
+        # 缓存 token 已刷新时优先使用新 token
+        token = access_token
+        if self._mh_token and int(time.time()) < self._mh_token_expire_ts:
+            token = self._mh_token
+
+        def build_headers(tok: Optional[str]) -> Dict[str, str]:
+            h = self._auth_headers(tok) if tok else {}
+            h.update(headers or {})
+            return h
+
+        client = self._mh_client()
+        res = client.request(method, url, endpoint, build_headers(token), **kwargs)
+        if res is not None and res.status_code == 401 and token:
+            logger.info(f"mhnotify: MH access_token 已失效，重新登录后重试 {endpoint}")
+            self._mh_token = None
+            self._mh_token_expire_ts = 0
+            new_token = self._mh_login()
+            if new_token:
+                res = client.request(method, url, endpoint, build_headers(new_token), **kwargs)
+        return res
+
+    def _mh_snapshot_begin(self):
+        """开启订阅列表快照：之后本线程的订阅查找/按条件删除复用同一份列表"""
+        self._mh_snapshot_local.snapshots = {}
+
+    def _mh_snapshot_end(self):
+        self._mh_snapshot_local.snapshots = None
+
+    def _mh_snapshot(self, access_token: str, status: Optional[str] = None) -> Optional[MHSubscriptionSnapshot]:
+        """获取当前线程的订阅列表快照（未开启快照或拉取失败时返回 None）"""
+        snapshots = getattr(self._mh_snapshot_local, "snapshots", None)
+        if snapshots is None:
+            return None
+        snapshot = snapshots.get(status)
+        if snapshot is None:
+            lst = self._mh_list_subscriptions(access_token, status=status)
+            if not lst:
+                return None
+            snapshot = snapshots[status] = MHSubscriptionSnapshot((lst.get("data") or {}).get("subscriptions") or [])
+        return snapshot
+
+    def _mh_snapshot_invalidate(self, uuid: Optional[str] = None, params: Optional[Dict[str, Any]] = None,
+                                deleted: bool = False):
+        """
+        写操作后同步快照：删除则移除记录，更新则合并参数，其余（如新建）整体失效，下次查找重新拉取
+        """
+        snapshots = getattr(self._mh_snapshot_local, "snapshots", None)
+        if not snapshots:
+            return
+        if uuid and deleted:
+            for snapshot in snapshots.values():
+                snapshot.discard(uuid)
+        elif uuid and params is not None:
+            for snapshot in snapshots.values():
+                snapshot.patch(uuid, params)
+        else:
+            snapshots.clear()
+
     def _mh_login(self) -> Optional[str]:
         """登录 MH 获取 access_token"""
         try:
@@ -28,7 +455,7 @@ class MHApiMixin:
                 "Accept-Language": "zh-CN",
                 "User-Agent": "MoviePilot/Plugin MHNotify"
             }
-            res = RequestUtils(headers=headers).post(login_url, json=payload)
+            res = self._mh_client().request("post", login_url, "POST /api/v1/auth/login", headers, json=payload)
             if res is None:
                 logger.error("mhnotify: 登录MH未获取到任何响应")
             else:
@@ -57,9 +484,9 @@ class MHApiMixin:
 
     def _mh_get_defaults(self, access_token: str) -> Dict[str, Any]:
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/config/defaults"
-            logger.info(f"mhnotify: 获取MH默认配置 GET {url}")
-            res = RequestUtils(headers=self._auth_headers(access_token)).get_res(url)
+            path = "/api/v1/subscription/config/defaults"
+            logger.info(f"mhnotify: 获取MH默认配置 GET {self._mh_domain}{path}")
+            res = self._mh_request("get", path, access_token)
             if res is None:
                 logger.error("mhnotify: 获取MH默认配置未返回响应")
             elif res.status_code != 200:
@@ -96,15 +523,14 @@ class MHApiMixin:
 
     def _mh_create_subscription(self, access_token: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/create"
-            headers = self._auth_headers(access_token)
-            headers.update({"Content-Type": "application/json;charset=UTF-8", "Origin": self._mh_domain})
-            logger.info(f"mhnotify: 创建MH订阅 POST {url} media_type={payload.get('media_type')} tmdb_id={payload.get('tmdb_id')} title={str(payload.get('title'))[:50]}")
+            path = "/api/v1/subscription/create"
+            headers = {"Content-Type": "application/json;charset=UTF-8", "Origin": self._mh_domain}
+            logger.info(f"mhnotify: 创建MH订阅 POST {self._mh_domain}{path} media_type={payload.get('media_type')} tmdb_id={payload.get('tmdb_id')} title={str(payload.get('title'))[:50]}")
             # 增加显式超时与小次数重试，缓解瞬时网络抖动
             timeout_seconds = 30
             max_retries = 2  # 总共尝试 1+2 次
             for attempt in range(1, max_retries + 2):
-                res = RequestUtils(headers=headers, timeout=timeout_seconds).post(url, json=payload)
+                res = self._mh_request("post", path, access_token, headers=headers, timeout=timeout_seconds, json=payload)
                 if res is None:
                     logger.error(f"mhnotify: 创建MH订阅未返回响应（第{attempt}次，可能超时{timeout_seconds}s）")
                 elif res.status_code not in (200, 204):
@@ -138,6 +564,7 @@ class MHApiMixin:
                     data = res.json() or {}
                     uuid = (data.get("data") or {}).get("subscription_id") or (data.get("data") or {}).get("task", {}).get("uuid")
                     logger.info(f"mhnotify: 创建MH订阅成功 uuid={uuid}")
+                    self._mh_snapshot_invalidate()
                     return data
                 # 还有重试次数时，进行指数级短暂停顿
                 if attempt <= max_retries:
@@ -149,16 +576,16 @@ class MHApiMixin:
 
     def _mh_list_subscriptions(self, access_token: str, status: Optional[str] = None, search: Optional[str] = None, page_size: int = 2000) -> Dict[str, Any]:
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/list?page=1&page_size={page_size}"
+            path = f"/api/v1/subscription/list?page=1&page_size={page_size}"
             if status:
-                url += f"&status={status}"
+                path += f"&status={status}"
             if search:
                 try:
-                    url += f"&search={quote(search)}"
+                    path += f"&search={quote(search)}"
                 except Exception:
-                    url += f"&search={search}"
-            logger.info(f"mhnotify: 查询MH订阅列表 GET {url}")
-            res = RequestUtils(headers=self._auth_headers(access_token)).get_res(url)
+                    path += f"&search={search}"
+            logger.info(f"mhnotify: 查询MH订阅列表 GET {self._mh_domain}{path}")
+            res = self._mh_request("get", path, access_token)
             if res is None:
                 logger.error("mhnotify: 查询MH订阅列表未返回响应")
             elif res.status_code != 200:
@@ -175,16 +602,17 @@ class MHApiMixin:
 
     def _mh_delete_subscription(self, access_token: str, uuid: str) -> bool:
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/{uuid}"
-            headers = self._auth_headers(access_token)
-            headers.update({"Origin": self._mh_domain})
-            logger.info(f"mhnotify: 删除MH订阅 DELETE {url}")
-            res = RequestUtils(headers=headers).delete_res(url)
+            path = f"/api/v1/subscription/{uuid}"
+            logger.info(f"mhnotify: 删除MH订阅 DELETE {self._mh_domain}{path}")
+            res = self._mh_request("delete", path, access_token, endpoint="DELETE /api/v1/subscription/{uuid}",
+                                   headers={"Origin": self._mh_domain})
             ok = bool(res and res.status_code in (200, 204))
             if res is None:
                 logger.error("mhnotify: 删除MH订阅未返回响应")
             else:
                 logger.info(f"mhnotify: 删除MH订阅响应 status={res.status_code} ok={ok}")
+            if ok:
+                self._mh_snapshot_invalidate(uuid, deleted=True)
             return ok
         except Exception:
             logger.error("mhnotify: 删除MH订阅异常", exc_info=True)
@@ -194,8 +622,12 @@ class MHApiMixin:
         try:
             if not title:
                 return 0
-            lst = self._mh_list_subscriptions(access_token, status="active", search=title, page_size=2000)
-            subs = (lst.get("data") or {}).get("subscriptions") or []
+            snapshot = self._mh_snapshot(access_token, status="active")
+            if snapshot:
+                subs = snapshot.find_by_name(title)
+            else:
+                lst = self._mh_list_subscriptions(access_token, status="active", search=title, page_size=2000)
+                subs = (lst.get("data") or {}).get("subscriptions") or []
             count = 0
             t_norm = str(title).strip().lower()
             for rec in subs:
@@ -219,8 +651,12 @@ class MHApiMixin:
             
             # 使用 TMDB ID 锁，防止并发操作同一订阅
             with self._get_tmdb_lock(tmdb_id):
-                lst = self._mh_list_subscriptions(access_token, status="active", page_size=2000)
-                subs = (lst.get("data") or {}).get("subscriptions") or []
+                snapshot = self._mh_snapshot(access_token, status="active")
+                if snapshot:
+                    subs = snapshot.find_by_tmdb(tmdb_id)
+                else:
+                    lst = self._mh_list_subscriptions(access_token, status="active", page_size=2000)
+                    subs = (lst.get("data") or {}).get("subscriptions") or []
                 count = 0
                 tmdb_norm = str(tmdb_id)
                 mtype_norm = (str(media_type or "").lower().strip() or None)
@@ -278,9 +714,8 @@ class MHApiMixin:
         params 中包含 selected_seasons 与 episode_ranges 以及其他字段
         """
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/{uuid}"
-            headers = self._auth_headers(access_token)
-            headers.update({"Content-Type": "application/json;charset=UTF-8", "Origin": self._mh_domain})
+            path = f"/api/v1/subscription/{uuid}"
+            headers = {"Content-Type": "application/json;charset=UTF-8", "Origin": self._mh_domain}
             # 组装更新体：仅更新提供的字段，避免覆盖已有 name/cron
             update_body: Dict[str, Any] = {
                 "params": payload
@@ -291,8 +726,9 @@ class MHApiMixin:
             # 仅当显式传入 cron 时才更新 cron
             if "cron" in payload:
                 update_body["cron"] = payload.get("cron")
-            logger.info(f"mhnotify: 更新MH订阅 PUT {url} seasons={payload.get('selected_seasons')}")
-            res = RequestUtils(headers=headers, timeout=30).put_res(url, json=update_body)
+            logger.info(f"mhnotify: 更新MH订阅 PUT {self._mh_domain}{path} seasons={payload.get('selected_seasons')}")
+            res = self._mh_request("put", path, access_token, endpoint="PUT /api/v1/subscription/{uuid}",
+                                   headers=headers, timeout=30, json=update_body)
             if res is None:
                 logger.error("mhnotify: 更新MH订阅未返回响应")
             elif res.status_code not in (200, 204):
@@ -300,6 +736,7 @@ class MHApiMixin:
             else:
                 data = res.json() or {}
                 logger.info("mhnotify: 更新MH订阅成功")
+                self._mh_snapshot_invalidate(uuid, params=payload)
                 return data
         except Exception:
             logger.error("mhnotify: 更新MH订阅异常", exc_info=True)
@@ -310,11 +747,10 @@ class MHApiMixin:
         POST /api/v1/subscription/{uuid}/execute
         """
         try:
-            url = f"{self._mh_domain}/api/v1/subscription/{uuid}/execute"
-            headers = self._auth_headers(access_token)
-            headers.update({"Content-Length": "0", "Origin": self._mh_domain})
-            logger.info(f"mhnotify: 触发MH订阅执行 POST {url}")
-            res = RequestUtils(headers=headers, timeout=30).post_res(url)
+            path = f"/api/v1/subscription/{uuid}/execute"
+            logger.info(f"mhnotify: 触发MH订阅执行 POST {self._mh_domain}{path}")
+            res = self._mh_request("post", path, access_token, endpoint="POST /api/v1/subscription/{uuid}/execute",
+                                   headers={"Content-Length": "0", "Origin": self._mh_domain}, timeout=30)
             if res is None:
                 logger.error("mhnotify: 触发MH订阅执行未返回响应")
                 return False
@@ -330,7 +766,11 @@ class MHApiMixin:
         return False
 
     def _mh_find_subscription_by_uuid(self, access_token: str, uuid: str, title: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        """先按标题搜索快捷查找，再按全量兜底，最终从结果中匹配 uuid 对应的订阅记录"""
+        """先按标题搜索快捷查找，再按全量兜底，最终从结果中匹配 uuid 对应的订阅记录（开启快照时直接查快照）"""
+        snapshot = self._mh_snapshot(access_token)
+        if snapshot:
+            return snapshot.get(uuid)
+
         def _search_in_list(lst_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             for rec in (lst_data.get("data") or {}).get("subscriptions") or []:
                 uid = rec.get("uuid") or (rec.get("task") or {}).get("uuid")
@@ -357,8 +797,7 @@ class MHApiMixin:
         GET /api/v1/tg-forwarder/listeners
         """
         try:
-            url = f"{self._mh_domain}/api/v1/tg-forwarder/listeners"
-            res = RequestUtils(headers=self._auth_headers(access_token), timeout=15).get_res(url=url)
+            res = self._mh_request("get", "/api/v1/tg-forwarder/listeners", access_token, timeout=15)
             if res and res.status_code == 200:
                 return (res.json().get("data") or {}).get("listeners") or []
             logger.warning(f"mhnotify: 获取转发监听列表失败 status={getattr(res, 'status_code', None)}")
@@ -366,96 +805,43 @@ class MHApiMixin:
             logger.warning("mhnotify: 获取转发监听列表异常", exc_info=True)
         return []
 
-    def _mh_sync_listener_keyword(self, access_token: str, listener_id: str, keyword: str,
-                                   field: str = "keywords", remove: bool = False,
-                                   listeners_list: Optional[List[Dict[str, Any]]] = None) -> bool:
-        """向监听配置的指定字段（keywords/blacklist_keywords）添加或移除关键词
-        PUT /api/v1/tg-forwarder/listeners/{id}
-        """
+    def _mh_fetch_listeners(self) -> Optional[List[Dict[str, Any]]]:
+        """登录并拉取转发监听列表，失败时返回 None（供关键词同步队列刷新缓存）"""
+        token = self._mh_login()
+        if not token:
+            logger.warning("mhnotify: 拉取转发监听列表失败：MH登录失败")
+            return None
         try:
-            import copy
-            listeners = listeners_list or self._mh_get_listeners(access_token)
-            target = next((l for l in listeners if l.get("id") == listener_id), None)
-            if not target:
-                logger.warning(f"mhnotify: 未找到转发监听配置 id={listener_id}")
-                return False
-            listener = copy.deepcopy(target)
-            current_kws = list((listener.get("filter") or {}).get(field) or [])
-            if remove:
-                if keyword not in current_kws:
-                    return True
-                current_kws = [k for k in current_kws if k != keyword]
-            else:
-                if keyword in current_kws:
-                    return True
-                current_kws.append(keyword)
-            listener.setdefault("filter", {})[field] = current_kws
-            url = f"{self._mh_domain}/api/v1/tg-forwarder/listeners/{listener_id}"
-            res = RequestUtils(
-                headers=self._auth_headers(access_token),
-                content_type="application/json"
-            ).put_res(url=url, json=listener)
-            ok = bool(res and res.status_code == 200)
-            action = "移除" if remove else "添加"
-            field_name = "白名单" if field == "keywords" else "黑名单"
-            if ok:
-                logger.info(f"mhnotify: 已{action}转发{field_name}关键词 '{keyword}' -> 监听[{listener_id}]")
-            else:
-                logger.warning(f"mhnotify: {action}转发{field_name}关键词失败 '{keyword}' -> 监听[{listener_id}]")
-            return ok
+            res = self._mh_request("get", "/api/v1/tg-forwarder/listeners", token, timeout=15)
+            if res and res.status_code == 200:
+                return (res.json().get("data") or {}).get("listeners") or []
+            logger.warning(f"mhnotify: 获取转发监听列表失败 status={getattr(res, 'status_code', None)}")
         except Exception:
-            logger.warning("mhnotify: 同步转发监听关键词异常", exc_info=True)
-        return False
+            logger.warning("mhnotify: 获取转发监听列表异常", exc_info=True)
+        return None
 
-    def _mh_sync_listener_keywords_optimized(self, access_token: str, listener_id: str, 
-                                             keywords_map: Dict[str, str], remove: bool = False,
-                                             listeners_list: Optional[List[Dict[str, Any]]] = None) -> bool:
-        """批量同步多个字段的关键词到同一个监听配置，合并为一个 PUT 请求
-        keywords_map: { "keywords": "media_name", "blacklist_keywords": "media_name" }
+    def _mh_put_listener(self, listener: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """写入整个监听配置，成功时返回写入后的配置（接口未返回时使用提交内容）
+        PUT /api/v1/tg-forwarder/listeners/{id}
         """
+        token = self._mh_login()
+        if not token:
+            return None
+        listener_id = listener.get("id")
         try:
-            import copy
-            if not keywords_map:
-                return True
-            listeners = listeners_list or self._mh_get_listeners(access_token)
-            target = next((l for l in listeners if l.get("id") == listener_id), None)
-            if not target:
-                logger.warning(f"mhnotify: [优化版] 未找到转发监听配置 id={listener_id}")
-                return False
-            
-            listener = copy.deepcopy(target)
-            changed = False
-            
-            for field, keyword in keywords_map.items():
-                if not keyword:
-                    continue
-                current_kws = list((listener.get("filter") or {}).get(field) or [])
-                if remove:
-                    if keyword in current_kws:
-                        current_kws = [k for k in current_kws if k != keyword]
-                        changed = True
-                else:
-                    if keyword not in current_kws:
-                        current_kws.append(keyword)
-                        changed = True
-                listener.setdefault("filter", {})[field] = current_kws
-
-            if not changed:
-                return True
-
-            url = f"{self._mh_domain}/api/v1/tg-forwarder/listeners/{listener_id}"
-            res = RequestUtils(
-                headers=self._auth_headers(access_token),
-                content_type="application/json"
-            ).put_res(url=url, json=listener)
-            
-            ok = bool(res and res.status_code == 200)
-            action = "移除" if remove else "添加"
-            if ok:
-                logger.info(f"mhnotify: [优化版] 已{action}多项转发关键词 -> 监听[{listener_id}]")
-            else:
-                logger.warning(f"mhnotify: [优化版] {action}多项转发关键词失败 -> 监听[{listener_id}]")
-            return ok
+            res = self._mh_request("put", f"/api/v1/tg-forwarder/listeners/{listener_id}", token,
+                                   endpoint="PUT /api/v1/tg-forwarder/listeners/{id}",
+                                   headers={"Content-Type": "application/json"}, json=listener)
+            if not res or res.status_code != 200:
+                logger.warning(f"mhnotify: 写入转发监听[{listener_id}]失败 status={getattr(res, 'status_code', None)}")
+                return None
+            try:
+                data = (res.json() or {}).get("data")
+            except Exception:
+                data = None
+            if isinstance(data, dict) and data.get("id") == listener_id:
+                return data
+            return listener
         except Exception:
-            logger.warning("mhnotify: 批量同步转发监听关键词异常", exc_info=True)
-        return False
+            logger.warning(f"mhnotify: 写入转发监听[{listener_id}]异常", exc_info=True)
+        return None
@@ -16,8 +16,90 @@ from app.db import SessionFactory
 from app.db.subscribe_oper import SubscribeOper
 
 
+class AssistState:
+    """
+    助手 pending/watch 映射的内存状态：所有读写都经过同一份内存字典并记录脏标记，
+    由调用方在合适的时机 commit（调度周期结束时一次），长周期内按间隔 checkpoint 落盘防止崩溃丢失
+    """
+
+    # 周期内检查点的最小落盘间隔（秒）
+    CHECKPOINT_INTERVAL = 30
+
+    def __init__(self, plugin: Any, key: str):
+        self._plugin = plugin
+        self._key = key
+        self._lock = threading.RLock()
+        self._data: Optional[Dict[str, dict]] = None
+        self._dirty = False
+        self._last_commit = time.time()
+
+    def _load(self) -> Dict[str, dict]:
+        if self._data is None:
+            self._data = dict(self._plugin.get_data(self._key) or {})
+        return self._data
+
+    def get(self, sid: Any, default: Any = None) -> Any:
+        with self._lock:
+            return self._load().get(str(sid), default)
+
+    def items(self) -> List[Tuple[str, dict]]:
+        with self._lock:
+            return list(self._load().items())
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._load().keys())
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self._load())
+
+    def __contains__(self, sid: Any) -> bool:
+        with self._lock:
+            return str(sid) in self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __setitem__(self, sid: Any, info: dict):
+        with self._lock:
+            self._load()[str(sid)] = info
+            self._dirty = True
+
+    def pop(self, sid: Any, default: Any = None) -> Any:
+        with self._lock:
+            data = self._load()
+            if str(sid) not in data:
+                return default
+            self._dirty = True
+            return data.pop(str(sid))
+
+    def commit(self):
+        """有变更时整体写回插件数据（一次数据库写入）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._plugin.save_data(self._key, dict(self._data or {}))
+            self._dirty = False
+            self._last_commit = time.time()
+
+    def checkpoint(self):
+        """距上次落盘超过检查点间隔时提交，限制崩溃时可能丢失的变更范围"""
+        with self._lock:
+            if self._dirty and time.time() - self._last_commit >= self.CHECKPOINT_INTERVAL:
+                self.commit()
+
+
 class MHAssistMixin:
 
+    # 助手 pending/watch 内存状态（数据键 -> AssistState）
+    _assist_states: Dict[str, AssistState] = {}
+    _assist_states_lock = threading.Lock()
+
     def _on_subscribe_added(self, event: Event):
         """
         mh订阅辅助：仅对新订阅生效
@@ -199,7 +281,7 @@ class MHAssistMixin:
             
             # 记录待检查项
             _now_ts = int(time.time())
-            pending: Dict[str, dict] = self.get_data(self._ASSIST_PENDING_KEY) or {}
+            pending = self._assist_pending()
             pending[str(sub_id)] = {
                 "mh_uuid": mh_uuid,
                 "created_at": _now_ts,
@@ -208,7 +290,7 @@ class MHAssistMixin:
                 "douban_id": (mediainfo_dict.get("douban_id") or mediainfo_dict.get("doubanid") or getattr(subscribe, 'doubanid', None)),
                 "title": (create_payload.get("title") or mediainfo_dict.get("title") or getattr(subscribe, 'name', '') or "")
             }
-            self.save_data(self._ASSIST_PENDING_KEY, pending)
+            pending.commit()
             # 同步订阅名称到转发白名单/黑名单
             try:
                 _sub_name = getattr(subscribe, 'name', '') or mediainfo_dict.get('title') or ''
@@ -223,13 +305,12 @@ class MHAssistMixin:
                         with self._timers_lock:
                             self._pending_timers.pop(str(sub_id), None)
                         
-                        p = self.get_data(self._ASSIST_PENDING_KEY) or {}
+                        p = self._assist_pending()
                         info = p.get(str(sub_id))
                         if not info:
                             return
                         info["min_check_at"] = int(time.time())  # 立即让全局 scheduler 可处理
                         p[str(sub_id)] = info
-                        self.save_data(self._ASSIST_PENDING_KEY, p)
                         self._assist_scheduler()
                     except Exception:
                         logger.warning("mhnotify: 新订阅延迟检查异常", exc_info=True)
@@ -249,6 +330,27 @@ class MHAssistMixin:
 
     # 旧屏蔽逻辑移除
 
+    def _assist_state(self, key: str) -> AssistState:
+        with self._assist_states_lock:
+            state = self._assist_states.get(key)
+            if state is None:
+                state = self._assist_states[key] = AssistState(self, key)
+            return state
+
+    def _assist_pending(self) -> AssistState:
+        return self._assist_state(self._ASSIST_PENDING_KEY)
+
+    def _assist_watch(self) -> AssistState:
+        return self._assist_state(self._ASSIST_WATCH_KEY)
+
+    def _assist_commit(self):
+        """提交 pending/watch 的全部变更"""
+        for state in (self._assist_pending(), self._assist_watch()):
+            try:
+                state.commit()
+            except Exception:
+                logger.error("mhnotify: 保存助手状态失败", exc_info=True)
+
     def _get_tmdb_lock(self, tmdb_id: Union[int, str]) -> threading.Lock:
         """获取指定tmdb_id的锁"""
         if not tmdb_id:
@@ -485,7 +587,7 @@ class MHAssistMixin:
                 return False
                 
             # 获取插件记录的watch列表
-            watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+            watch = self._assist_watch()
             if not watch:
                 return False
                 
@@ -501,10 +603,12 @@ class MHAssistMixin:
 
     def _assist_scheduler(self):
         """每分钟执行：先等待2分钟进行首次查询；未查询到则每1分钟重试，直到查询到；并处理MP完成监听"""
+        # 本周期内的订阅查找/删除共用一份MH订阅列表快照
+        self._mh_snapshot_begin()
         try:
             logger.debug(f"mhnotify: _assist_scheduler v{self.plugin_version} 开始执行")
             # 处理待检查
-            pending: Dict[str, dict] = self.get_data(self._ASSIST_PENDING_KEY) or {}
+            pending = self._assist_pending()
             if pending:
                 now_ts = int(time.time())
                 # 收集已到查询时间的条目（首次查询延迟）
@@ -519,6 +623,7 @@ class MHAssistMixin:
                         logger.error("mhnotify: 登录MH失败，无法查询订阅进度")
                     else:
                         for sid, info in list(matured_items.items()):
+                            pending.checkpoint()
                             mh_uuid = info.get("mh_uuid")
                             title = info.get("title") or ""
                             logger.info(f"mhnotify: 到期处理 sid={sid} mh_uuid={mh_uuid} type={info.get('type')} douban_id={info.get('douban_id')}")
@@ -532,13 +637,11 @@ class MHAssistMixin:
                                 if attempts >= 5:
                                     logger.warning(f"mhnotify: 订阅 {mh_uuid} 未在MH列表中找到，已重试{attempts}次，移除记录")
                                     pending.pop(sid, None)
-                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                     continue
                                 else:
                                     retry_mins = max(1, int(self._assist_retry_interval_seconds / 60))
                                     logger.warning(f"mhnotify: 未在MH列表中找到订阅 {mh_uuid}，第{attempts}次重试，{retry_mins}分钟后继续")
                                     pending[str(sid)] = info
-                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                     continue
                             # 检查 execution_status：running 表示 MH 仍在查找中，需等待后重试
                             exec_status = (target.get("execution_status") or "").lower()
@@ -546,7 +649,6 @@ class MHAssistMixin:
                                 retry_delay = 120  # 2分钟后再检查
                                 info["min_check_at"] = now_ts + retry_delay
                                 pending[str(sid)] = info
-                                self.save_data(self._ASSIST_PENDING_KEY, pending)
                                 logger.info(f"mhnotify: 订阅 {mh_uuid} 仍在查找中(running)，{retry_delay//60}分钟后再检查")
                                 continue
                             mtype, saved, expected = self._compute_progress(target)
@@ -562,14 +664,7 @@ class MHAssistMixin:
                                     del_token = None
                                 if del_token and mh_uuid:
                                     try:
-                                        lst2 = self._mh_list_subscriptions(del_token)
-                                        subs2 = (lst2.get("data") or {}).get("subscriptions") or []
-                                        rec2 = None
-                                        for r in subs2:
-                                            uid2 = r.get("uuid") or (r.get("task") or {}).get("uuid")
-                                            if uid2 == mh_uuid:
-                                                rec2 = r
-                                                break
+                                        rec2 = self._mh_find_subscription_by_uuid(del_token, mh_uuid)
                                         tmdb_id = None
                                         if rec2:
                                             params2 = rec2.get("params") or {}
@@ -603,7 +698,7 @@ class MHAssistMixin:
                                         if remaining_seasons:
                                             # 更新 MH 订阅季集合为剩余季
                                             try:
-                                                base_params = (rec2 or {}).get("params") or {}
+                                                base_params = dict((rec2 or {}).get("params") or {})
                                                 base_params["selected_seasons"] = remaining_seasons
                                                 base_params["episode_ranges"] = {str(s): {"min_episode": None, "max_episode": None, "exclude_episodes": [], "exclude_text": ""} for s in remaining_seasons}
                                                 self._mh_update_subscription(del_token, mh_uuid, base_params)
@@ -621,46 +716,20 @@ class MHAssistMixin:
                                         except Exception:
                                             logger.warning("mhnotify: 处理剩余季时异常且删除失败", exc_info=True)
                                 pending.pop(sid, None)
-                                self.save_data(self._ASSIST_PENDING_KEY, pending)
                                 continue
                             if mtype == 'movie':
                                 if expected <= 1 and saved >= 1:
                                     # 完成：直接完成MP订阅，MH删除交由 SubscribeComplete 事件处理
                                     self._finish_mp_subscribe(subscribe)
                                     pending.pop(sid, None)
-                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                 else:
                                     if self._cloud_download_assist:
-                                        try:
-                                            logger.info(f"mhnotify: 进入云下载辅助分支 sid={sid} mh_uuid={mh_uuid}")
-                                            qp_dict = self._get_quality_priority(token)
-                                        except Exception:
-                                            qp_dict = {}
-                                        douban_id = info.get("douban_id")
-                                        # 若缺少豆瓣ID，先按标题搜索回退
-                                        search_douban_id = douban_id
-                                        if not search_douban_id:
-                                            try:
-                                                title_src = subscribe.name or mediainfo_dict.get("title") or ""
-                                                search_list = self._btl_get_video_list(title_src)
-                                                pick = None
-                                                for rec in search_list or []:
-                                                    r_type = int(rec.get("type") or 0)
-                                                    r_title = str(rec.get("title") or "").strip()
-                                                    if r_type == 1 and r_title and r_title == title_src:
-                                                        pick = rec
-                                                        break
-                                                if pick:
-                                                    search_douban_id = pick.get("doub_id") or pick.get("douban_id") or pick.get("id") or pick.get("db_id")
-                                                    logger.info(f"mhnotify: BTL getVideoList 匹配到豆瓣ID={search_douban_id}")
-                                                else:
-                                                    logger.info("mhnotify: BTL getVideoList 未匹配到电影条目或标题不一致")
-                                            except Exception:
-                                                search_douban_id = None
+                                        logger.info(f"mhnotify: 进入云下载辅助分支 sid={sid} mh_uuid={mh_uuid}")
+                                        title_src = subscribe.name or mediainfo_dict.get("title") or ""
+                                        # 质量优先级与 BTL 搜索/详情并行获取并排序
+                                        search_douban_id, details, candidates = self._resolve_btl_candidates(
+                                            token, info.get("douban_id"), title_src)
                                         if search_douban_id:
-                                            details = self._btl_get_video_detail(token, search_douban_id)
-                                            logger.info(f"mhnotify: 云下载辅助：质量优先级已获取 keys={list(qp_dict.keys()) if isinstance(qp_dict, dict) else []}")
-                                            logger.info(f"mhnotify: 云下载辅助：BTL资源条数={len(details) if isinstance(details, list) else 0}")
                                             if not details:
                                                 logger.info("mhnotify: BTL详情查询失败或无资源，恢复订阅启用")
                                                 # with SessionFactory() as db:
@@ -672,15 +741,13 @@ class MHAssistMixin:
                                                         # 恢复订阅状态为 R
                                                         SubscribeOper(db=db).update(subscribe.id, {"state": "R"})
                                                 pending.pop(sid, None)
-                                                self.save_data(self._ASSIST_PENDING_KEY, pending)
                                             else:
-                                                candidates = self._select_btl_resources_by_quality_priority(details, qp_dict)
                                                 logger.info(f"mhnotify: 云下载辅助：候选条数（排序后）={len(candidates)}")
                                                 started = self._try_cloud_download_with_candidates(candidates, sid, mh_uuid)
                                                 if started:
                                                     logger.info(f"mhnotify: 已触发云下载（优先级首选），等待下载完成后回调处理订阅 sid={sid}")
                                                     # 为后续取消事件提供映射
-                                                    watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                                                    watch = self._assist_watch()
                                                     try:
                                                         tmdb_id = getattr(subscribe, 'tmdbid', None)
                                                         sub_type = (getattr(subscribe, 'type', '') or '').lower()
@@ -688,33 +755,27 @@ class MHAssistMixin:
                                                         tmdb_id = None
                                                         sub_type = ''
                                                     watch[str(sid)] = {"mh_uuid": mh_uuid, "tmdb_id": tmdb_id, "type": sub_type or 'movie'}
-                                                    self.save_data(self._ASSIST_WATCH_KEY, watch)
                                                     pending.pop(sid, None)
-                                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                                 else:
                                                     logger.info("mhnotify: 云下载辅助未匹配到可用资源或全部失败，恢复订阅启用")
                                                     with SessionFactory() as db:
                                                         SubscribeOper(db=db).update(subscribe.id, {"state": "R"})
                                                     # 恢复启用后，加入watch映射，用于取消事件快速删除MH
-                                                    watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                                                    watch = self._assist_watch()
                                                     watch[str(sid)] = {"mh_uuid": mh_uuid}
-                                                    self.save_data(self._ASSIST_WATCH_KEY, watch)
                                                     pending.pop(sid, None)
-                                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                         else:
                                             logger.info("mhnotify: 云下载辅助跳过：缺少豆瓣ID")
                                             with SessionFactory() as db:
                                                 SubscribeOper(db=db).update(subscribe.id, {"state": "R"})
                                             # 加入watch映射，用于取消事件快速删除MH
-                                            watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                                            watch = self._assist_watch()
                                             watch[str(sid)] = {"mh_uuid": mh_uuid}
-                                            self.save_data(self._ASSIST_WATCH_KEY, watch)
                                             pending.pop(sid, None)
-                                            self.save_data(self._ASSIST_PENDING_KEY, pending)
                                     else:
                                         with SessionFactory() as db:
                                             SubscribeOper(db=db).update(subscribe.id, {"state": "R"})
-                                        watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                                        watch = self._assist_watch()
                                         try:
                                             tmdb_id = getattr(subscribe, 'tmdbid', None)
                                             sub_type = (getattr(subscribe, 'type', '') or '').lower()
@@ -722,16 +783,13 @@ class MHAssistMixin:
                                             tmdb_id = None
                                             sub_type = ''
                                         watch[str(sid)] = {"mh_uuid": mh_uuid, "tmdb_id": tmdb_id, "type": sub_type or 'movie'}
-                                        self.save_data(self._ASSIST_WATCH_KEY, watch)
                                         pending.pop(sid, None)
-                                        self.save_data(self._ASSIST_PENDING_KEY, pending)
                             else:
                                 # TV
                                 if expected > 0 and saved >= expected:
                                     # 完成：直接完成MP订阅，MH删除交由 SubscribeComplete 事件处理
                                     self._finish_mp_subscribe(subscribe)
                                     pending.pop(sid, None)
-                                    self.save_data(self._ASSIST_PENDING_KEY, pending)
                                 else:
                                     # 未完成：不删除MH，启用MP订阅，并加入watch等待MP完成/取消后删除MH
                                     # 注意：对于多季订阅，如果部分季已完成，不应在此处标记整个订阅为完成
@@ -767,12 +825,11 @@ class MHAssistMixin:
                                         # 仅完成当前MP订阅
                                         self._finish_mp_subscribe(subscribe)
                                         pending.pop(sid, None)
-                                        self.save_data(self._ASSIST_PENDING_KEY, pending)
                                     else:
                                         # 确实未完成
                                         with SessionFactory() as db:
                                             SubscribeOper(db=db).update(subscribe.id, {"state": "R"})
-                                        watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+                                        watch = self._assist_watch()
                                         try:
                                             tmdb_id = getattr(subscribe, 'tmdbid', None)
                                             sub_type = (getattr(subscribe, 'type', '') or '').lower()
@@ -780,13 +837,12 @@ class MHAssistMixin:
                                             tmdb_id = None
                                             sub_type = ''
                                         watch[str(sid)] = {"mh_uuid": mh_uuid, "tmdb_id": tmdb_id, "type": sub_type or 'movie'}
-                                        self.save_data(self._ASSIST_WATCH_KEY, watch)
                                         pending.pop(sid, None)
-                                        self.save_data(self._ASSIST_PENDING_KEY, pending)
             # 监听MP完成后删除MH（可选）
-            watch: Dict[str, dict] = self.get_data(self._ASSIST_WATCH_KEY) or {}
+            watch = self._assist_watch()
             if watch and self._mh_assist_auto_delete:
-                for sid, info in list(watch.items()):
+                for sid, info in watch.items():
+                    watch.checkpoint()
                     with SessionFactory() as db:
                         sub = SubscribeOper(db=db).get(int(sid))
                     if not sub:
@@ -798,14 +854,7 @@ class MHAssistMixin:
                             del_token = None
                         if mh_uuid and del_token:
                             try:
-                                lst2 = self._mh_list_subscriptions(del_token)
-                                subs2 = (lst2.get("data") or {}).get("subscriptions") or []
-                                rec2 = None
-                                for r in subs2:
-                                    uid2 = r.get("uuid") or (r.get("task") or {}).get("uuid")
-                                    if uid2 == mh_uuid:
-                                        rec2 = r
-                                        break
+                                rec2 = self._mh_find_subscription_by_uuid(del_token, mh_uuid)
                                 tmdb_id = None
                                 if rec2:
                                     params2 = rec2.get("params") or {}
@@ -838,7 +887,7 @@ class MHAssistMixin:
                                         remaining_seasons = []
                                 if remaining_seasons:
                                     try:
-                                        base_params = (rec2 or {}).get("params") or {}
+                                        base_params = dict((rec2 or {}).get("params") or {})
                                         base_params["selected_seasons"] = remaining_seasons
                                         base_params["episode_ranges"] = {str(s): {"min_episode": None, "max_episode": None, "exclude_episodes": [], "exclude_text": ""} for s in remaining_seasons}
                                         self._mh_update_subscription(del_token, mh_uuid, base_params)
@@ -856,12 +905,15 @@ class MHAssistMixin:
                                     logger.warning("mhnotify: watch 分支处理剩余季时异常且删除失败", exc_info=True)
                         # 清理当前监听项
                         watch.pop(sid, None)
-                        self.save_data(self._ASSIST_WATCH_KEY, watch)
         except Exception as e:
             logger.error(f"mhnotify: 助手调度异常: {e}")
+        finally:
+            self._mh_snapshot_end()
+            # 本周期的 pending/watch 变更一次性落盘
+            self._assist_commit()
 
     def _sync_forwarder_keywords(self, subscribe_name: str, remove: bool = False) -> None:
-        """同步订阅名称到/从MH TG转发监听白名单/黑名单"""
+        """同步订阅名称到/从MH TG转发监听白名单/黑名单（加入同步队列，短时间内的变更按监听配置合并写入）"""
         if not subscribe_name:
             return
         _has_whitelist = self._mh_forwarder_whitelist_enabled and self._mh_forwarder_whitelist_listeners
@@ -869,36 +921,15 @@ class MHAssistMixin:
         if not _has_whitelist and not _has_blacklist:
             return
         try:
-            token = self._mh_login()
-            if not token:
-                logger.warning("mhnotify: 同步转发关键词失败：MH登录失败")
-                return
-            
-            # 优化：一次性获取所有监听配置，复用到循环中
-            listeners_list = self._mh_get_listeners(token)
-            if not listeners_list:
-                logger.warning("mhnotify: 未获取到转发监听列表，同步取消")
-                return
-
-            # 汇总去重所有需要处理的监听器 ID
-            all_lids = set(self._mh_forwarder_whitelist_listeners or []) | set(self._mh_forwarder_blacklist_listeners or [])
-            
+            queue = self._mh_keyword_queue()
+            if _has_whitelist:
+                for lid in self._mh_forwarder_whitelist_listeners:
+                    queue.enqueue(lid, "keywords", subscribe_name, remove)
+            if _has_blacklist:
+                for lid in self._mh_forwarder_blacklist_listeners:
+                    queue.enqueue(lid, "blacklist_keywords", subscribe_name, remove)
             action = "移除" if remove else "添加"
-            for lid in all_lids:
-                # 构造合并更新字典
-                fields_map = {}
-                if self._mh_forwarder_whitelist_enabled and lid in self._mh_forwarder_whitelist_listeners:
-                    fields_map["keywords"] = subscribe_name
-                if self._mh_forwarder_blacklist_enabled and lid in self._mh_forwarder_blacklist_listeners:
-                    fields_map["blacklist_keywords"] = subscribe_name
-                
-                if fields_map:
-                    # 使用合并更新方法，针对同一个 ID 只发一次 PUT 请求，且不重复拉取列表
-                    self._mh_sync_listener_keywords_optimized(
-                        token, lid, fields_map, remove, listeners_list=listeners_list
-                    )
-            
-            logger.info(f"mhnotify: [优化版] 转发关键词同步完成 '{subscribe_name}' {action} (涉及 {len(all_lids)} 个监听配置)")
+            logger.debug(f"mhnotify: 转发关键词 '{subscribe_name}' {action}已加入同步队列")
         except Exception:
             logger.warning("mhnotify: 同步转发监听关键词异常", exc_info=True)
 
@@ -934,10 +965,10 @@ class MHAssistMixin:
             
             # 从待检查队列中移除（如果存在）
             try:
-                pending = self.get_data(self._ASSIST_PENDING_KEY) or {}
+                pending = self._assist_pending()
                 if sid in pending:
                     pending.pop(sid, None)
-                    self.save_data(self._ASSIST_PENDING_KEY, pending)
+                    pending.commit()
                     logger.info(f"mhnotify: 已从待检查队列中移除订阅 {sid}")
             except Exception as e:
                 logger.warning(f"mhnotify: 从待检查队列移除失败: {e}")
@@ -1,4 +1,4 @@
-import re
+import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 from apscheduler.triggers.cron import CronTrigger
@@ -7,10 +7,13 @@ from app.plugins import _PluginBase
 from app.log import logger
 from app.db import db_query
 from app.db.models.transferhistory import TransferHistory
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from .storage import AnalyzerStorage
-from .analyzer import OrganizeAnalyzerCore
+from .fsverify import DestVerifier
+from .jobs import AnalysisJob, AnalysisJobManager
+from .storage import AnalyzerStorage, DetectorStateStore
+from .analyzer import OrganizeAnalyzerCore, AnalysisPipeline
 
 
 class OrganizeAnalyzer(_PluginBase):
@@ -18,7 +21,7 @@ class OrganizeAnalyzer(_PluginBase):
     plugin_name = "媒体整理异常分析"
     plugin_desc = "分析 MP 媒体整理历史记录，识别多文件归并/覆盖冲突、英文未识别标题、整理失败及重集等异常。"
     plugin_icon = "mdi-file-find-outline"
-    plugin_version = "1.1.6"
+    plugin_version = "1.2.5"
     plugin_author = "ListeningLTG"
     plugin_config_prefix = "organizeanalyzer_"
     plugin_order = 15
@@ -32,6 +35,7 @@ class OrganizeAnalyzer(_PluginBase):
     _notify: bool = False
     _config: dict = {}
     _storage: Optional[AnalyzerStorage] = None
+    _jobs: Optional[AnalysisJobManager] = None
 
     def init_plugin(self, config: dict = None):
         """初始化插件配置"""
@@ -42,7 +46,14 @@ class OrganizeAnalyzer(_PluginBase):
         self._cron = config.get("cron", "0 3 * * *")
         self._cron_mode = config.get("cron_mode", "incremental")
         self._notify = bool(config.get("notify", False))
-        self._storage = AnalyzerStorage(self.get_data_path())
+        # 先取消并等待正在运行的分析任务，任务确已结束后才替换其使用的存储
+        if self._jobs and not self._jobs.shutdown():
+            logger.warning(f"【{self.plugin_name}】分析任务仍在退出中，暂不替换任务管理与存储")
+        else:
+            if self._storage:
+                self._storage.close()
+            self._storage = AnalyzerStorage(self.get_data_path())
+            self._jobs = AnalysisJobManager(lambda job: self.run_analysis(mode=job.mode, job=job), self.plugin_name)
         logger.info(f"【{self.plugin_name}】初始化完成 (版本: v{self.plugin_version}, 状态: {'启用' if self._enabled else '禁用'}, 定时: {'开启' if self._cron_enabled else '关闭'}[{self._cron_mode}])")
 
     def get_state(self) -> bool:
@@ -100,8 +111,14 @@ class OrganizeAnalyzer(_PluginBase):
             return []
 
     @db_query
-    def _query_transfer_histories(self, db: Session, date_after: Optional[str] = None):
-        """查询整理历史（已优化内存：分块查询并直接转换为轻量级字典）"""
+    def _stream_transfer_histories(self, db: Session, pipeline: AnalysisPipeline, after_id: int = 0,
+                                   job: Optional[AnalysisJob] = None) -> int:
+        """流式读取整理历史：按主键水位线过滤，数据库游标分块读取，逐行直接喂入分析管道，不在内存中保留记录列表"""
+        count_query = db.query(func.count(TransferHistory.id))
+        if after_id:
+            count_query = count_query.filter(TransferHistory.id > after_id)
+        pipeline.total = count_query.scalar() or 0
+
         query = db.query(
             TransferHistory.id,
             TransferHistory.src,
@@ -116,48 +133,76 @@ class OrganizeAnalyzer(_PluginBase):
             TransferHistory.date,
             TransferHistory.files
         )
-        if date_after:
-            query = query.filter(TransferHistory.date > date_after)
-            
+        if after_id:
+            query = query.filter(TransferHistory.id > after_id)
+
         query = query.order_by(TransferHistory.id.asc()).yield_per(2000)
-        
-        records = []
+
+        rows = 0
         for row in query:
-            records.append({
-                "id": getattr(row, "id", 0),
-                "src": getattr(row, "src", "") or "",
-                "dest": getattr(row, "dest", "") or "",
-                "title": getattr(row, "title", "") or "",
-                "tmdbid": getattr(row, "tmdbid", 0) or 0,
-                "type": getattr(row, "type", "") or "",
-                "seasons": getattr(row, "seasons", "") or "",
-                "episodes": getattr(row, "episodes", "") or "",
-                "status": getattr(row, "status", True),
-                "errmsg": getattr(row, "errmsg", "") or "",
-                "date": getattr(row, "date", "") or "",
-                "files": getattr(row, "files", []) or [],
-            })
-        return records
-
-    def run_analysis(self, mode: str = "incremental") -> Dict[str, Any]:
+            pipeline.feed(row)
+            rows += 1
+            if job and not rows % 1000:
+                job.check_cancelled()
+        return rows
+
+    def run_analysis(self, mode: str = "incremental", job: Optional[AnalysisJob] = None) -> Dict[str, Any]:
         """
         执行整理异常分析
         :param mode: 'full' 全量分析, 'incremental' 增量分析
+        :param job: 所属后台任务，用于上报进度与响应取消
         """
         if not self._storage:
             self._storage = AnalyzerStorage(self.get_data_path())
+        # 任务全程使用启动时的存储句柄，插件重载期间不会读到被替换或置空的 self._storage
+        storage = self._storage
+        cancel_check = job.check_cancelled if job else None
 
-        current_data = self._storage.load_data()
-        date_after = None
+        state = DetectorStateStore(self.get_data_path())
+        after_id = 0
         if mode == "incremental":
-            date_after = current_data.get("last_run_time") or None
-
-        logger.info(f"【{self.plugin_name}】🚀 开始执行 [{mode}] 分析... (检索过滤时间: {date_after or '全量扫描'})")
-        histories = self._query_transfer_histories(date_after=date_after)
-        logger.info(f"【{self.plugin_name}】从数据库读取到了 {len(histories)} 条 TransferHistory 历史记录")
-
-        exceptions, max_id = OrganizeAnalyzerCore.analyze(histories, self._config)
-        result_data = self._storage.update_analysis_results(exceptions, mode=mode, max_history_id=max_id)
+            if state.initialized:
+                after_id = storage.get_meta().get("last_analyzed_id", 0)
+            else:
+                # 升级后或状态库丢失：聚合检测状态不含历史记录，先全量重建一次，否则新旧记录间的冲突无法发现
+                logger.info(f"【{self.plugin_name}】聚合检测状态尚未初始化，本次增量分析改为全量重建")
+                mode = "full"
+
+        verifier = DestVerifier(
+            self.get_data_path() / "dir_cache.db", cancel_check=cancel_check
+        ) if self._config.get("detect_missing_dest") else None
+        try:
+            logger.info(f"【{self.plugin_name}】🚀 开始执行 [{mode}] 分析... (检索起始 ID: {after_id or '全量扫描'})")
+            pipeline = OrganizeAnalyzerCore.create_pipeline(
+                self._config, state=state, verifier=verifier, cancel_check=cancel_check
+            )
+            if job:
+                job.pipeline = pipeline
+            self._stream_transfer_histories(pipeline=pipeline, after_id=after_id, job=job)
+            if job:
+                job.check_cancelled()
+            # 全量分析（或尚无水位线）时重建聚合检测状态；放在读取完成之后，取消的任务不会破坏已有状态
+            if not after_id:
+                state.reset()
+            exceptions, max_id = pipeline.finish()
+            if not after_id:
+                state.mark_initialized()
+        finally:
+            state.close()
+            if verifier:
+                verifier.close()
+        if verifier:
+            stats = verifier.stats
+            logger.info(f"【{self.plugin_name}】目标文件校验: {stats['files']} 个文件, 扫描目录 {stats['dirs_scanned']} 个, 复用缓存 {stats['dirs_cached']} 个, 目录不存在 {stats['dirs_missing']} 个")
+        logger.info(f"【{self.plugin_name}】流式分析了 {pipeline.rows} 条 TransferHistory 历史记录 (耗时 {pipeline.elapsed:.1f}s, {pipeline.rows_per_sec:.0f} 行/秒)")
+        if pipeline.stats:
+            stats = ", ".join(
+                f"{k}: 命中 {v['hits']}, CPU {v['cpu']:.2f}s, 耗时 {v['wall']:.2f}s"
+                for k, v in sorted(pipeline.stats.items(), key=lambda x: -x[1]["wall"])
+            )
+            logger.info(f"【{self.plugin_name}】各检测规则统计: {stats}")
+
+        result_data = storage.update_analysis_results(exceptions, mode=mode, max_history_id=max_id)
 
         summary = result_data.get("summary", {})
         logger.info(f"【{self.plugin_name}】✅ 分析完成！本次识别到未处理异常总数: {summary.get('total', 0)} (多文件覆盖: {summary.get('merged_files', 0)}, 英文未中文化: {summary.get('english_title', 0)}, 未识别: {summary.get('unidentified', 0)}, 失败: {summary.get('failed_status', 0)}, 重复集: {summary.get('duplicate_episode', 0)})")
@@ -165,14 +210,18 @@ class OrganizeAnalyzer(_PluginBase):
         # 消息推送
         if self._notify and summary.get("total", 0) > 0:
             logger.info(f"【{self.plugin_name}】正在触发系统消息通知...")
-            self._send_notification(summary, result_data.get("exceptions", []), mode=mode)
+            active_items, _ = storage.query_exceptions(status="active", page_size=5)
+            self._send_notification(summary, active_items, mode=mode)
 
         return result_data
 
     def run_cron_analysis(self):
         """定时任务回调"""
         logger.info(f"【{self.plugin_name}】⏰ 触发定时 [{self._cron_mode}] 巡检分析...")
-        self.run_analysis(mode=self._cron_mode)
+        job, created = self._jobs.submit(self._cron_mode, source="cron")
+        if not created:
+            logger.info(f"【{self.plugin_name}】已有分析任务 {job.id} [{job.mode}] 正在运行，本次定时分析合并到该任务")
+        job.done_event.wait()
 
     def _send_notification(self, summary: dict, exceptions: list, mode: str = "incremental"):
         """发送异常报告系统通知"""
@@ -223,6 +272,20 @@ class OrganizeAnalyzer(_PluginBase):
                 "auth": "bear",
                 "summary": "手动触发分析",
             },
+            {
+                "path": "/job",
+                "endpoint": self.api_get_job,
+                "methods": ["GET"],
+                "auth": "bear",
+                "summary": "查询分析任务进度",
+            },
+            {
+                "path": "/cancel",
+                "endpoint": self.api_cancel_job,
+                "methods": ["POST"],
+                "auth": "bear",
+                "summary": "取消分析任务",
+            },
             {
                 "path": "/ignore",
                 "endpoint": self.api_ignore_exception,
@@ -258,13 +321,12 @@ class OrganizeAnalyzer(_PluginBase):
         logger.info(f"【{self.plugin_name}】API 请求 [GET /stats]")
         if not self._storage:
             self._storage = AnalyzerStorage(self.get_data_path())
-        data = self._storage.load_data()
         return {
             "code": 0,
             "msg": "success",
             "data": {
-                "summary": data.get("summary", {}),
-                "last_run_time": data.get("last_run_time", ""),
+                "summary": self._storage.get_summary(),
+                "last_run_time": self._storage.get_meta().get("last_run_time", ""),
                 "cron_enabled": self._cron_enabled,
                 "cron": self._cron,
                 "cron_mode": self._cron_mode,
@@ -276,44 +338,17 @@ class OrganizeAnalyzer(_PluginBase):
         logger.info(f"【{self.plugin_name}】API 请求 [GET /exceptions] (status={status}, type={type_filter}, kw={keyword}, page={page}, page_size={page_size}, sort_by={sort_by}, sort_order={sort_order})")
         if not self._storage:
             self._storage = AnalyzerStorage(self.get_data_path())
-        data = self._storage.load_data()
-        all_items = data.get("exceptions", [])
-
-        filtered = []
-        kw = (keyword or "").strip().lower()
-        for item in all_items:
-            if status != "all" and item.get("status") != status:
-                continue
-            if type_filter and item.get("type") != type_filter:
-                continue
-            if kw:
-                title = str(item.get("title") or "").lower()
-                src = str(item.get("src") or "").lower()
-                dest = str(item.get("dest") or "").lower()
-                detail = str(item.get("detail") or "").lower()
-                if kw not in title and kw not in src and kw not in dest and kw not in detail:
-                    continue
-            filtered.append(item)
-
-        # 排序支持
-        if sort_by == "file_count":
-            def _get_fc(item):
-                if "file_count" in item and item["file_count"] is not None:
-                    return int(item["file_count"])
-                src = str(item.get("src") or "")
-                detail = str(item.get("detail") or "")
-                m = re.search(r"(\d+)\s*个源文件", src) or re.search(r"(\d+)\s*个源文件", detail) or re.search(r"(\d+)\s*个不同的目标文件", detail)
-                return int(m.group(1)) if m else 1
-
-            filtered.sort(key=_get_fc, reverse=(sort_order == "desc"))
-        elif sort_by == "date":
-            filtered.sort(key=lambda x: str(x.get("date") or ""), reverse=(sort_order == "desc"))
-
-        total = len(filtered)
         page = max(1, int(page))
         page_size = max(1, min(int(page_size), 200))
-        start = (page - 1) * page_size
-        paged = filtered[start: start + page_size]
+        paged, total = self._storage.query_exceptions(
+            status=status,
+            type_filter=type_filter,
+            keyword=keyword,
+            page=page,
+            page_size=page_size,
+            sort_by=sort_by,
+            sort_order=sort_order,
+        )
 
         return {
             "code": 0,
@@ -325,22 +360,43 @@ class OrganizeAnalyzer(_PluginBase):
             "total_pages": (total + page_size - 1) // page_size if total > 0 else 1
         }
 
-    async def api_run_analyze(self, mode: str = "incremental") -> dict:
-        logger.info(f"【{self.plugin_name}】API 请求 [POST /analyze] (mode={mode})")
-        result = self.run_analysis(mode=mode)
+    async def api_run_analyze(self, mode: str = "incremental", wait: bool = True) -> dict:
+        logger.info(f"【{self.plugin_name}】API 请求 [POST /analyze] (mode={mode}, wait={wait})")
+        job, created = self._jobs.submit(mode, source="manual")
+        if not created:
+            logger.info(f"【{self.plugin_name}】已有分析任务 {job.id} [{job.mode}] 正在运行，本次请求合并到该任务")
+        if not wait:
+            return {"code": 0, "msg": "分析任务已提交" if created else "已有分析任务正在运行", "job_id": job.id, "data": job.to_dict()}
+        # 在线程中等待任务结束，不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, job.done_event.wait)
+        if job.status != "done":
+            msg = "分析任务已取消" if job.status == "cancelled" else f"分析失败: {job.error}"
+            return {"code": 500, "msg": msg, "job_id": job.id, "data": {}}
         return {
             "code": 0,
-            "msg": f"[{'全量' if mode=='full' else '增量'}]分析完成",
-            "data": result.get("summary", {})
+            "msg": f"[{'全量' if job.mode == 'full' else '增量'}]分析完成",
+            "job_id": job.id,
+            "data": job.result.get("summary", {})
         }
 
-    async def api_ignore_exception(self, key: str = "") -> dict:
-        logger.info(f"【{self.plugin_name}】API 请求 [POST /ignore] (key={key})")
+    async def api_get_job(self, job_id: str = "") -> dict:
+        job = self._jobs.get(job_id)
+        if not job:
+            return {"code": 404, "msg": "未找到分析任务", "data": {}}
+        return {"code": 0, "msg": "success", "data": job.to_dict()}
+
+    async def api_cancel_job(self, job_id: str = "") -> dict:
+        logger.info(f"【{self.plugin_name}】API 请求 [POST /cancel] (job_id={job_id})")
+        ok = self._jobs.cancel(job_id)
+        return {"code": 0 if ok else 404, "msg": "已请求取消分析任务" if ok else "没有正在运行的分析任务"}
+
+    async def api_ignore_exception(self, key: str = "", ignore: bool = True) -> dict:
+        logger.info(f"【{self.plugin_name}】API 请求 [POST /ignore] (key={key}, ignore={ignore})")
         if not key:
             return {"code": 400, "msg": "key 参数不能为空"}
         if not self._storage:
             self._storage = AnalyzerStorage(self.get_data_path())
-        ok = self._storage.ignore_exception(key)
+        ok = self._storage.set_ignored(key, bool(ignore))
         return {"code": 0 if ok else 500, "msg": "操作成功" if ok else "保存失败"}
 
     async def api_clear_ignored(self) -> dict:
@@ -390,4 +446,9 @@ class OrganizeAnalyzer(_PluginBase):
     def stop_service(self):
         """停止插件"""
         logger.info(f"【{self.plugin_name}】停止插件后台服务")
-        pass
+        if self._jobs and not self._jobs.shutdown():
+            logger.warning(f"【{self.plugin_name}】分析任务未能在超时内退出，保留存储连接供其收尾")
+            return
+        if self._storage:
+            self._storage.close()
+            self._storage = None
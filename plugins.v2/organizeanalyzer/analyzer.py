@@ -1,7 +1,578 @@
 import os
 import re
+import time
 import hashlib
-from typing import Dict, Any, List, Optional, Tuple, Set
+from typing import Callable, Dict, Any, List, Optional, Tuple, Set, Iterable, Type, Pattern
+
+from .fsverify import DestVerifier
+
+_CHINESE_RE = re.compile(r"[\u4e00-\u9fff]")
+_DIGITS_RE = re.compile(r"\d+")
+# 目标文件校验的批大小：攒满后按目录分组并发校验
+_MISSING_BATCH_SIZE = 5000
+# 管道按列攒批的行数，检测规则以批为单位运行
+_BATCH_SIZE = 1000
+
+# TransferHistory 字段及其缺省值（status 为空视为成功）
+_FIELD_DEFAULTS: Dict[str, Any] = {
+    "id": 0,
+    "src": "",
+    "dest": "",
+    "title": "",
+    "tmdbid": 0,
+    "type": "",
+    "seasons": "",
+    "episodes": "",
+    "status": True,
+    "errmsg": "",
+    "date": "",
+    "files": [],
+}
+
+Columns = Dict[str, List[Any]]
+
+
+def _hash64(value: str) -> int:
+    """稳定的 64 位字符串摘要，用于压缩去重状态"""
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def _generate_key(rule_type: str, identifier: str) -> str:
+    """生成基于规则和标识符的唯一 key"""
+    raw = f"{rule_type}:{identifier}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def _merge_state(state: Any, table: str, hashes: Dict[str, Set[int]], samples: Dict[str, Dict[str, Any]]):
+    """
+    将本批次的累积状态与持久化状态合并（样本以历史最早一条为准），并写回持久化存储
+    """
+    persisted = state.load(table, list(hashes.keys()))
+    for key, (old_hashes, old_sample) in persisted.items():
+        hashes[key] |= old_hashes
+        samples[key] = old_sample
+    state.save(table, ((key, hashes[key], samples[key]) for key in hashes))
+
+
+def _trie_regex(words: List[str]) -> Optional[Pattern]:
+    """
+    将忽略路径构建为前缀树，再展开为共享前缀的正则，单次扫描即可判断是否包含任一路径
+    （保持原有的子串匹配语义；某路径是另一路径的前缀时只保留较短者）
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        if "" in node:
+            return ""
+        alts = [re.escape(ch) + build(node[ch]) for ch in sorted(node)]
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return re.compile(build(trie)) if trie else None
+
+
+class Detector:
+    """
+    检测规则基类：
+    - name 为异常类型，同时作为命中数/耗时统计的名称；
+    - config_key/default_enabled 声明启用开关；
+    - fields 声明所需字段，管道只为启用规则需要的字段组装列；
+    - feed_batch 以列数组批量检测，index 为本批未被忽略的行下标，返回本批命中数；
+    - finish 汇总输出异常（聚合类规则在此合并持久化状态）。
+    通过 register_detector 注册即可加入分析，无需修改管道。
+    """
+
+    name: str = ""
+    config_key: str = ""
+    default_enabled: bool = True
+    fields: Tuple[str, ...] = ()
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        self.config = config
+        self.context = context
+
+    @classmethod
+    def is_enabled(cls, config: Dict[str, Any]) -> bool:
+        if not cls.config_key:
+            return True
+        return bool(config.get(cls.config_key, cls.default_enabled))
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        raise NotImplementedError
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        return []
+
+
+# 已注册的检测规则，注册顺序即输出顺序
+DETECTORS: Dict[str, Type[Detector]] = {}
+
+
+def register_detector(cls: Type[Detector]) -> Type[Detector]:
+    """注册检测规则（同名覆盖，保留原有位置）"""
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+class _RowDetector(Detector):
+    """逐行类检测：命中即产出异常，按记录顺序输出"""
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        super().__init__(config, context)
+        self.results: List[Dict[str, Any]] = []
+
+    def _emit(self, cols: Columns, i: int, type_name: str, title: str, detail: str):
+        history_id = cols["id"][i]
+        self.results.append({
+            "key": _generate_key(self.name, str(history_id)),
+            "type": self.name,
+            "type_name": type_name,
+            "title": title,
+            "history_id": history_id,
+            "src": cols["src"][i],
+            "dest": cols["dest"][i],
+            "date": cols["date"][i],
+            "detail": detail,
+            "status": "active"
+        })
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        return self.results
+
+
+@register_detector
+class FailedStatusDetector(_RowDetector):
+    """整理失败"""
+
+    name = "failed_status"
+    config_key = "detect_failed_status"
+    fields = ("id", "src", "dest", "date", "title", "status", "errmsg")
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        status, errmsg, titles = cols["status"], cols["errmsg"], cols["title"]
+        hits = [i for i in index if status[i] is False or errmsg[i]]
+        for i in hits:
+            self._emit(cols, i, "整理运行失败", titles[i] or "未知标题",
+                       f"错误日志: {errmsg[i] or '转移状态为失败'}")
+        return len(hits)
+
+
+@register_detector
+class UnidentifiedDetector(_RowDetector):
+    """
+    未识别 / TMDB缺失：有有效 TMDB ID 则已识别（避免误报"未知死亡"等带"未知"的正常标题），
+    任何 TMDB ID 缺失的情况都视为未识别，因为核心就是 TMDB 匹配失败
+    """
+
+    name = "unidentified"
+    config_key = "detect_unidentified"
+    fields = ("id", "src", "dest", "date", "title", "tmdbid")
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        tmdbids, titles = cols["tmdbid"], cols["title"]
+        hits = [i for i in index if not (tmdbids[i] and int(tmdbids[i]) > 0)]
+        for i in hits:
+            self._emit(cols, i, "未识别/TMDB缺失", titles[i] or "未知",
+                       f"TMDB ID: {tmdbids[i] or '缺失'}, 整理标题: {titles[i]}")
+        return len(hits)
+
+
+@register_detector
+class EnglishTitleDetector(_RowDetector):
+    """英文/未中文化标题"""
+
+    name = "english_title"
+    config_key = "detect_english_title"
+    fields = ("id", "src", "dest", "date", "title")
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        search = _CHINESE_RE.search
+        titles = cols["title"]
+        hits = 0
+        for i in index:
+            title = titles[i].strip()
+            # 忽略纯数字或短符号
+            if title and not search(title) and not title.replace(".", "").replace("-", "").isdigit():
+                self._emit(cols, i, "英文未中文化标题", title,
+                           f"标题 [{title}] 未包含中文，可能识别降级或缺少中文别名")
+                hits += 1
+        return hits
+
+
+@register_detector
+class MergedFilesDetector(Detector):
+    """多文件归并检测：dest -> (源文件摘要集合, 首条样本)"""
+
+    name = "merged_files"
+    config_key = "detect_merged_files"
+    fields = ("id", "src", "dest", "date", "title", "files")
+    STATE_TABLE = "merged_state"
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        super().__init__(config, context)
+        self.min_merged_files = int(config.get("min_merged_files", 2))
+        self.dest_srcs: Dict[str, Set[int]] = {}
+        self.dest_sample: Dict[str, Dict[str, Any]] = {}
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        ids, srcs_col, dests, titles, dates, files_col = (
+            cols["id"], cols["src"], cols["dest"], cols["title"], cols["date"], cols["files"]
+        )
+        dest_srcs, dest_sample = self.dest_srcs, self.dest_sample
+        for i in index:
+            dest = dests[i].strip()
+            if not dest:
+                continue
+            srcs = dest_srcs.get(dest)
+            if srcs is None:
+                srcs = dest_srcs[dest] = set()
+                dest_sample[dest] = {"id": ids[i], "title": titles[i], "date": dates[i]}
+            if srcs_col[i]:
+                srcs.add(_hash64(srcs_col[i]))
+            # 累加 files 列表里的 src
+            files = files_col[i]
+            if isinstance(files, list):
+                for fitem in files:
+                    if isinstance(fitem, dict) and fitem.get("src"):
+                        srcs.add(_hash64(fitem["src"]))
+        return 0
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        if state is not None:
+            _merge_state(state, self.STATE_TABLE, self.dest_srcs, self.dest_sample)
+        exceptions = []
+        for dest, srcs in self.dest_srcs.items():
+            count = len(srcs)
+            if count < self.min_merged_files:
+                continue
+            sample = self.dest_sample[dest]
+            exceptions.append({
+                "key": _generate_key("merged_files", dest),
+                "type": "merged_files",
+                "type_name": "多文件合并覆盖",
+                "title": sample["title"] or dest,
+                "history_id": sample["id"],
+                "src": f"共有 {count} 个源文件指向此目标",
+                "dest": dest,
+                "date": sample["date"],
+                "detail": f"检测到 {count} 个源文件归并/覆盖到了同一个目标文件: {dest}",
+                "status": "active",
+                "file_count": count
+            })
+        return exceptions
+
+
+@register_detector
+class DuplicateEpisodeDetector(Detector):
+    """重复季集检测：季集 key -> (目标文件摘要集合, 首条样本)"""
+
+    name = "duplicate_episode"
+    config_key = "detect_duplicate_episode"
+    fields = ("id", "src", "dest", "date", "title", "tmdbid", "type", "seasons", "episodes")
+    STATE_TABLE = "episode_state"
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        super().__init__(config, context)
+        self.ep_dests: Dict[str, Set[int]] = {}
+        self.ep_sample: Dict[str, Dict[str, Any]] = {}
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        types, tmdbids, titles, seasons_col, episodes_col, dests = (
+            cols["type"], cols["tmdbid"], cols["title"], cols["seasons"], cols["episodes"], cols["dest"]
+        )
+        for i in index:
+            seasons, episodes = seasons_col[i], episodes_col[i]
+            # 仅对电视剧生效
+            mtype = types[i].lower() if types[i] else ""
+            if not ("tv" in mtype or "剧" in mtype or seasons or episodes):
+                continue
+            media_key = tmdbids[i] if tmdbids[i] else titles[i]
+            if not (media_key and seasons and episodes):
+                continue
+            ep_key = f"{media_key}:{seasons}:{episodes}"
+            ep_dests = self.ep_dests.get(ep_key)
+            if ep_dests is None:
+                ep_dests = self.ep_dests[ep_key] = set()
+                self.ep_sample[ep_key] = {
+                    k: cols[k][i] for k in ("id", "title", "src", "dest", "date", "seasons", "episodes")
+                }
+            if dests[i]:
+                ep_dests.add(_hash64(dests[i]))
+        return 0
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        if state is not None:
+            _merge_state(state, self.STATE_TABLE, self.ep_dests, self.ep_sample)
+        exceptions = []
+        for ep_key, dests in self.ep_dests.items():
+            # 多个不同 dest 覆盖
+            if len(dests) <= 1:
+                continue
+            sample_h = self.ep_sample[ep_key]
+            exceptions.append({
+                "key": _generate_key("duplicate_episode", ep_key),
+                "type": "duplicate_episode",
+                "type_name": "重复季集冲突",
+                "title": sample_h["title"],
+                "history_id": sample_h["id"],
+                "src": sample_h["src"],
+                "dest": sample_h["dest"],
+                "date": sample_h["date"],
+                "detail": f"季集 [{sample_h['seasons']}{sample_h['episodes']}] 被多次整理到了 {len(dests)} 个不同的目标文件",
+                "status": "active",
+                "file_count": len(dests)
+            })
+        return exceptions
+
+
+@register_detector
+class MissingDestDetector(_RowDetector):
+    """目标文件缺失/0字节：按批收集目标路径，交由 DestVerifier 按目录并发校验"""
+
+    name = "missing_dest"
+    config_key = "detect_missing_dest"
+    default_enabled = False
+    fields = ("id", "src", "dest", "date", "title")
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        super().__init__(config, context)
+        self.verifier: DestVerifier = context.get("verifier") or DestVerifier()
+        self._pending: List[Tuple[int, str, str, str, str]] = []
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        ids, titles, srcs, dests, dates = cols["id"], cols["title"], cols["src"], cols["dest"], cols["date"]
+        for i in index:
+            dest = dests[i]
+            if not dest or not (os.path.isabs(dest) or (len(dest) > 1 and dest[1] == ":")):
+                continue
+            self._pending.append((ids[i], titles[i], srcs[i], dest, dates[i]))
+        if len(self._pending) >= _MISSING_BATCH_SIZE:
+            return self._flush()
+        return 0
+
+    def _flush(self) -> int:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            sizes = self.verifier.verify(item[3] for item in batch)
+        except Exception:
+            # 任务已取消时向上抛出，其余校验错误忽略本批
+            self.verifier.check_cancelled()
+            return 0
+        hits = 0
+        # 按记录顺序输出，与逐行检测时一致
+        for history_id, title, src, dest, date in batch:
+            size = sizes.get(dest)
+            if size is None:
+                key_type, type_name, detail = "missing_dest", "目标文件缺失", f"目标路径物理文件不存在: {dest}"
+            elif size == 0:
+                key_type, type_name, detail = "missing_dest_zero", "目标文件0字节", f"目标路径物理文件大小为 0 字节: {dest}"
+            else:
+                continue
+            self.results.append({
+                "key": _generate_key(key_type, str(history_id)),
+                "type": "missing_dest",
+                "type_name": type_name,
+                "title": title,
+                "history_id": history_id,
+                "src": src,
+                "dest": dest,
+                "date": date,
+                "detail": detail,
+                "status": "active"
+            })
+            hits += 1
+        return hits
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        self._flush()
+        return self.results
+
+
+@register_detector
+class InvalidEpisodeDetector(Detector):
+    """
+    离群集数检测：收集每个媒体出现过的集数，仅缓存超阈值的候选记录，结束时检查连续性
+    """
+
+    name = "invalid_episode"
+    config_key = "detect_invalid_episode"
+    default_enabled = False
+    fields = ("id", "src", "dest", "date", "title", "tmdbid", "type", "episodes")
+
+    def __init__(self, config: Dict[str, Any], context: Dict[str, Any]):
+        super().__init__(config, context)
+        self.threshold = int(config.get("invalid_episode_threshold", 500))
+        self.media_episodes: Dict[str, Set[int]] = {}
+        self.candidates: List[Tuple[str, List[int], Dict[str, Any]]] = []
+
+    def feed_batch(self, cols: Columns, index: List[int]) -> int:
+        types, dests, srcs, tmdbids, titles, episodes_col = (
+            cols["type"], cols["dest"], cols["src"], cols["tmdbid"], cols["title"], cols["episodes"]
+        )
+        findall = _DIGITS_RE.findall
+        for i in index:
+            mtype = str(types[i] or "").lower()
+            dest = str(dests[i] or "").lower()
+            src = str(srcs[i] or "").lower()
+            if "movie" in mtype or "电影" in mtype or "/电影/" in dest or "/电影/" in src:
+                continue
+            media_key = tmdbids[i] if tmdbids[i] else titles[i]
+            ep_nums = [int(n) for n in findall(episodes_col[i] or "")]
+            if media_key:
+                self.media_episodes.setdefault(media_key, set()).update(ep_nums)
+            large = [n for n in ep_nums if n > self.threshold]
+            if large:
+                self.candidates.append((media_key, large, {
+                    k: cols[k][i] for k in ("id", "title", "src", "dest", "date", "episodes")
+                }))
+        return 0
+
+    def finish(self, state: Optional[Any] = None) -> List[Dict[str, Any]]:
+        exceptions = []
+        for media_key, large, r in self.candidates:
+            # 检查连续性：本次扫描中是否有 n-1 或 n+1 的集数存在
+            all_eps = self.media_episodes.get(media_key, set())
+            if all((n - 1) in all_eps or (n + 1) in all_eps for n in large):
+                continue
+            exceptions.append({
+                "key": _generate_key("invalid_episode", str(r["id"])),
+                "type": "invalid_episode",
+                "type_name": "离群集数异常",
+                "title": r["title"],
+                "history_id": r["id"],
+                "src": r["src"],
+                "dest": r["dest"],
+                "date": r["date"],
+                "detail": f"解析集数数值过大 [{r['episodes']}] (超阈值 {self.threshold}) 且无前后连续集数，疑似误提取了分辨率/日期",
+                "status": "active"
+            })
+        return exceptions
+
+
+class AnalysisPipeline:
+    """
+    单遍流式分析管道：逐行喂入 TransferHistory 记录，按列攒批后交给已启用的检测规则批量处理，
+    逐行类检测即时产出异常，聚合类检测只保留按 key 去重后的紧凑状态，
+    内存占用与不同 key 的数量相关，而与记录总行数无关。
+    """
+
+    def __init__(self, config: Dict[str, Any], state: Optional[Any] = None, verifier: Optional[DestVerifier] = None,
+                 batch_size: int = _BATCH_SIZE, cancel_check: Optional[Callable[[], None]] = None):
+        # 聚合类检测的持久化状态（DetectorStateStore），为空时仅分析本批次
+        self.state = state
+        # 取消检查回调：汇总阶段在各规则之间调用，任务已取消时抛出异常
+        self._cancel_check = cancel_check
+        self.batch_size = max(1, int(batch_size))
+
+        # 忽略路径白名单：前缀树正则，单次扫描匹配全部路径
+        ignore_paths_raw = config.get("ignore_paths", "")
+        self.ignore_paths = [p.strip() for p in ignore_paths_raw.split(",") if p.strip()]
+        self._ignore_re = _trie_regex(self.ignore_paths)
+
+        context = {"verifier": verifier}
+        self.detectors: List[Detector] = [cls(config, context) for cls in DETECTORS.values() if cls.is_enabled(config)]
+
+        # 只读取启用规则声明的字段
+        fields = {"id", "src", "dest"}
+        for detector in self.detectors:
+            fields.update(detector.fields)
+        self._fields = tuple(fields)
+        self._cols: Columns = {f: [] for f in self._fields}
+
+        # 各规则命中数、CPU 耗时与墙钟耗时，预先建好键，进度接口跨线程读取时字典大小不变
+        self.stats: Dict[str, Dict[str, Any]] = {
+            name: {"hits": 0, "cpu": 0.0, "wall": 0.0}
+            for name in ["ignore_paths"] + [d.name for d in self.detectors]
+        }
+
+        self.max_id = 0
+        self.rows = 0
+        # 预估待分析行数（由调用方设置，用于进度与 ETA）
+        self.total = 0
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """各检测规则累计耗时（秒）"""
+        return {name: s["wall"] for name, s in self.stats.items()}
+
+    def feed(self, h: Any):
+        """喂入一条历史记录（ORM 行或字典）"""
+        if hasattr(h, "id"):
+            get = lambda k: getattr(h, k, None)  # noqa: E731
+        else:
+            get = h.get
+        cols = self._cols
+        for f in self._fields:
+            v = get(f)
+            if f == "status":
+                cols[f].append(True if v is None else v)
+            else:
+                cols[f].append(v or _FIELD_DEFAULTS[f])
+        self.rows += 1
+        history_id = cols["id"][-1]
+        if history_id > self.max_id:
+            self.max_id = history_id
+        if len(cols["id"]) >= self.batch_size:
+            self._run_batch()
+
+    def feed_many(self, histories: Iterable[Any]):
+        for h in histories:
+            self.feed(h)
+
+    def _measure(self, name: str, func, *args):
+        stat = self.stats[name]
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return func(*args)
+        finally:
+            stat["cpu"] += time.thread_time() - cpu
+            stat["wall"] += time.perf_counter() - wall
+
+    def _filter_ignored(self, cols: Columns) -> List[int]:
+        """返回本批未命中忽略路径的行下标"""
+        n = len(cols["id"])
+        if not self._ignore_re:
+            return list(range(n))
+        search = self._ignore_re.search
+        srcs, dests = cols["src"], cols["dest"]
+        index = [i for i in range(n) if not (search(srcs[i]) or search(dests[i]))]
+        self.stats["ignore_paths"]["hits"] += n - len(index)
+        return index
+
+    def _run_batch(self):
+        cols = self._cols
+        if not cols["id"]:
+            return
+        self._cols = {f: [] for f in self._fields}
+        index = self._measure("ignore_paths", self._filter_ignored, cols)
+        for detector in self.detectors:
+            self.stats[detector.name]["hits"] += self._measure(detector.name, detector.feed_batch, cols, index)
+
+    def finish(self) -> Tuple[List[Dict[str, Any]], int]:
+        """结束喂入，按注册顺序汇总各规则结果，返回 (异常对象列表, 本次最高 history ID)"""
+        self._run_batch()
+        exceptions: List[Dict[str, Any]] = []
+        for detector in self.detectors:
+            if self._cancel_check:
+                self._cancel_check()
+            results = self._measure(detector.name, detector.finish, self.state)
+            self.stats[detector.name]["hits"] = len(results)
+            exceptions.extend(results)
+        self.elapsed = time.perf_counter() - self._started
+        return exceptions, self.max_id
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = self.elapsed or (time.perf_counter() - self._started)
+        return self.rows / elapsed if elapsed > 0 else 0.0
 
 
 class OrganizeAnalyzerCore:
@@ -9,330 +580,31 @@ class OrganizeAnalyzerCore:
     整理异常分析核心逻辑引擎
     """
 
-    @staticmethod
-    def _generate_key(rule_type: str, identifier: str) -> str:
-        """生成基于规则和标识符的唯一 key"""
-        raw = f"{rule_type}:{identifier}"
-        return hashlib.md5(raw.encode("utf-8")).hexdigest()
+    _generate_key = staticmethod(_generate_key)
+
+    @classmethod
+    def create_pipeline(
+        cls,
+        config: Dict[str, Any],
+        state: Optional[Any] = None,
+        verifier: Optional[DestVerifier] = None,
+        cancel_check: Optional[Callable[[], None]] = None,
+    ) -> AnalysisPipeline:
+        """创建流式分析管道，传入 state 时聚合类检测会合并历史批次的状态，传入 verifier 时复用其目录缓存"""
+        return AnalysisPipeline(config, state=state, verifier=verifier, cancel_check=cancel_check)
 
     @classmethod
     def analyze(
         cls,
-        histories: List[Any],
+        histories: Iterable[Any],
         config: Dict[str, Any],
     ) -> Tuple[List[Dict[str, Any]], int]:
         """
         根据配置检测历史记录中的异常
-        :param histories: TransferHistory ORM 对象或字典列表
+        :param histories: TransferHistory ORM 对象或字典的可迭代对象（可为数据库游标）
         :param config: 插件配置选项
         :return: (异常对象列表, 本次最高 history ID)
         """
-        exceptions: List[Dict[str, Any]] = []
-        max_id = 0
-
-        # 配置开关
-        min_merged_files = int(config.get("min_merged_files", 2))
-        detect_merged = bool(config.get("detect_merged_files", True))
-        detect_english = bool(config.get("detect_english_title", True))
-        detect_unidentified = bool(config.get("detect_unidentified", True))
-        detect_failed = bool(config.get("detect_failed_status", True))
-        detect_duplicate = bool(config.get("detect_duplicate_episode", True))
-        detect_missing = bool(config.get("detect_missing_dest", False))
-        detect_invalid_ep = bool(config.get("detect_invalid_episode", False))
-
-        # 忽略路径白名单
-        ignore_paths_raw = config.get("ignore_paths", "")
-        ignore_paths = [p.strip() for p in ignore_paths_raw.split(",") if p.strip()]
-
-        # 预处理 history 数据字典，加速归并分组
-        records = []
-        for h in histories:
-            if hasattr(h, "id"):
-                hid = getattr(h, "id", 0)
-                src = getattr(h, "src", "") or ""
-                dest = getattr(h, "dest", "") or ""
-                title = getattr(h, "title", "") or ""
-                tmdbid = getattr(h, "tmdbid", 0) or 0
-                mtype = getattr(h, "type", "") or ""
-                seasons = getattr(h, "seasons", "") or ""
-                episodes = getattr(h, "episodes", "") or ""
-                status = getattr(h, "status", True)
-                errmsg = getattr(h, "errmsg", "") or ""
-                date = getattr(h, "date", "") or ""
-                files = getattr(h, "files", []) or []
-            else:
-                hid = h.get("id", 0)
-                src = h.get("src", "") or ""
-                dest = h.get("dest", "") or ""
-                title = h.get("title", "") or ""
-                tmdbid = h.get("tmdbid", 0) or 0
-                mtype = h.get("type", "") or ""
-                seasons = h.get("seasons", "") or ""
-                episodes = h.get("episodes", "") or ""
-                status = h.get("status", True)
-                errmsg = h.get("errmsg", "") or ""
-                date = h.get("date", "") or ""
-                files = h.get("files", []) or []
-
-            if hid > max_id:
-                max_id = hid
-
-            # 白名单路径过滤
-            if any(p in src or p in dest for p in ignore_paths):
-                continue
-
-            records.append({
-                "id": hid,
-                "src": src,
-                "dest": dest,
-                "title": title,
-                "tmdbid": tmdbid,
-                "type": mtype,
-                "seasons": seasons,
-                "episodes": episodes,
-                "status": status,
-                "errmsg": errmsg,
-                "date": date,
-                "files": files,
-            })
-
-        # 1. 检测整理失败 (detect_failed_status)
-        if detect_failed:
-            for r in records:
-                if r["status"] is False or r["errmsg"]:
-                    key = cls._generate_key("failed_status", str(r["id"]))
-                    exceptions.append({
-                        "key": key,
-                        "type": "failed_status",
-                        "type_name": "整理运行失败",
-                        "title": r["title"] or "未知标题",
-                        "history_id": r["id"],
-                        "src": r["src"],
-                        "dest": r["dest"],
-                        "date": r["date"],
-                        "detail": f"错误日志: {r['errmsg'] or '转移状态为失败'}",
-                        "status": "active"
-                    })
-
-        # 2. 检测未识别 / TMDB缺失 (detect_unidentified)
-        if detect_unidentified:
-            for r in records:
-                title = r["title"] or ""
-                has_tmdbid = r["tmdbid"] and int(r["tmdbid"]) > 0
-                if has_tmdbid:
-                    # 有有效 TMDB ID 则已识别，不进行标记（避免误报"未知死亡"等带"未知"的正常标题）
-                    is_unk = False
-                else:
-                    # 无 TMDB ID 时，进一步用标题关键字兜底：标题为空、纯"未知"、或 Unknown
-                    title_strip = title.strip()
-                    is_unk = (
-                        not title_strip
-                        or title_strip in ("未知", "Unknown", "unknown")
-                        or title_strip.lower() == "unknown"
-                    )
-                    # 也接受任何 TMDB ID 缺失的情况（无论标题如何），因为核心就是 TMDB 匹配失败
-                    is_unk = True
-
-                if is_unk:
-                    key = cls._generate_key("unidentified", str(r["id"]))
-                    exceptions.append({
-                        "key": key,
-                        "type": "unidentified",
-                        "type_name": "未识别/TMDB缺失",
-                        "title": title or "未知",
-                        "history_id": r["id"],
-                        "src": r["src"],
-                        "dest": r["dest"],
-                        "date": r["date"],
-                        "detail": f"TMDB ID: {r['tmdbid'] or '缺失'}, 整理标题: {title}",
-                        "status": "active"
-                    })
-
-        # 3. 检测英文/未中文化标题 (detect_english_title)
-        if detect_english:
-            for r in records:
-                title = r["title"].strip()
-                if title and not re.search(r"[\u4e00-\u9fff]", title):
-                    # 忽略纯数字或短符号
-                    if not title.replace(".", "").replace("-", "").isdigit():
-                        key = cls._generate_key("english_title", str(r["id"]))
-                        exceptions.append({
-                            "key": key,
-                            "type": "english_title",
-                            "type_name": "英文未中文化标题",
-                            "title": title,
-                            "history_id": r["id"],
-                            "src": r["src"],
-                            "dest": r["dest"],
-                            "date": r["date"],
-                            "detail": f"标题 [{title}] 未包含中文，可能识别降级或缺少中文别名",
-                            "status": "active"
-                        })
-
-        # 4. 检测多文件合并归并到同一个目标文件 (detect_merged_files)
-        if detect_merged:
-            dest_to_srcs: Dict[str, Set[str]] = {}
-            dest_to_histories: Dict[str, List[Dict[str, Any]]] = {}
-
-            for r in records:
-                dest = r["dest"].strip()
-                if not dest:
-                    continue
-                if dest not in dest_to_srcs:
-                    dest_to_srcs[dest] = set()
-                    dest_to_histories[dest] = []
-
-                if r["src"]:
-                    dest_to_srcs[dest].add(r["src"])
-                # 累加 files 列表里的 src
-                if isinstance(r["files"], list):
-                    for fitem in r["files"]:
-                        if isinstance(fitem, dict) and fitem.get("src"):
-                            dest_to_srcs[dest].add(fitem["src"])
-
-                dest_to_histories[dest].append(r)
-
-            for dest, srcs in dest_to_srcs.items():
-                if len(srcs) >= min_merged_files:
-                    sample_h = dest_to_histories[dest][0]
-                    key = cls._generate_key("merged_files", dest)
-                    exceptions.append({
-                        "key": key,
-                        "type": "merged_files",
-                        "type_name": "多文件合并覆盖",
-                        "title": sample_h["title"] or dest,
-                        "history_id": sample_h["id"],
-                        "src": f"共有 {len(srcs)} 个源文件指向此目标",
-                        "dest": dest,
-                        "date": sample_h["date"],
-                        "detail": f"检测到 {len(srcs)} 个源文件归并/覆盖到了同一个目标文件: {dest}",
-                        "status": "active",
-                        "file_count": len(srcs)
-                    })
-
-        # 5. 检测重复季集 (detect_duplicate_episode)
-        if detect_duplicate:
-            ep_map: Dict[str, List[Dict[str, Any]]] = {}
-            for r in records:
-                # 仅对电视剧生效
-                mtype = r["type"].lower() if r["type"] else ""
-                if "tv" in mtype or "剧" in mtype or r["seasons"] or r["episodes"]:
-                    media_key = r["tmdbid"] if r["tmdbid"] else r["title"]
-                    if media_key and r["seasons"] and r["episodes"]:
-                        ep_key = f"{media_key}:{r['seasons']}:{r['episodes']}"
-                        if ep_key not in ep_map:
-                            ep_map[ep_key] = []
-                        ep_map[ep_key].append(r)
-
-            for ep_key, r_list in ep_map.items():
-                # 多个不同 dest 覆盖
-                dests = set(item["dest"] for item in r_list if item["dest"])
-                if len(dests) > 1:
-                    sample_h = r_list[0]
-                    key = cls._generate_key("duplicate_episode", ep_key)
-                    exceptions.append({
-                        "key": key,
-                        "type": "duplicate_episode",
-                        "type_name": "重复季集冲突",
-                        "title": sample_h["title"],
-                        "history_id": sample_h["id"],
-                        "src": sample_h["src"],
-                        "dest": sample_h["dest"],
-                        "date": sample_h["date"],
-                        "detail": f"季集 [{sample_h['seasons']}{sample_h['episodes']}] 被多次整理到了 {len(dests)} 个不同的目标文件",
-                        "status": "active",
-                        "file_count": len(dests)
-                    })
-
-        # 6. 检测目标文件缺失/0字节 (detect_missing_dest)
-        if detect_missing:
-            for r in records:
-                dest = r["dest"]
-                if dest and (os.path.isabs(dest) or (len(dest) > 1 and dest[1] == ":")):
-                    try:
-                        if not os.path.exists(dest):
-                            key = cls._generate_key("missing_dest", str(r["id"]))
-                            exceptions.append({
-                                "key": key,
-                                "type": "missing_dest",
-                                "type_name": "目标文件缺失",
-                                "title": r["title"],
-                                "history_id": r["id"],
-                                "src": r["src"],
-                                "dest": dest,
-                                "date": r["date"],
-                                "detail": f"目标路径物理文件不存在: {dest}",
-                                "status": "active"
-                            })
-                        elif os.path.getsize(dest) == 0:
-                            key = cls._generate_key("missing_dest_zero", str(r["id"]))
-                            exceptions.append({
-                                "key": key,
-                                "type": "missing_dest",
-                                "type_name": "目标文件0字节",
-                                "title": r["title"],
-                                "history_id": r["id"],
-                                "src": r["src"],
-                                "dest": dest,
-                                "date": r["date"],
-                                "detail": f"目标路径物理文件大小为 0 字节: {dest}",
-                                "status": "active"
-                            })
-                    except Exception:
-                        pass
-
-        # 7. 检测离群/格式异常集数 (detect_invalid_episode，仅对电视剧/非电影生效)
-        if detect_invalid_ep:
-            invalid_ep_threshold = int(config.get("invalid_episode_threshold", 500))
-            
-            def is_movie_record(rec: dict) -> bool:
-                mtype = str(rec.get("type") or "").lower()
-                dest = str(rec.get("dest") or "").lower()
-                src = str(rec.get("src") or "").lower()
-                return "movie" in mtype or "电影" in mtype or "/电影/" in dest or "/电影/" in src
-
-            # 第一步：按媒体分组收集本次扫描到的所有集数（排除电影）
-            media_episodes: Dict[str, Set[int]] = {}
-            for r in records:
-                if is_movie_record(r):
-                    continue
-                media_key = r["tmdbid"] if r["tmdbid"] else r["title"]
-                if media_key:
-                    ep_nums = [int(n) for n in re.findall(r"\d+", r["episodes"] or "")]
-                    if media_key not in media_episodes:
-                        media_episodes[media_key] = set()
-                    media_episodes[media_key].update(ep_nums)
-
-            # 第二步：二次遍历，检测离群集数（排除电影）
-            for r in records:
-                if is_movie_record(r):
-                    continue
-                media_key = r["tmdbid"] if r["tmdbid"] else r["title"]
-                ep_nums = [int(n) for n in re.findall(r"\d+", r["episodes"] or "")]
-                
-                is_invalid = False
-                for n in ep_nums:
-                    if n > invalid_ep_threshold:
-                        # 检查连续性：当前批次中是否有 n-1 或 n+1 的集数存在
-                        all_eps = media_episodes.get(media_key, set())
-                        has_continuity = (n - 1) in all_eps or (n + 1) in all_eps
-                        if not has_continuity:
-                            is_invalid = True
-                            break
-                            
-                if is_invalid:
-                    key = cls._generate_key("invalid_episode", str(r["id"]))
-                    exceptions.append({
-                        "key": key,
-                        "type": "invalid_episode",
-                        "type_name": "离群集数异常",
-                        "title": r["title"],
-                        "history_id": r["id"],
-                        "src": r["src"],
-                        "dest": r["dest"],
-                        "date": r["date"],
-                        "detail": f"解析集数数值过大 [{r['episodes']}] (超阈值 {invalid_ep_threshold}) 且无前后连续集数，疑似误提取了分辨率/日期",
-                        "status": "active"
-                    })
-
-        return exceptions, max_id
+        pipeline = cls.create_pipeline(config)
+        pipeline.feed_many(histories)
+        return pipeline.finish()
@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class DestVerifier:
+    """
+    目标文件存在性/大小批量校验器：
+    - 按父目录分组，每个目录只做一次 os.scandir，仅对需要的文件取大小；
+    - 目录并发校验，同一挂载点（st_dev）限制并发数，避免压垮单个网络挂载；
+    - 目录列表按目录 mtime 缓存并持久化，目录未变化时直接复用上次结果。
+    注意：原地改写文件不会改变目录 mtime，缓存中的文件大小在目录变化前不会刷新。
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None, max_workers: int = 16, per_mount: int = 4,
+                 cancel_check: Optional[Callable[[], None]] = None):
+        # 取消检查回调：任务已取消时抛出异常，中断尚未开始的目录/文件校验
+        self._cancel_check = cancel_check
+        self._max_workers = max(1, int(max_workers))
+        self._per_mount = max(1, int(per_mount))
+        self._mount_sems: Dict[int, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        # 目录 -> (mtime_ns, {文件名: 大小，None 表示尚未取过大小})
+        self._cache: Dict[str, Tuple[int, Dict[str, Optional[int]]]] = {}
+        self._dirty: Set[str] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        if cache_file:
+            self._conn = sqlite3.connect(str(cache_file), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dir_cache (dir TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, listing TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        self.stats = {"dirs_scanned": 0, "dirs_cached": 0, "dirs_missing": 0, "files": 0}
+
+    def _mount_sem(self, dev: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._mount_sems.get(dev)
+            if sem is None:
+                sem = self._mount_sems[dev] = threading.BoundedSemaphore(self._per_mount)
+            return sem
+
+    def check_cancelled(self):
+        if self._cancel_check:
+            self._cancel_check()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _load_cached(self, directory: str) -> Optional[Tuple[int, Dict[str, Optional[int]]]]:
+        with self._lock:
+            cached = self._cache.get(directory)
+            if cached is not None or not self._conn:
+                return cached
+            row = self._conn.execute(
+                "SELECT mtime_ns, listing FROM dir_cache WHERE dir = ?", (directory,)
+            ).fetchone()
+            if not row:
+                return None
+            cached = (row[0], json.loads(row[1]))
+            self._cache[directory] = cached
+            return cached
+
+    def _store(self, directory: str, mtime_ns: int, listing: Dict[str, Optional[int]]):
+        with self._lock:
+            self._cache[directory] = (mtime_ns, listing)
+            self._dirty.add(directory)
+
+    def _check_dir(self, directory: str, names: Set[str]) -> Dict[str, Optional[int]]:
+        """
+        校验单个目录下的文件，返回 {文件名: 大小}，文件不存在时大小为 None
+        """
+        self.check_cancelled()
+        try:
+            st = os.stat(directory)
+        except OSError:
+            self._count("dirs_missing")
+            return {name: None for name in names}
+
+        sem = self._mount_sem(st.st_dev)
+        cached = self._load_cached(directory)
+        if cached and cached[0] == st.st_mtime_ns:
+            listing = dict(cached[1])
+            self._count("dirs_cached")
+        else:
+            listing = {}
+            with sem:
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            listing[entry.name] = None
+                except OSError:
+                    self._count("dirs_missing")
+                    return {name: None for name in names}
+            self._count("dirs_scanned")
+
+        result: Dict[str, Optional[int]] = {}
+        changed = not cached or cached[0] != st.st_mtime_ns
+        for name in names:
+            if name not in listing:
+                result[name] = None
+                continue
+            size = listing[name]
+            if size is None:
+                self.check_cancelled()
+                with sem:
+                    try:
+                        size = os.stat(os.path.join(directory, name)).st_size
+                    except OSError:
+                        size = None
+                if size is not None:
+                    listing[name] = size
+                    changed = True
+            result[name] = size
+        if changed:
+            self._store(directory, st.st_mtime_ns, listing)
+        self._count("files", len(names))
+        return result
+
+    def verify(self, paths: Iterable[str]) -> Dict[str, Optional[int]]:
+        """
+        批量校验文件，返回 {路径: 大小}，文件不存在时大小为 None
+        """
+        by_dir: Dict[str, Set[str]] = {}
+        split: List[Tuple[str, str, str]] = []
+        for path in paths:
+            directory, name = os.path.split(path)
+            by_dir.setdefault(directory, set()).add(name)
+            split.append((path, directory, name))
+        if not by_dir:
+            return {}
+
+        dirs = list(by_dir.keys())
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(dirs))) as executor:
+            dir_results = dict(zip(dirs, executor.map(lambda d: self._check_dir(d, by_dir[d]), dirs)))
+        return {path: dir_results[directory].get(name) for path, directory, name in split}
+
+    def close(self):
+        """将变化的目录缓存写回磁盘"""
+        if not self._conn:
+            return
+        with self._lock:
+            rows = [
+                (d, self._cache[d][0], json.dumps(self._cache[d][1], ensure_ascii=False))
+                for d in self._dirty if d in self._cache
+            ]
+            self._dirty.clear()
+        if rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dir_cache(dir, mtime_ns, listing) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+        self._conn.close()
+        self._conn = None
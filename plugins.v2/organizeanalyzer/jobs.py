@@ -0,0 +1,138 @@
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.log import logger
+
+
+class AnalysisCancelled(Exception):
+    """分析任务被取消"""
+    pass
+
+
+class AnalysisJob:
+    """
+    一次后台分析任务：记录状态、进度与结果，供进度接口查询
+    """
+
+    def __init__(self, mode: str, source: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.source = source
+        # pending / running / done / failed / cancelled
+        self.status = "pending"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Dict[str, Any] = {}
+        self.error = ""
+        # 运行中由 run_analysis 绑定，用于读取实时进度
+        self.pipeline: Any = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.done_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise AnalysisCancelled()
+
+    def to_dict(self) -> Dict[str, Any]:
+        pipeline = self.pipeline
+        rows = pipeline.rows if pipeline else 0
+        total = pipeline.total if pipeline else 0
+        rate = pipeline.rows_per_sec if pipeline else 0.0
+        eta = None
+        if self.status == "running" and total and rate > 0:
+            eta = round(max(total - rows, 0) / rate, 1)
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "mode": self.mode,
+            "source": self.source,
+            "status": self.status,
+            "rows": rows,
+            "total": total,
+            "progress": round(min(rows / total, 1.0) * 100, 1) if total else (100.0 if self.finished else 0.0),
+            "rows_per_sec": round(rate, 1),
+            "eta": eta,
+            "elapsed": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "timings": {k: round(v, 3) for k, v in pipeline.timings.items()} if pipeline else {},
+            "detectors": {
+                k: {"hits": v["hits"], "cpu": round(v["cpu"], 3), "wall": round(v["wall"], 3)}
+                for k, v in pipeline.stats.items()
+            } if pipeline else {},
+            "summary": self.result.get("summary", {}),
+            "error": self.error,
+        }
+
+
+class AnalysisJobManager:
+    """
+    后台分析任务管理：同一时间只运行一个任务，并发提交（定时/手动）合并到正在运行的任务上
+    """
+
+    def __init__(self, runner: Callable[[AnalysisJob], Dict[str, Any]], plugin_name: str = ""):
+        self._runner = runner
+        self._plugin_name = plugin_name
+        self._lock = threading.Lock()
+        self._current: Optional[AnalysisJob] = None
+        self._last: Optional[AnalysisJob] = None
+
+    def submit(self, mode: str, source: str = "manual") -> Tuple[AnalysisJob, bool]:
+        """
+        提交分析任务，返回 (任务, 是否新建)；已有任务在运行时直接返回该任务
+        """
+        with self._lock:
+            if self._current and not self._current.finished:
+                return self._current, False
+            job = AnalysisJob(mode, source)
+            self._current = job
+        threading.Thread(target=self._run, args=(job,), name=f"organizeanalyzer-job-{job.id}", daemon=True).start()
+        return job, True
+
+    def _run(self, job: AnalysisJob):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = self._runner(job) or {}
+            job.status = "done"
+        except AnalysisCancelled:
+            job.status = "cancelled"
+            logger.info(f"【{self._plugin_name}】分析任务 {job.id} 已取消")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"【{self._plugin_name}】分析任务 {job.id} 执行失败: {e}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._last = job
+            job.done_event.set()
+
+    def get(self, job_id: str = "") -> Optional[AnalysisJob]:
+        """按 ID 获取任务，未指定时返回当前（或最近一次）任务"""
+        with self._lock:
+            for job in (self._current, self._last):
+                if job and (not job_id or job.id == job_id):
+                    return job
+        return None
+
+    def cancel(self, job_id: str = "") -> bool:
+        job = self.get(job_id)
+        if not job or job.finished:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def shutdown(self, timeout: float = 10) -> bool:
+        """取消正在运行的任务并等待其退出，返回任务是否已结束"""
+        with self._lock:
+            job = self._current
+        if job and not job.finished:
+            job.cancel_event.set()
+            return job.done_event.wait(timeout)
+        return True
@@ -1,69 +1,252 @@
 import json
+import re
+import sqlite3
+import struct
+import threading
 import time
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple, Iterable
+
+
+_SUMMARY_TYPES = (
+    "merged_files",
+    "english_title",
+    "unidentified",
+    "failed_status",
+    "duplicate_episode",
+    "missing_dest",
+    "invalid_episode",
+)
+
+_FILE_COUNT_RE = (
+    re.compile(r"(\d+)\s*个源文件"),
+    re.compile(r"(\d+)\s*个不同的目标文件"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exceptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'active',
+    title TEXT NOT NULL DEFAULT '',
+    src TEXT NOT NULL DEFAULT '',
+    dest TEXT NOT NULL DEFAULT '',
+    detail TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    file_count INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_exceptions_status_type_date ON exceptions(status, type, date);
+CREATE INDEX IF NOT EXISTS idx_exceptions_status_type_fc ON exceptions(status, type, file_count);
+CREATE TABLE IF NOT EXISTS ignored_keys (key TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS counters (
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (type, status)
+);
+CREATE TRIGGER IF NOT EXISTS exceptions_cnt_ai AFTER INSERT ON exceptions BEGIN
+    INSERT INTO counters(type, status, n) VALUES (new.type, new.status, 1)
+    ON CONFLICT(type, status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS exceptions_cnt_ad AFTER DELETE ON exceptions BEGIN
+    UPDATE counters SET n = n - 1 WHERE type = old.type AND status = old.status;
+END;
+CREATE TRIGGER IF NOT EXISTS exceptions_cnt_au AFTER UPDATE OF type, status ON exceptions BEGIN
+    UPDATE counters SET n = n - 1 WHERE type = old.type AND status = old.status;
+    INSERT INTO counters(type, status, n) VALUES (new.type, new.status, 1)
+    ON CONFLICT(type, status) DO UPDATE SET n = n + 1;
+END;
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS exceptions_fts USING fts5(
+    title, src, dest, detail, content='exceptions', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS exceptions_fts_ai AFTER INSERT ON exceptions BEGIN
+    INSERT INTO exceptions_fts(rowid, title, src, dest, detail) VALUES (new.id, new.title, new.src, new.dest, new.detail);
+END;
+CREATE TRIGGER IF NOT EXISTS exceptions_fts_ad AFTER DELETE ON exceptions BEGIN
+    INSERT INTO exceptions_fts(exceptions_fts, rowid, title, src, dest, detail) VALUES ('delete', old.id, old.title, old.src, old.dest, old.detail);
+END;
+CREATE TRIGGER IF NOT EXISTS exceptions_fts_au AFTER UPDATE OF title, src, dest, detail ON exceptions BEGIN
+    INSERT INTO exceptions_fts(exceptions_fts, rowid, title, src, dest, detail) VALUES ('delete', old.id, old.title, old.src, old.dest, old.detail);
+    INSERT INTO exceptions_fts(rowid, title, src, dest, detail) VALUES (new.id, new.title, new.src, new.dest, new.detail);
+END;
+"""
 
 
 class AnalyzerStorage:
     """
-    整理异常分析结果与忽略白名单持久化存储
+    整理异常分析结果与忽略白名单持久化存储（SQLite）
+    - 分页/筛选/排序在 SQL 中完成，(status, type, date/file_count) 联合索引
+    - 标题/路径/详情关键字走 trigram 全文索引（不可用时退化为 LIKE）
+    - 各类型计数由触发器增量维护，忽略/取消忽略为单行更新
     """
 
     def __init__(self, data_dir: Path):
         self.data_dir = data_dir
         self.data_file = self.data_dir / "exceptions.json"
+        self.db_file = self.data_dir / "exceptions.db"
+        self._lock = threading.RLock()
+        self._ensure_dir()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self._fts = True
+        except sqlite3.OperationalError:
+            # SQLite 版本过低不支持 trigram 分词，关键字搜索退化为 LIKE
+            self._fts = False
+        self._conn.commit()
+        self._migrate_json()
 
     def _ensure_dir(self):
         if not self.data_dir.exists():
             self.data_dir.mkdir(parents=True, exist_ok=True)
 
-    def load_data(self) -> Dict[str, Any]:
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _migrate_json(self):
         """
-        读取数据
+        首次启用时导入旧版 exceptions.json
         """
-        self._ensure_dir()
-        if not self.data_file.exists():
-            return {
-                "exceptions": [],
-                "ignored_keys": [],
-                "last_run_time": "",
-                "last_analyzed_id": 0,
-                "summary": {
-                    "total": 0,
-                    "merged_files": 0,
-                    "english_title": 0,
-                    "unidentified": 0,
-                    "failed_status": 0,
-                    "duplicate_episode": 0,
-                    "missing_dest": 0,
-                    "invalid_episode": 0,
-                }
-            }
+        if not self.data_file.exists() or self._get_meta("migrated"):
+            return
         try:
             with open(self.data_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                return data
-        except Exception as e:
-            return {
-                "exceptions": [],
-                "ignored_keys": [],
-                "last_run_time": "",
-                "last_analyzed_id": 0,
-                "summary": {},
-                "error": str(e)
-            }
-
-    def save_data(self, data: Dict[str, Any]) -> bool:
+        except Exception:
+            data = {}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO ignored_keys(key) VALUES (?)",
+                [(k,) for k in data.get("ignored_keys", []) or []],
+            )
+            self._upsert(data.get("exceptions", []) or [])
+            self._set_meta("last_run_time", data.get("last_run_time", ""))
+            self._set_meta("last_analyzed_id", data.get("last_analyzed_id", 0))
+            self._set_meta("migrated", 1)
+
+    def _get_meta(self, name: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, name: str, value: Any):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta(name, value) VALUES (?, ?)", (name, json.dumps(value, ensure_ascii=False))
+        )
+
+    @staticmethod
+    def _file_count(item: Dict[str, Any]) -> int:
+        if item.get("file_count") is not None:
+            return int(item["file_count"])
+        for text in (str(item.get("src") or ""), str(item.get("detail") or "")):
+            for pattern in _FILE_COUNT_RE:
+                m = pattern.search(text)
+                if m:
+                    return int(m.group(1))
+        return 1
+
+    def _upsert(self, items: List[Dict[str, Any]]):
+        """批量写入异常（按 key 覆盖，保留原有行位置）"""
+        self._conn.executemany(
+            "INSERT INTO exceptions(key, type, status, title, src, dest, detail, date, file_count, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET type = excluded.type, status = excluded.status, title = excluded.title, "
+            "src = excluded.src, dest = excluded.dest, detail = excluded.detail, date = excluded.date, "
+            "file_count = excluded.file_count, data = excluded.data",
+            [
+                (
+                    item.get("key"),
+                    item.get("type") or "",
+                    item.get("status") or "active",
+                    str(item.get("title") or ""),
+                    str(item.get("src") or ""),
+                    str(item.get("dest") or ""),
+                    str(item.get("detail") or ""),
+                    str(item.get("date") or ""),
+                    self._file_count(item),
+                    json.dumps(item, ensure_ascii=False),
+                )
+                for item in items if item.get("key")
+            ],
+        )
+
+    def get_meta(self) -> Dict[str, Any]:
+        """上次运行时间与已分析的最大 history ID"""
+        return {
+            "last_run_time": self._get_meta("last_run_time", ""),
+            "last_analyzed_id": int(self._get_meta("last_analyzed_id", 0) or 0),
+        }
+
+    def get_summary(self) -> Dict[str, int]:
+        """读取增量维护的分类计数"""
+        summary = {"total": 0, **{t: 0 for t in _SUMMARY_TYPES}, "ignored": 0}
+        with self._lock:
+            rows = self._conn.execute("SELECT type, status, n FROM counters WHERE n > 0").fetchall()
+        for mtype, status, n in rows:
+            if status == "ignored":
+                summary["ignored"] += n
+                continue
+            summary["total"] += n
+            if mtype in summary:
+                summary[mtype] += n
+        return summary
+
+    def query_exceptions(self, status: str = "active", type_filter: str = "", keyword: str = "",
+                         page: int = 1, page_size: int = 50, sort_by: str = "",
+                         sort_order: str = "desc") -> Tuple[List[Dict[str, Any]], int]:
         """
-        保存数据
+        分页查询异常，返回 (当前页条目, 总数)
         """
-        self._ensure_dir()
-        try:
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception:
-            return False
+        where, params = [], []
+        if status != "all":
+            where.append("status = ?")
+            params.append(status)
+        if type_filter:
+            where.append("type = ?")
+            params.append(type_filter)
+        kw = (keyword or "").strip().lower()
+        if kw:
+            if self._fts and len(kw) >= 3:
+                where.append("id IN (SELECT rowid FROM exceptions_fts WHERE exceptions_fts MATCH ?)")
+                params.append('"' + kw.replace('"', '""') + '"')
+            else:
+                like = "%" + kw.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                where.append(
+                    "(lower(title) LIKE ? ESCAPE '\\' OR lower(src) LIKE ? ESCAPE '\\' "
+                    "OR lower(dest) LIKE ? ESCAPE '\\' OR lower(detail) LIKE ? ESCAPE '\\')"
+                )
+                params.extend([like] * 4)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        direction = "DESC" if sort_order == "desc" else "ASC"
+        if sort_by == "file_count":
+            order_sql = f"ORDER BY file_count {direction}, id"
+        elif sort_by == "date":
+            order_sql = f"ORDER BY date {direction}, id"
+        else:
+            order_sql = "ORDER BY id"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM exceptions {where_sql}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT status, data FROM exceptions {where_sql} {order_sql} LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size],
+            ).fetchall()
+        items = []
+        for row_status, data in rows:
+            item = json.loads(data)
+            item["status"] = row_status
+            items.append(item)
+        return items, total
 
     def update_analysis_results(self, new_exceptions: List[Dict[str, Any]], mode: str, max_history_id: int = 0) -> Dict[str, Any]:
         """
@@ -71,115 +254,135 @@ class AnalyzerStorage:
         :param new_exceptions: 新扫描出的异常列表
         :param mode: 'full' 或 'incremental'
         :param max_history_id: 本次扫描用到的最大 history ID
+        :return: {"summary", "last_run_time", "last_analyzed_id"}
         """
-        data = self.load_data()
-        existing = data.get("exceptions", [])
-        ignored_keys = set(data.get("ignored_keys", []))
-
         now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-
-        if mode == "full":
-            # 全量分析：保留忽略标记，重置其余列表
-            merged_list = []
+        with self._lock, self._conn:
+            ignored_keys = {row[0] for row in self._conn.execute("SELECT key FROM ignored_keys")}
             for item in new_exceptions:
-                key = item.get("key")
-                if key in ignored_keys:
-                    item["status"] = "ignored"
-                merged_list.append(item)
-            data["exceptions"] = merged_list
-        else:
+                item["status"] = "ignored" if item.get("key") in ignored_keys else "active"
+            if mode == "full":
+                # 全量分析：保留忽略标记，重置其余列表
+                self._conn.execute("DELETE FROM exceptions")
             # 增量分析：增量覆盖/追加
-            existing_map = {item["key"]: item for item in existing}
-            for item in new_exceptions:
-                key = item.get("key")
-                if key in ignored_keys:
-                    item["status"] = "ignored"
-                existing_map[key] = item
-            data["exceptions"] = list(existing_map.values())
-
-        data["last_run_time"] = now_str
-        if max_history_id > data.get("last_analyzed_id", 0):
-            data["last_analyzed_id"] = max_history_id
-
-        # 重新统计 summary
-        summary = {
-            "total": 0,
-            "merged_files": 0,
-            "english_title": 0,
-            "unidentified": 0,
-            "failed_status": 0,
-            "duplicate_episode": 0,
-            "missing_dest": 0,
-            "invalid_episode": 0,
-            "ignored": 0,
+            self._upsert(new_exceptions)
+            self._set_meta("last_run_time", now_str)
+            last_id = int(self._get_meta("last_analyzed_id", 0) or 0)
+            if max_history_id > last_id:
+                self._set_meta("last_analyzed_id", max_history_id)
+        return {
+            "summary": self.get_summary(),
+            **self.get_meta(),
         }
-        for item in data["exceptions"]:
-            if item.get("status") == "ignored":
-                summary["ignored"] += 1
-                continue
-            summary["total"] += 1
-            cat = item.get("type", "")
-            if cat in summary:
-                summary[cat] += 1
 
-        data["summary"] = summary
-        self.save_data(data)
-        return data
+    def set_ignored(self, key: str, ignored: bool = True) -> bool:
+        """
+        标记/取消标记某项异常为已忽略
+        """
+        try:
+            with self._lock, self._conn:
+                if ignored:
+                    self._conn.execute("INSERT OR IGNORE INTO ignored_keys(key) VALUES (?)", (key,))
+                else:
+                    self._conn.execute("DELETE FROM ignored_keys WHERE key = ?", (key,))
+                self._conn.execute(
+                    "UPDATE exceptions SET status = ? WHERE key = ?", ("ignored" if ignored else "active", key)
+                )
+            return True
+        except sqlite3.Error:
+            return False
 
     def ignore_exception(self, key: str) -> bool:
         """
         标记某项异常为已忽略
         """
-        data = self.load_data()
-        ignored_keys = set(data.get("ignored_keys", []))
-        ignored_keys.add(key)
-        data["ignored_keys"] = list(ignored_keys)
-
-        for item in data.get("exceptions", []):
-            if item.get("key") == key:
-                item["status"] = "ignored"
-
-        # 更新 summary
-        summary = data.get("summary", {})
-        total_active = 0
-        ignored_cnt = 0
-        for item in data.get("exceptions", []):
-            if item.get("status") == "ignored":
-                ignored_cnt += 1
-            else:
-                total_active += 1
-        summary["total"] = total_active
-        summary["ignored"] = ignored_cnt
-        data["summary"] = summary
-
-        return self.save_data(data)
+        return self.set_ignored(key, True)
 
     def clear_ignored(self) -> bool:
         """
         清空忽略白名单
         """
-        data = self.load_data()
-        data["ignored_keys"] = []
-        for item in data.get("exceptions", []):
-            item["status"] = "active"
-
-        # 更新 summary
-        summary = {
-            "total": 0,
-            "merged_files": 0,
-            "english_title": 0,
-            "unidentified": 0,
-            "failed_status": 0,
-            "duplicate_episode": 0,
-            "missing_dest": 0,
-            "invalid_episode": 0,
-            "ignored": 0,
-        }
-        for item in data.get("exceptions", []):
-            summary["total"] += 1
-            cat = item.get("type", "")
-            if cat in summary:
-                summary[cat] += 1
-
-        data["summary"] = summary
-        return self.save_data(data)
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM ignored_keys")
+                self._conn.execute("UPDATE exceptions SET status = 'active' WHERE status = 'ignored'")
+            return True
+        except sqlite3.Error:
+            return False
+
+
+class DetectorStateStore:
+    """
+    聚合类检测器的持久化状态（SQLite 旁路存储），供增量分析跨批次发现冲突：
+    - merged_state:  dest -> 源文件摘要集合
+    - episode_state: 季集 key -> 目标文件摘要集合
+    摘要集合以 8 字节无符号整数紧凑打包存储，同时保存首条样本。
+    """
+
+    _TABLES = ("merged_state", "episode_state")
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.db_file = self.data_dir / "detector_state.db"
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for table in self._TABLES:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, hashes BLOB NOT NULL, sample TEXT NOT NULL)"
+            )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    @property
+    def initialized(self) -> bool:
+        """状态是否已由一次完整重建初始化（新建或被删除的状态库为 False）"""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'detector_state_initialized'").fetchone()
+        return bool(row)
+
+    def mark_initialized(self):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta(name, value) VALUES ('detector_state_initialized', ?)",
+            (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),),
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def pack(hashes: Set[int]) -> bytes:
+        return struct.pack(f">{len(hashes)}Q", *sorted(hashes))
+
+    @staticmethod
+    def unpack(blob: bytes) -> Set[int]:
+        return set(struct.unpack(f">{len(blob) // 8}Q", blob)) if blob else set()
+
+    def reset(self):
+        """全量分析前清空状态（同时清除初始化标记，重建中途取消时下次仍会全量重建）"""
+        for table in self._TABLES:
+            self._conn.execute(f"DELETE FROM {table}")
+        self._conn.execute("DELETE FROM meta WHERE name = 'detector_state_initialized'")
+        self._conn.commit()
+
+    def load(self, table: str, keys: List[str], chunk_size: int = 500) -> Dict[str, Tuple[Set[int], Dict[str, Any]]]:
+        """批量读取指定 key 的状态，返回 {key: (摘要集合, 样本)}"""
+        result: Dict[str, Tuple[Set[int], Dict[str, Any]]] = {}
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, hashes, sample FROM {table} WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob, sample in rows:
+                result[key] = (self.unpack(blob), json.loads(sample))
+        return result
+
+    def save(self, table: str, items: Iterable[Tuple[str, Set[int], Dict[str, Any]]]):
+        """批量写入状态（覆盖）"""
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO {table}(key, hashes, sample) VALUES (?, ?, ?)",
+            ((key, self.pack(hashes), json.dumps(sample, ensure_ascii=False)) for key, hashes, sample in items),
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -1,13 +1,9 @@
-import json
 import os
 import random
-import re
-import shutil
-import subprocess
 import threading
 import time
-import urllib.request
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, List, Dict, Tuple, Optional, Union
 from urllib.parse import unquote
@@ -29,7 +25,12 @@ from app.schemas.types import (
     MediaType,
     NotificationType,
 )
-from app.utils.system import SystemUtils
+from app.utils.string import StringUtils
+
+from .douban import DoubanRuntimeClient
+from .mover import MoveEngine
+from .prober import DurationProber
+from .store import CacheStore
 
 lock = threading.Lock()
 _id_locks: Dict[str, threading.Lock] = {}
@@ -48,11 +49,11 @@ class shortdramacompilation(_PluginBase):
     # 插件名称
     plugin_name = "短剧自动分类"
     # 插件描述
-    plugin_desc = "多策略自动分类微短剧到独立目录，支持平台ID匹配、TMDB/豆瓣片长、STRM/文件FFprobe探测及本地JSON结果缓存。"
+    plugin_desc = "多策略自动分类微短剧到独立目录，支持平台ID匹配、TMDB/豆瓣片长、STRM/文件FFprobe探测及本地结果缓存。"
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/ListeningLTG/MoviePilot-Plugins/refs/heads/main/icons/hg.jpeg"
     # 插件版本
-    plugin_version = "0.2.6"
+    plugin_version = "0.3.4"
     # 插件作者
     plugin_author = "ListeningLTG"
     # 作者主页
@@ -83,7 +84,16 @@ class shortdramacompilation(_PluginBase):
     _enable_anime_category = False
     _anime_category_name = "动画短剧"
     _anime_category_dir = ""
-    _cache_data = {}
+    _store: Optional[CacheStore] = None
+    _prober: Optional[DurationProber] = None
+    _douban: Optional[DoubanRuntimeClient] = None
+    _stop_event: Optional[threading.Event] = None
+    # ffprobe 子进程并发上限
+    _ffprobe_workers = 2
+    # 批量预分类并发数
+    _preclassify_workers = 4
+    # 跨盘复制并发数
+    _move_workers = 4
 
     def init_plugin(self, config: dict = None):
         if config:
@@ -104,23 +114,35 @@ class shortdramacompilation(_PluginBase):
             self._anime_category_dir = config.get("anime_category_dir") or ""
 
         self._load_cache()
+        if self._prober:
+            self._prober.close()
+        self._prober = DurationProber(
+            cache_file=self._cache_dir / "probe_cache.json",
+            max_workers=self._ffprobe_workers,
+        )
+        if self._douban:
+            self._douban.close()
+        self._douban = DoubanRuntimeClient()
+        self._stop_event = threading.Event()
 
     @property
-    def _cache_file_path(self) -> Path:
+    def _cache_dir(self) -> Path:
         cache_dir = settings.CONFIG_PATH / "plugins" / "shortdramacompilation"
         cache_dir.mkdir(parents=True, exist_ok=True)
-        return cache_dir / "cache.json"
+        return cache_dir
 
     def _load_cache(self):
         with lock:
-            if self._cache_file_path.exists():
-                try:
-                    self._cache_data = json.loads(self._cache_file_path.read_text(encoding="utf-8"))
-                except Exception as e:
-                    logger.error(f"【短剧自动分类】加载缓存文件失败: {e}")
-                    self._cache_data = {}
-            else:
-                self._cache_data = {}
+            if self._store:
+                self._store.close()
+            try:
+                self._store = CacheStore(
+                    db_path=self._cache_dir / "cache.db",
+                    legacy_json=self._cache_dir / "cache.json",
+                )
+            except Exception as e:
+                logger.error(f"【短剧自动分类】打开缓存数据库失败: {e}")
+                self._store = None
 
     def _update_cache(
         self,
@@ -133,25 +155,24 @@ class shortdramacompilation(_PluginBase):
         network_id: Optional[str] = None,
         is_anime: bool = False,
     ):
-        if not tmdb_id or not self._enable_cache:
+        if not tmdb_id or not self._enable_cache or not self._store:
             return
-        with lock:
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            key = str(tmdb_id)
-            existing = self._cache_data.get(key, {})
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        def _merge(existing: dict) -> Optional[dict]:
             existing_type = existing.get("strategy_type")
 
             # 策略保护规则：
             # 1. 高优先级策略 (manual / network) 锁定，不被任何普通探测覆盖
             if existing_type in ["manual", "network"] and strategy_type not in ["manual", "network"]:
-                return
+                return None
 
             # 2. 锁定首次探测结果：如果已有有效的探测判定 (ffprobe / tmdb_runtime / douban_runtime)，
             # 且后续更新为 ffprobe 或 default (未满足条件)，优先保留首次有效探测结果，不予覆盖
             if existing_type in ["ffprobe", "tmdb_runtime", "douban_runtime"] and strategy_type in ["ffprobe", "default"]:
-                return
+                return None
 
-            self._cache_data[key] = {
+            return {
                 "title": title or existing.get("title", ""),
                 "is_short_drama": bool(is_short),
                 "strategy": strategy or existing.get("strategy", ""),
@@ -162,13 +183,8 @@ class shortdramacompilation(_PluginBase):
                 "anime_checked_at": existing.get("anime_checked_at") or now_str,
                 "updated_at": now_str,
             }
-            try:
-                self._cache_file_path.write_text(
-                    json.dumps(self._cache_data, ensure_ascii=False, indent=2),
-                    encoding="utf-8",
-                )
-            except Exception as e:
-                logger.error(f"【短剧自动分类】写入缓存文件失败: {e}")
+
+        self._store.update(tmdb_id, _merge)
 
     def get_state(self) -> bool:
         return self._enabled
@@ -177,8 +193,162 @@ class shortdramacompilation(_PluginBase):
     def get_command() -> List[Dict[str, Any]]:
         pass
 
+    def get_service(self) -> List[Dict[str, Any]]:
+        """
+        注册插件公共服务
+        """
+        services = []
+        if self._enabled and self._enable_douban_runtime:
+            services.append({
+                "id": "shortdramacompilation_douban_prefetch",
+                "name": "短剧豆瓣片长预取",
+                "trigger": "interval",
+                "func": self.prefetch_douban_runtimes,
+                "kwargs": {"hours": 6}
+            })
+        if self._enabled and self._enable_cache:
+            services.append({
+                "id": "shortdramacompilation_preclassify",
+                "name": "短剧批量预分类",
+                "trigger": "interval",
+                "func": self.preclassify,
+                "kwargs": {"minutes": 30}
+            })
+        if self._enabled and self._enable_anime_category:
+            services.append({
+                "id": "shortdramacompilation_anime_refresh",
+                "name": "短剧动画类型刷新",
+                "trigger": "interval",
+                "func": self.refresh_anime_flags,
+                "kwargs": {"hours": 1}
+            })
+        return services
+
+    def _collect_pending_media(self) -> Dict[str, Dict[str, Any]]:
+        """
+        汇总待入库的电视剧：订阅中的电视剧 + 下载器中正在下载的电视剧，返回 {tmdb_id: {douban_id, title}}
+        """
+        pending: Dict[str, Dict[str, Any]] = {}
+        try:
+            from app.db.subscribe_oper import SubscribeOper
+            for sub in SubscribeOper().list() or []:
+                if sub.type == MediaType.TV.value and sub.tmdbid:
+                    pending.setdefault(str(sub.tmdbid), {"douban_id": sub.doubanid, "title": sub.name})
+        except Exception as e:
+            logger.error(f"【短剧自动分类】读取订阅列表失败: {e}")
+        try:
+            from app.chain.download import DownloadChain
+            from app.db.downloadhistory_oper import DownloadHistoryOper
+            history_oper = DownloadHistoryOper()
+            for torrent in DownloadChain().downloading() or []:
+                history = history_oper.get_by_hash(torrent.hash) if torrent.hash else None
+                if history and history.type == MediaType.TV.value and history.tmdbid:
+                    pending.setdefault(str(history.tmdbid), {"douban_id": history.doubanid, "title": history.title})
+        except Exception as e:
+            logger.error(f"【短剧自动分类】读取下载任务失败: {e}")
+        return pending
+
+    def _preclassify_one(self, tmdb_id: str, douban_id: Optional[str], title: str) -> Optional[bool]:
+        """
+        预分类单个剧集，已有缓存或 TMDB 查询失败时返回 None
+        """
+        if self._stop_event and self._stop_event.is_set():
+            return None
+        with _get_id_lock(tmdb_id):
+            cache_item = self._store.get(tmdb_id) if self._store else None
+            if cache_item and "is_short_drama" in cache_item:
+                return None
+            try:
+                from app.modules.themoviedb import TheMovieDbModule
+                tmdb_info = TheMovieDbModule().tmdb_info(int(tmdb_id), MediaType.TV)
+            except Exception as e:
+                logger.debug(f"【短剧自动分类】预分类获取 TMDB 信息失败 {tmdb_id}: {e}")
+                return None
+            if not tmdb_info:
+                return None
+            mediainfo = MediaInfo()
+            mediainfo.set_tmdb_info(tmdb_info)
+            if douban_id:
+                mediainfo.douban_id = str(douban_id)
+            return self._evaluate_short_drama(
+                mediainfo=mediainfo,
+                video_path=None,
+                tmdb_id=tmdb_id,
+                title=mediainfo.title or title,
+                record_default=False,
+            )
+
+    def preclassify(self):
+        """
+        批量预分类即将入库的电视剧，使文件到达时直接命中缓存
+        """
+        if not self._enabled or not self._store:
+            return
+        pending = {
+            tmdb_id: info for tmdb_id, info in self._collect_pending_media().items()
+            if not (self._store.get(tmdb_id) or {}).get("strategy_type")
+        }
+        if not pending:
+            return
+        logger.info(f"【短剧自动分类】开始批量预分类，待判定剧集 {len(pending)} 个")
+        results = []
+        with ThreadPoolExecutor(max_workers=self._preclassify_workers) as executor:
+            futures = [
+                executor.submit(self._preclassify_one, tmdb_id, info.get("douban_id"), info.get("title") or "")
+                for tmdb_id, info in pending.items()
+            ]
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"【短剧自动分类】预分类出错: {e}")
+        decided = [r for r in results if r is not None]
+        logger.info(
+            f"【短剧自动分类】批量预分类完成：待判定 {len(pending)} 个，已执行判定 {len(decided)} 个，其中短剧 {sum(1 for r in decided if r)} 个"
+        )
+
+    def prefetch_douban_runtimes(self):
+        """
+        空闲时批量预取未判定的电视剧订阅的豆瓣单集片长
+        """
+        if not self._douban:
+            return
+        try:
+            from app.db.subscribe_oper import SubscribeOper
+            subscribes = SubscribeOper().list() or []
+        except Exception as e:
+            logger.error(f"【短剧自动分类】读取订阅列表失败: {e}")
+            return
+        douban_ids = [
+            sub.doubanid for sub in subscribes
+            if sub.type == MediaType.TV.value and sub.doubanid
+            and not (self._store and sub.tmdbid in self._store)
+        ]
+        if not douban_ids:
+            return
+        fetched = self._douban.prefetch(douban_ids, stop_event=self._stop_event)
+        logger.info(f"【短剧自动分类】豆瓣片长预取完成：待判定订阅 {len(douban_ids)} 个，实际抓取 {fetched} 个")
+
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [
+            {
+                "path": "/probe_stats",
+                "endpoint": self.api_probe_stats,
+                "methods": ["GET"],
+                "auth": "bear",
+                "summary": "获取时长探测统计",
+            }
+        ]
+
+    def api_probe_stats(self) -> dict:
+        """
+        各探测策略（缓存/头部解析/FFprobe）的调用次数、成功率与平均耗时
+        """
+        return {
+            "code": 0,
+            "msg": "success",
+            "data": self._prober.get_stats() if self._prober else {},
+        }
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
@@ -217,7 +387,7 @@ class shortdramacompilation(_PluginBase):
                                 'content': [
                                     {
                                         'component': 'VSwitch',
-                                        'props': {'model': 'enable_cache', 'label': '持久化 JSON 缓存'}
+                                        'props': {'model': 'enable_cache', 'label': '持久化结果缓存'}
                                     }
                                 ]
                             }
@@ -375,7 +545,7 @@ class shortdramacompilation(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '【多策略管道分类】1.TMDB播出平台ID -> 2.TMDB标注片长 -> 3.豆瓣标注片长 -> 4.FFprobe探测。目录支持绝对路径或相对路径（如 短剧 或 ../短剧），留空自动在整理同级创建短剧分类。判定结果自动存入 cache.json。'
+                                            'text': '【多策略管道分类】1.TMDB播出平台ID -> 2.TMDB标注片长 -> 3.豆瓣标注片长 -> 4.FFprobe探测。目录支持绝对路径或相对路径（如 短剧 或 ../短剧），留空自动在整理同级创建短剧分类。判定结果自动存入 cache.db。'
                                         }
                                     }
                                 ]
@@ -407,78 +577,106 @@ class shortdramacompilation(_PluginBase):
 
     def check_is_anime(self, mediainfo: Optional[MediaInfo], tmdb_id: Optional[Union[int, str]] = None) -> bool:
         """
-        检查剧集是否属于动画类型（包含 24 小时 TTL 缓存刷新机制）
+        检查剧集是否属于动画类型（优先读取缓存，24 小时 TTL 过期由后台任务批量刷新）
         """
-        now = datetime.now()
+        # Step A: 检查缓存中的 is_anime
+        cache_item = self._store.get(tmdb_id) if (tmdb_id and self._store) else None
+        if cache_item and "is_anime" in cache_item:
+            return bool(cache_item["is_anime"])
 
-        # Step A: 检查缓存中的 is_anime 与 anime_checked_at
-        if tmdb_id and str(tmdb_id) in self._cache_data:
-            cache_item = self._cache_data[str(tmdb_id)]
-            if isinstance(cache_item, dict) and "is_anime" in cache_item:
-                checked_at_str = cache_item.get("anime_checked_at")
-                if checked_at_str:
-                    try:
-                        checked_at = datetime.strptime(checked_at_str, "%Y-%m-%d %H:%M:%S")
-                        # 如果在 24 小时 (86400 秒) 内，直接返回缓存值
-                        if (now - checked_at).total_seconds() < 86400:
-                            return bool(cache_item["is_anime"])
-                    except Exception:
-                        pass
+        # Step B: 首次获取，从 mediainfo 或 TMDB 判断
+        is_anime = bool(self._detect_anime(mediainfo=mediainfo, tmdb_id=tmdb_id))
 
-        # Step B: 24 小时超时或首次获取，从 mediainfo 或 TMDB 刷新判断
-        is_anime = False
+        # Step C: 更新 cache 中的 is_anime 和 anime_checked_at
+        if cache_item:
+            self._mark_anime(tmdb_id, is_anime)
+        return is_anime
+
+    @staticmethod
+    def _detect_anime(mediainfo: Optional[MediaInfo], tmdb_id: Optional[Union[int, str]]) -> Optional[bool]:
+        """
+        根据 mediainfo 或 TMDB 类型判断是否为动画，TMDB 查询失败时返回 None
+        """
         if mediainfo:
             genre_ids = getattr(mediainfo, "genre_ids", None) or []
             if 16 in genre_ids or "16" in [str(i) for i in genre_ids]:
-                is_anime = True
-            else:
-                genres = getattr(mediainfo, "genres", None) or []
-                for g in genres:
-                    if isinstance(g, dict):
-                        g_id = g.get("id")
-                        g_name = str(g.get("name", "")).lower()
-                        if g_id == 16 or any(kw in g_name for kw in ["动画", "animation", "anime", "短片"]):
-                            is_anime = True
-                            break
-                    elif isinstance(g, (str, int)):
-                        g_str = str(g).lower()
-                        if g_str == "16" or any(kw in g_str for kw in ["动画", "animation", "anime", "短片"]):
-                            is_anime = True
-                            break
-
-        if not is_anime and tmdb_id:
-            try:
-                from app.modules.themoviedb import TheMovieDbModule
-                tmdb_info = (
-                    mediainfo.tmdb_info
-                    if (mediainfo and mediainfo.tmdb_info)
-                    else TheMovieDbModule().tmdb_info(int(tmdb_id), MediaType.TV)
-                )
-                if tmdb_info and tmdb_info.get("genres"):
-                    for g in tmdb_info["genres"]:
-                        g_id = g.get("id")
-                        g_name = str(g.get("name", "")).lower()
-                        if g_id == 16 or "动画" in g_name or "animation" in g_name:
-                            is_anime = True
-                            break
-            except Exception as e:
-                logger.debug(f"【短剧自动分类】检测动画类型失败: {e}")
+                return True
+            genres = getattr(mediainfo, "genres", None) or []
+            for g in genres:
+                if isinstance(g, dict):
+                    g_id = g.get("id")
+                    g_name = str(g.get("name", "")).lower()
+                    if g_id == 16 or any(kw in g_name for kw in ["动画", "animation", "anime", "短片"]):
+                        return True
+                elif isinstance(g, (str, int)):
+                    g_str = str(g).lower()
+                    if g_str == "16" or any(kw in g_str for kw in ["动画", "animation", "anime", "短片"]):
+                        return True
+
+        if not tmdb_id:
+            return False
+        try:
+            from app.modules.themoviedb import TheMovieDbModule
+            tmdb_info = (
+                mediainfo.tmdb_info
+                if (mediainfo and mediainfo.tmdb_info)
+                else TheMovieDbModule().tmdb_info(int(tmdb_id), MediaType.TV)
+            )
+            if tmdb_info and tmdb_info.get("genres"):
+                for g in tmdb_info["genres"]:
+                    g_id = g.get("id")
+                    g_name = str(g.get("name", "")).lower()
+                    if g_id == 16 or "动画" in g_name or "animation" in g_name:
+                        return True
+            return False
+        except Exception as e:
+            logger.debug(f"【短剧自动分类】检测动画类型失败: {e}")
+            return None
 
-        # Step C: 更新 cache 中的 is_anime 和 anime_checked_at
-        if tmdb_id and str(tmdb_id) in self._cache_data:
-            with lock:
-                if str(tmdb_id) in self._cache_data:
-                    self._cache_data[str(tmdb_id)]["is_anime"] = is_anime
-                    self._cache_data[str(tmdb_id)]["anime_checked_at"] = now.strftime("%Y-%m-%d %H:%M:%S")
-                    try:
-                        self._cache_file_path.write_text(
-                            json.dumps(self._cache_data, ensure_ascii=False, indent=2),
-                            encoding="utf-8"
-                        )
-                    except Exception:
-                        pass
+    def _mark_anime(self, tmdb_id: Union[int, str], is_anime: Optional[bool]):
+        """
+        写入动画判定结果并刷新 anime_checked_at（is_anime 为 None 时仅刷新检查时间）
+        """
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        return is_anime
+        def _merge(existing: dict) -> Optional[dict]:
+            if not existing:
+                return None
+            if is_anime is not None:
+                existing["is_anime"] = is_anime
+            existing["anime_checked_at"] = now_str
+            return existing
+
+        if self._store.update(tmdb_id, _merge) is None:
+            # 记录为空或无法解析，仍需推进检查时间，否则后台刷新会反复取到该记录
+            self._store.touch_anime_checked(tmdb_id, now_str)
+
+    def refresh_anime_flags(self, batch_size: int = 200):
+        """
+        后台批量刷新动画判定已超过 24 小时的缓存项
+        """
+        if not self._store:
+            return
+        expire_before = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        refreshed = 0
+        last_keys: List[str] = []
+        while not (self._stop_event and self._stop_event.is_set()):
+            keys = self._store.expired_anime_keys(checked_before=expire_before, limit=batch_size)
+            if not keys:
+                break
+            if keys == last_keys:
+                logger.warning(f"【短剧自动分类】动画类型后台刷新未能推进检查时间（{len(keys)} 条），本次停止刷新")
+                break
+            last_keys = keys
+            for key in keys:
+                if self._stop_event and self._stop_event.is_set():
+                    break
+                self._mark_anime(key, self._detect_anime(mediainfo=None, tmdb_id=key))
+                refreshed += 1
+            # 确保本批次的检查时间落盘，避免下一批次重复取到
+            self._store.flush()
+        if refreshed:
+            logger.info(f"【短剧自动分类】动画类型后台刷新完成，共刷新 {refreshed} 条缓存")
 
     @classmethod
     def _resolve_category_dir(cls, cat_dir: Optional[str], cat_name: str, base_path: Path) -> Path:
@@ -527,34 +725,32 @@ class shortdramacompilation(_PluginBase):
         if not self._enable_cache or not tmdb_id:
             return False, False
 
-        key = str(tmdb_id)
-        if key in self._cache_data:
-            cache_item = self._cache_data[key]
-            if isinstance(cache_item, dict) and "is_short_drama" in cache_item:
-                st_type = cache_item.get("strategy_type", "runtime")
-                cached_runtime = float(cache_item.get("runtime", 0.0))
-                threshold = float(self._episode_duration)
-
-                if st_type in ["network", "manual"]:
-                    res = bool(cache_item["is_short_drama"])
-                    logger.info(
-                        f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 平台/手动缓存判定结果 -> {'[短剧]' if res else '[普通长剧]'}"
-                    )
-                    return res, True
-
-                if cached_runtime > 0:
-                    dynamic_res = (cached_runtime <= threshold)
-                    logger.info(
-                        f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 片长缓存，动态比对(记录片长: {cached_runtime}m, 当前阈值: {threshold}m) -> {'[短剧]' if dynamic_res else '[普通长剧]'}"
-                    )
-                    return dynamic_res, True
+        cache_item = self._store.get(tmdb_id) if self._store else None
+        if cache_item and "is_short_drama" in cache_item:
+            st_type = cache_item.get("strategy_type", "runtime")
+            cached_runtime = float(cache_item.get("runtime", 0.0))
+            threshold = float(self._episode_duration)
 
+            if st_type in ["network", "manual"]:
                 res = bool(cache_item["is_short_drama"])
                 logger.info(
-                    f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 本地缓存判定结果 -> {'[短剧]' if res else '[普通长剧]'}"
+                    f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 平台/手动缓存判定结果 -> {'[短剧]' if res else '[普通长剧]'}"
                 )
                 return res, True
 
+            if cached_runtime > 0:
+                dynamic_res = (cached_runtime <= threshold)
+                logger.info(
+                    f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 片长缓存，动态比对(记录片长: {cached_runtime}m, 当前阈值: {threshold}m) -> {'[短剧]' if dynamic_res else '[普通长剧]'}"
+                )
+                return dynamic_res, True
+
+            res = bool(cache_item["is_short_drama"])
+            logger.info(
+                f"【短剧自动分类】命中 TMDB ID {tmdb_id} ({title}) 本地缓存判定结果 -> {'[短剧]' if res else '[普通长剧]'}"
+            )
+            return res, True
+
         return False, False
 
     def check_is_short_drama(self, mediainfo: Optional[MediaInfo], video_path: Optional[str] = None) -> bool:
@@ -571,7 +767,7 @@ class shortdramacompilation(_PluginBase):
         tmdb_id = mediainfo.tmdb_id if mediainfo else None
         title = mediainfo.title if mediainfo else ""
 
-        # Step 0: 快速查询本地 JSON 缓存
+        # Step 0: 快速查询本地缓存
         res, found = self._check_cache(tmdb_id, title)
         if found:
             return res
@@ -593,10 +789,12 @@ class shortdramacompilation(_PluginBase):
         mediainfo: Optional[MediaInfo],
         video_path: Optional[str],
         tmdb_id: Optional[Union[int, str]],
-        title: str
+        title: str,
+        record_default: bool = True,
     ) -> bool:
         """
         执行具体的多策略评估逻辑（Step 1 ~ Step 4）
+        :param record_default: 全部策略未命中时是否写入"未满足短剧条件"缓存（预分类时关闭，保留文件到达后的 FFprobe 判定机会）
         """
         # 获取 tmdb_info
         tmdb_info = None
@@ -700,7 +898,7 @@ class shortdramacompilation(_PluginBase):
                     )
                     return is_short
 
-        if tmdb_id:
+        if tmdb_id and record_default:
             self._update_cache(
                 tmdb_id=tmdb_id,
                 is_short=False,
@@ -715,20 +913,11 @@ class shortdramacompilation(_PluginBase):
 
     def __get_douban_runtime(self, douban_id: Union[int, str]) -> float:
         """
-        抓取豆瓣页面获取单集片长
+        获取豆瓣单集片长（带缓存、限速与并发合并）
         """
-        url = f"https://movie.douban.com/subject/{douban_id}/"
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-        try:
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=8) as resp:
-                html = resp.read().decode("utf-8")
-                match = re.search(r"单集片长:</span>\s*(\d+)分钟", html)
-                if match:
-                    return float(match.group(1))
-        except Exception as e:
-            logger.debug(f"【短剧自动分类】获取豆瓣 {douban_id} 单集片长失败: {e}")
-        return 0.0
+        if not self._douban:
+            return 0.0
+        return self._douban.get_runtime(douban_id)
 
     @eventmanager.register(ChainEventType.TransferRenameBuild)
     def on_transfer_rename_build(self, event: Event):
@@ -934,33 +1123,12 @@ class shortdramacompilation(_PluginBase):
 
     def __get_duration(self, video_path: str) -> float:
         """
-        获取视频文件或 STRM 指向网络流的时长（分钟）
+        获取视频文件或 STRM 指向网络流的时长（分钟），优先命中探测缓存与容器头部解析
         """
         probe_target = self._resolve_probe_target(video_path)
-        if not probe_target:
+        if not probe_target or not self._prober:
             return 0.0
-
-        cmd = [
-            'ffprobe', '-v', 'error',
-            '-probesize', '1000000',
-            '-analyzeduration', '2000000',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            probe_target
-        ]
-        try:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output, error = process.communicate(timeout=30)
-            duration_str = output.decode('utf-8', errors='ignore').strip()
-            if duration_str:
-                duration_sec = float(duration_str)
-                return round(duration_sec / 60, 1)
-        except subprocess.TimeoutExpired:
-            logger.error(f"【短剧自动分类】ffprobe 探测超时 (30s): {probe_target}")
-        except Exception as e:
-            logger.error(f"【短剧自动分类】ffprobe 执行出错: {e}")
-
-        return 0.0
+        return self._prober.probe(probe_target)
 
     def __move_files(self, target_path: Path, dest_dir: str = None):
         """
@@ -981,38 +1149,42 @@ class shortdramacompilation(_PluginBase):
 
         new_path = category_dir_path / tv_path.name
 
-        if not new_path.exists():
-            try:
-                shutil.move(tv_path, new_path)
-            except Exception as e:
-                logger.error(f"【短剧自动分类】移动目录失败：{e}")
-                return
-        else:
-            for file in tv_path.iterdir():
-                if file.is_file():
-                    try:
-                        relative_path = file.relative_to(tv_path)
-                        dest_file = new_path / relative_path
-                        dest_file.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.move(file, dest_file)
-                    except Exception as e:
-                        logger.error(f"【短剧自动分类】移动文件失败：{e}")
-                        return
-            if not SystemUtils.list_files(tv_path, extensions=settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT):
-                try:
-                    shutil.rmtree(tv_path, ignore_errors=True)
-                except Exception as e:
-                    logger.error(f"【短剧自动分类】删除空目录失败：{e}")
+        try:
+            result = MoveEngine(max_workers=self._move_workers).move(tv_path, new_path)
+        except Exception as e:
+            logger.error(f"【短剧自动分类】移动目录失败：{e}")
+            return
+
+        summary = f"{result.files} 个文件"
+        if result.bytes:
+            summary += f"（{StringUtils.str_filesize(result.bytes)}）"
+        logger.info(
+            f"【短剧自动分类】《{tv_path.name}》移动完成 [{'同盘重命名' if result.mode == 'rename' else '跨盘复制'}]：{summary}，"
+            f"清理空目录 {result.removed_dirs} 个，失败 {len(result.failed)} 个"
+        )
 
         if self._notify:
+            text = f"已将短剧《{tv_path.name}》移动分类至 {category_dir_path} 目录，共 {summary}"
+            if result.failed:
+                text += f"，{len(result.failed)} 个文件移动失败"
             self.post_message(
                 mtype=NotificationType.Organize,
                 title="【短剧自动分类】",
-                text=f"已将短剧《{tv_path.name}》移动分类至 {category_dir_path} 目录",
+                text=text,
             )
 
     def stop_service(self):
         """
         停止服务
         """
-        pass
+        if self._stop_event:
+            self._stop_event.set()
+        if self._prober:
+            self._prober.close()
+            self._prober = None
+        if self._douban:
+            self._douban.close()
+            self._douban = None
+        if self._store:
+            self._store.close()
+            self._store = None
@@ -0,0 +1,136 @@
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import requests
+
+from app.log import logger
+
+_RUNTIME_RE = re.compile(r"单集片长:</span>\s*(\d+)分钟")
+# 单集片长位于页面信息区，读取超过该字节数仍未命中则放弃
+_MAX_PAGE_BYTES = 512 * 1024
+
+
+class DoubanRuntimeClient:
+    """
+    豆瓣单集片长查询客户端：
+    1. 复用 keep-alive 会话，全局限速；
+    2. 成功/失败结果分别按 TTL 缓存，避免同一剧集每集重复抓取；
+    3. 同一 douban_id 的并发请求合并为一次抓取。
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 1.5,
+        ttl: int = 7 * 86400,
+        negative_ttl: int = 6 * 3600,
+        error_ttl: int = 600,
+    ):
+        self._min_interval = min_interval
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._error_ttl = error_ttl
+        self._session = requests.Session()
+        self._session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"})
+        # douban_id -> (片长分钟数, 过期时间戳)
+        self._cache: Dict[str, Tuple[float, float]] = {}
+        self._cache_lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+
+    def close(self):
+        self._session.close()
+
+    def _get_cached(self, key: str) -> Optional[float]:
+        with self._cache_lock:
+            item = self._cache.get(key)
+            if not item:
+                return None
+            runtime, expire_at = item
+            if time.time() >= expire_at:
+                self._cache.pop(key, None)
+                return None
+            return runtime
+
+    def _wait_rate_limit(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self._min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _fetch(self, douban_id: str) -> Tuple[float, int]:
+        """
+        抓取豆瓣页面信息区，返回 (片长分钟数, 缓存秒数)
+        """
+        self._wait_rate_limit()
+        url = f"https://movie.douban.com/subject/{douban_id}/"
+        try:
+            with self._session.get(url, stream=True, timeout=(5, 8)) as resp:
+                if resp.status_code == 404:
+                    return 0.0, self._negative_ttl
+                if resp.status_code != 200:
+                    logger.debug(f"【短剧自动分类】获取豆瓣 {douban_id} 页面失败: HTTP {resp.status_code}")
+                    return 0.0, self._error_ttl
+                buf = b""
+                for chunk in resp.iter_content(chunk_size=16 * 1024):
+                    buf += chunk
+                    match = _RUNTIME_RE.search(buf.decode("utf-8", errors="ignore"))
+                    if match:
+                        return float(match.group(1)), self._ttl
+                    if len(buf) >= _MAX_PAGE_BYTES:
+                        break
+                return 0.0, self._negative_ttl
+        except Exception as e:
+            logger.debug(f"【短剧自动分类】获取豆瓣 {douban_id} 单集片长失败: {e}")
+            return 0.0, self._error_ttl
+
+    def get_runtime(self, douban_id: Union[int, str]) -> float:
+        """
+        获取单集片长（分钟），无记录或失败返回 0
+        """
+        if not douban_id:
+            return 0.0
+        key = str(douban_id)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not leader:
+            event.wait(timeout=30)
+            return self._get_cached(key) or 0.0
+
+        try:
+            runtime, ttl = self._fetch(key)
+            with self._cache_lock:
+                self._cache[key] = (runtime, time.time() + ttl)
+            return runtime
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def prefetch(self, douban_ids: Iterable[Union[int, str]], stop_event: Optional[threading.Event] = None) -> int:
+        """
+        批量预取未缓存的片长，返回实际抓取的数量
+        """
+        fetched = 0
+        for douban_id in dict.fromkeys(str(i) for i in douban_ids if i):
+            if stop_event and stop_event.is_set():
+                break
+            if self._get_cached(douban_id) is not None:
+                continue
+            self.get_runtime(douban_id)
+            fetched += 1
+        return fetched
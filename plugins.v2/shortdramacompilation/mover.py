@@ -0,0 +1,156 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+from app.log import logger
+
+
+@dataclass
+class MoveResult:
+    """
+    一次目录移动的汇总结果
+    """
+    mode: str = ""
+    files: int = 0
+    bytes: int = 0
+    failed: List[str] = field(default_factory=list)
+    removed_dirs: int = 0
+
+    @property
+    def success(self) -> bool:
+        return not self.failed
+
+
+def _device_of(path: Path) -> int:
+    """
+    获取路径所在设备号，路径不存在时向上查找最近的已存在目录
+    """
+    for p in [path, *path.parents]:
+        try:
+            return os.stat(p).st_dev
+        except OSError:
+            continue
+    return -1
+
+
+class MoveEngine:
+    """
+    目录移动引擎：
+    1. 同设备优先整目录原子重命名，目标已存在时逐项重命名（不存在的子目录整体重命名）；
+    2. 跨设备时按文件并发复制，校验大小后再删除源文件（bytes 仅统计跨设备复制量）；
+    3. 完成后仅清理被搬空的源目录。
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._max_workers = max(1, int(max_workers))
+
+    def move(self, src: Path, dest: Path) -> MoveResult:
+        result = MoveResult()
+        same_device = _device_of(src) == _device_of(dest.parent)
+        result.mode = "rename" if same_device else "copy"
+
+        if same_device and not dest.exists():
+            try:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                files = self._count_files(src)
+                os.rename(src, dest)
+                result.files = files
+                return result
+            except OSError as e:
+                logger.warning(f"【短剧自动分类】整目录重命名失败，改为逐项移动：{e}")
+
+        copy_jobs: List[Tuple[Path, Path, int]] = []
+        self._plan(src, dest, same_device, result, copy_jobs)
+        if copy_jobs:
+            self._copy_parallel(copy_jobs, result)
+        result.removed_dirs = self._remove_empty_dirs(src)
+        return result
+
+    @staticmethod
+    def _count_files(root: Path) -> int:
+        """
+        统计目录下文件数（仅列目录，不逐个 stat）
+        """
+        return sum(len(filenames) for _, _, filenames in os.walk(root))
+
+    def _plan(self, src: Path, dest: Path, same_device: bool, result: MoveResult,
+              copy_jobs: List[Tuple[Path, Path, int]]):
+        """
+        遍历源目录：同设备直接重命名，跨设备收集复制任务
+        """
+        dest.mkdir(parents=True, exist_ok=True)
+        with os.scandir(src) as it:
+            entries = list(it)
+        for entry in entries:
+            src_item = Path(entry.path)
+            dest_item = dest / entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if same_device and not dest_item.exists():
+                        files = self._count_files(src_item)
+                        os.rename(src_item, dest_item)
+                        result.files += files
+                    else:
+                        self._plan(src_item, dest_item, same_device, result, copy_jobs)
+                    continue
+                if same_device:
+                    os.replace(src_item, dest_item)
+                    result.files += 1
+                else:
+                    copy_jobs.append((src_item, dest_item, entry.stat(follow_symlinks=False).st_size))
+            except OSError as e:
+                logger.error(f"【短剧自动分类】移动失败 {src_item}：{e}")
+                result.failed.append(str(src_item))
+
+    def _copy_parallel(self, jobs: List[Tuple[Path, Path, int]], result: MoveResult):
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {executor.submit(self._copy_one, *job): job for job in jobs}
+            for future in as_completed(futures):
+                src_item, _, size = futures[future]
+                try:
+                    future.result()
+                    result.files += 1
+                    result.bytes += size
+                except Exception as e:
+                    logger.error(f"【短剧自动分类】跨设备复制失败 {src_item}：{e}")
+                    result.failed.append(str(src_item))
+
+    @staticmethod
+    def _copy_one(src_item: Path, dest_item: Path, size: int):
+        """
+        复制到临时文件，校验大小后替换目标并删除源文件
+        符号链接按链接本身复制（与 shutil.move 一致），大小按链接自身比较
+        """
+        tmp_item = dest_item.with_name(f".{dest_item.name}.moving")
+        try:
+            shutil.copy2(src_item, tmp_item, follow_symlinks=False)
+            copied = os.lstat(tmp_item).st_size
+            if copied != size:
+                raise IOError(f"大小校验失败 ({copied} != {size})")
+            os.replace(tmp_item, dest_item)
+        except Exception:
+            try:
+                os.unlink(tmp_item)
+            except OSError:
+                pass
+            raise
+        os.unlink(src_item)
+
+    @staticmethod
+    def _remove_empty_dirs(root: Path) -> int:
+        """
+        自底向上删除已被搬空的目录，返回删除数量
+        """
+        if not root.exists():
+            return 0
+        removed = 0
+        for dirpath, _, _ in sorted(os.walk(root), key=lambda x: x[0].count(os.sep), reverse=True):
+            try:
+                os.rmdir(dirpath)
+                removed += 1
+            except OSError:
+                continue
+        return removed
@@ -0,0 +1,424 @@
+import json
+import os
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from app.log import logger
+
+# 头部探测每次读取的字节数
+_HEADER_BYTES = 512 * 1024
+# moov 位于文件尾部时允许额外读取的最大字节数
+_MAX_MOOV_BYTES = 8 * 1024 * 1024
+# 探测失败结果的缓存有效期（秒），过期后允许重新探测
+_NEGATIVE_TTL = 3600
+# 缓存落盘的最小间隔（秒）
+_FLUSH_INTERVAL = 30
+# 缓存最大条目数，超出时淘汰最早探测的条目
+_MAX_CACHE_ENTRIES = 20000
+# 缓存条目最长保留时间（秒），文件被替换后旧的 路径+大小+修改时间 键不会再命中
+_CACHE_MAX_AGE = 180 * 86400
+
+_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+_MKV_EBML_HEADER = 0x1A45DFA3
+_MKV_SEGMENT = 0x18538067
+_MKV_INFO = 0x1549A966
+_MKV_TIMECODE_SCALE = 0x2AD7B1
+_MKV_DURATION = 0x4489
+
+
+def _read_vint(buf: bytes, pos: int, keep_marker: bool = False) -> Tuple[int, int]:
+    """
+    读取 EBML 变长整数，返回 (值, 占用字节数)
+    """
+    first = buf[pos]
+    length, mask = 1, 0x80
+    while length <= 8 and not (first & mask):
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError("invalid vint")
+    value = first if keep_marker else first & (mask - 1)
+    for i in range(1, length):
+        value = (value << 8) | buf[pos + i]
+    return value, length
+
+
+def _read_element_header(buf: bytes, pos: int) -> Tuple[int, Optional[int], int]:
+    """
+    读取 EBML 元素头，返回 (元素 ID, 数据长度, 头长度)
+    数据长度为"未知"（所有数值位均为 1）时返回 None
+    """
+    el_id, id_len = _read_vint(buf, pos, keep_marker=True)
+    el_size, size_len = _read_vint(buf, pos + id_len)
+    if el_size == (1 << (7 * size_len)) - 1:
+        el_size = None
+    return el_id, el_size, id_len + size_len
+
+
+def _parse_mkv_info(buf: bytes, start: int, end: int) -> float:
+    """
+    解析 Segment Info 元素内容中的 TimecodeScale 与 Duration，返回秒数（失败返回 0）
+    """
+    scale = 1000000
+    duration = 0.0
+    cur = start
+    while cur < end:
+        el_id, el_size, header = _read_element_header(buf, cur)
+        if el_size is None:
+            break
+        data_start = cur + header
+        data = buf[data_start:data_start + el_size]
+        if el_id == _MKV_TIMECODE_SCALE and data:
+            scale = int.from_bytes(data, "big")
+        elif el_id == _MKV_DURATION and len(data) in (4, 8):
+            duration = struct.unpack(">f" if len(data) == 4 else ">d", data)[0]
+        cur = data_start + el_size
+    return duration * scale / 1e9 if duration > 0 else 0.0
+
+
+def parse_mkv_duration(buf: bytes) -> float:
+    """
+    从 MKV/WebM 头部数据中解析 Segment Info 的 Duration，返回秒数（失败返回 0）
+    依次校验 EBML 头与 Segment，再按 ID/长度逐个跳过 Segment 的顶层子元素（SeekHead、Void 等）直至 Info
+    """
+    if not buf.startswith(_EBML_MAGIC):
+        return 0.0
+    try:
+        el_id, el_size, header = _read_element_header(buf, 0)
+        if el_id != _MKV_EBML_HEADER or el_size is None:
+            return 0.0
+        pos = header + el_size
+        el_id, _, header = _read_element_header(buf, pos)
+        if el_id != _MKV_SEGMENT:
+            return 0.0
+        pos += header
+        while pos < len(buf):
+            el_id, el_size, header = _read_element_header(buf, pos)
+            if el_id == _MKV_INFO:
+                if el_size is None:
+                    return 0.0
+                start = pos + header
+                return _parse_mkv_info(buf, start, min(start + el_size, len(buf)))
+            if el_size is None:
+                # 长度未知的元素（如直播流的 Cluster）无法跳过
+                return 0.0
+            pos += header + el_size
+    except (ValueError, IndexError, struct.error):
+        pass
+    return 0.0
+
+
+def _iter_mp4_boxes(buf: bytes, start: int, end: int):
+    """
+    遍历 MP4 box，产出 (类型, box 起始偏移, 头长度, box 总长度)
+    box 总长度可能超出 buf 范围，由调用方判断是否完整
+    """
+    pos = start
+    while pos + 8 <= end:
+        size = struct.unpack(">I", buf[pos:pos + 4])[0]
+        box_type = buf[pos + 4:pos + 8]
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack(">Q", buf[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos, header, size
+        pos += size
+
+
+def parse_mvhd_duration(moov: bytes) -> float:
+    """
+    从完整的 moov box 数据中解析 mvhd 时长，返回秒数（失败返回 0）
+    """
+    for box_type, pos, header, size in _iter_mp4_boxes(moov, 0, len(moov)):
+        if box_type == b"moov":
+            return parse_mvhd_duration(moov[pos + header:pos + size])
+        if box_type != b"mvhd":
+            continue
+        body = moov[pos + header:pos + size]
+        try:
+            if body[0] == 1:
+                timescale, duration = struct.unpack(">IQ", body[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", body[12:20])
+        except (IndexError, struct.error):
+            return 0.0
+        if timescale > 0 and duration > 0:
+            return duration / timescale
+        return 0.0
+    return 0.0
+
+
+def locate_mp4_moov(buf: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """
+    在 MP4 头部数据中定位 moov box，返回 (偏移, 长度)
+    moov 在头部数据之后时长度为 None；不是 MP4 或无法定位时返回 (None, None)
+    """
+    if len(buf) < 8 or buf[4:8] not in (b"ftyp", b"moov", b"free", b"skip", b"wide", b"mdat"):
+        return None, None
+    pos = 0
+    while pos + 16 <= len(buf):
+        size = struct.unpack(">I", buf[pos:pos + 4])[0]
+        box_type = buf[pos + 4:pos + 8]
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", buf[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            # box 延伸至文件末尾，其后不会再有 moov
+            return (pos, None) if box_type == b"moov" else (None, None)
+        if size < header:
+            return None, None
+        if box_type == b"moov":
+            return pos, size
+        pos += size
+    return pos, None
+
+
+class DurationProber:
+    """
+    视频时长探测服务：
+    1. 持久化缓存（本地文件按 路径+大小+修改时间，网络流按 URL）；
+    2. 容器头部解析（MP4 moov/mvhd、MKV Segment Info），仅读取少量字节；
+    3. 兜底 ffprobe，子进程并发受限。
+    """
+
+    STRATEGIES = ("cache", "header", "ffprobe")
+
+    def __init__(self, cache_file: Path, max_workers: int = 2):
+        self._cache_file = cache_file
+        self._max_workers = max(1, int(max_workers))
+        self._semaphore = threading.BoundedSemaphore(self._max_workers)
+        self._cache_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"})
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self._stats: Dict[str, Dict[str, float]] = {
+            s: {"calls": 0, "success": 0, "failed": 0, "total_ms": 0.0} for s in self.STRATEGIES
+        }
+        self._load()
+
+    def _load(self):
+        if not self._cache_file.exists():
+            return
+        try:
+            data = json.loads(self._cache_file.read_text(encoding="utf-8"))
+            self._cache = data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.error(f"【短剧自动分类】加载探测缓存失败: {e}")
+            self._cache = {}
+        with self._cache_lock:
+            self._dirty = self._prune_locked() > 0
+
+    def _prune_locked(self) -> int:
+        """
+        清理过期条目，并在超出上限时淘汰最早探测的条目（需持有 _cache_lock），返回清理数量
+        """
+        now = time.time()
+        before = len(self._cache)
+        self._cache = {
+            k: v for k, v in self._cache.items()
+            if isinstance(v, dict) and now - float(v.get("at") or 0) < (
+                _CACHE_MAX_AGE if float(v.get("duration") or 0) > 0 else _NEGATIVE_TTL
+            )
+        }
+        overflow = len(self._cache) - _MAX_CACHE_ENTRIES
+        if overflow > 0:
+            oldest = sorted(self._cache, key=lambda k: float(self._cache[k].get("at") or 0))[:overflow]
+            for k in oldest:
+                del self._cache[k]
+        return before - len(self._cache)
+
+    def flush(self, force: bool = False):
+        """
+        将探测缓存写回磁盘（节流，force 时立即写入），写入前清理过期及超量条目
+        """
+        with self._cache_lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_flush < _FLUSH_INTERVAL:
+                return
+            self._prune_locked()
+            snapshot = json.dumps(self._cache, ensure_ascii=False)
+            self._dirty = False
+            self._last_flush = time.time()
+        try:
+            tmp_file = self._cache_file.with_suffix(".tmp")
+            tmp_file.write_text(snapshot, encoding="utf-8")
+            os.replace(tmp_file, self._cache_file)
+        except Exception as e:
+            logger.error(f"【短剧自动分类】写入探测缓存失败: {e}")
+
+    def close(self):
+        self.flush(force=True)
+        self._session.close()
+
+    @staticmethod
+    def _is_url(target: str) -> bool:
+        return target.lower().startswith(("http://", "https://"))
+
+    def _cache_key(self, target: str) -> Optional[str]:
+        if self._is_url(target):
+            return target
+        try:
+            st = os.stat(target)
+        except OSError:
+            return None
+        return f"{target}|{st.st_size}|{st.st_mtime_ns}"
+
+    def _record(self, strategy: str, ok: bool, started: float):
+        with self._stats_lock:
+            stat = self._stats[strategy]
+            stat["calls"] += 1
+            stat["success" if ok else "failed"] += 1
+            stat["total_ms"] += (time.perf_counter() - started) * 1000
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        各探测策略的调用次数、成功/失败数与平均耗时
+        """
+        with self._stats_lock:
+            result = {}
+            for name, stat in self._stats.items():
+                calls = stat["calls"]
+                result[name] = {
+                    "calls": int(calls),
+                    "success": int(stat["success"]),
+                    "failed": int(stat["failed"]),
+                    "avg_ms": round(stat["total_ms"] / calls, 1) if calls else 0.0,
+                }
+        with self._cache_lock:
+            result["cache"]["size"] = len(self._cache)
+        return result
+
+    def probe(self, target: str) -> float:
+        """
+        探测视频时长，返回分钟数（失败返回 0）
+        """
+        if not target:
+            return 0.0
+        key = self._cache_key(target)
+
+        started = time.perf_counter()
+        if key:
+            with self._cache_lock:
+                item = self._cache.get(key)
+            if item:
+                duration = float(item.get("duration") or 0.0)
+                if duration > 0 or time.time() - float(item.get("at") or 0) < _NEGATIVE_TTL:
+                    self._record("cache", duration > 0, started)
+                    return duration
+
+        strategy = "header"
+        started = time.perf_counter()
+        seconds = self._probe_header(target)
+        self._record("header", seconds > 0, started)
+        if seconds <= 0:
+            strategy = "ffprobe"
+            started = time.perf_counter()
+            seconds = self._probe_ffprobe(target)
+            self._record("ffprobe", seconds > 0, started)
+
+        duration = round(seconds / 60, 1) if seconds > 0 else 0.0
+        if key:
+            with self._cache_lock:
+                self._cache[key] = {"duration": duration, "strategy": strategy, "at": int(time.time())}
+                self._dirty = True
+            self.flush()
+        return duration
+
+    def _read_range(self, target: str, start: int, length: int) -> bytes:
+        """
+        读取目标指定区间的字节，网络流使用 HTTP Range 请求
+        """
+        if not self._is_url(target):
+            with open(target, "rb") as f:
+                f.seek(start)
+                return f.read(length)
+        headers = {"Range": f"bytes={start}-{start + length - 1}"}
+        with self._session.get(target, headers=headers, stream=True, timeout=(5, 10)) as resp:
+            if resp.status_code not in (200, 206):
+                return b""
+            if start > 0 and resp.status_code != 206:
+                # 服务端不支持 Range，放弃读取以免下载整个文件
+                return b""
+            chunks = []
+            received = 0
+            for chunk in resp.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= length:
+                    break
+            return b"".join(chunks)[:length]
+
+    def _probe_header(self, target: str) -> float:
+        """
+        仅解析容器头部获取时长（秒），失败返回 0
+        """
+        try:
+            head = self._read_range(target, 0, _HEADER_BYTES)
+            if not head:
+                return 0.0
+            if head.startswith(_EBML_MAGIC):
+                return parse_mkv_duration(head)
+            offset, size = locate_mp4_moov(head)
+            if offset is None:
+                return 0.0
+            if size is not None and offset + size <= len(head):
+                return parse_mvhd_duration(head[offset:offset + size])
+            if size is None:
+                box_head = self._read_range(target, offset, 16)
+                if len(box_head) < 8 or box_head[4:8] != b"moov":
+                    return 0.0
+                size = struct.unpack(">I", box_head[:4])[0]
+                if size == 1 and len(box_head) >= 16:
+                    size = struct.unpack(">Q", box_head[8:16])[0]
+            if size <= 0 or size > _MAX_MOOV_BYTES:
+                return 0.0
+            return parse_mvhd_duration(self._read_range(target, offset, size))
+        except Exception as e:
+            logger.debug(f"【短剧自动分类】头部探测失败 {target}: {e}")
+        return 0.0
+
+    def _probe_ffprobe(self, target: str) -> float:
+        """
+        调用 ffprobe 获取时长（秒），并发数受信号量限制
+        """
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-probesize', '1000000',
+            '-analyzeduration', '2000000',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            target
+        ]
+        with self._semaphore:
+            try:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                try:
+                    output, _ = process.communicate(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.communicate()
+                    logger.error(f"【短剧自动分类】ffprobe 探测超时 (30s): {target}")
+                    return 0.0
+                duration_str = output.decode('utf-8', errors='ignore').strip()
+                if duration_str:
+                    return float(duration_str)
+            except Exception as e:
+                logger.error(f"【短剧自动分类】ffprobe 执行出错: {e}")
+        return 0.0
@@ -0,0 +1,194 @@
+import json
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.log import logger
+
+# 内存分片数量，降低分类线程之间的锁竞争
+_SHARDS = 16
+# 后台落盘间隔（秒）
+_FLUSH_INTERVAL = 2.0
+# 读穿透未命中占位
+_MISSING = object()
+
+
+class _Shard:
+    __slots__ = ("lock", "items", "dirty")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items: Dict[str, Any] = {}
+        self.dirty: Set[str] = set()
+
+
+class CacheStore:
+    """
+    短剧判定结果存储：SQLite(WAL) 持久化 + 分片内存读穿透 + 后台批量写回
+    """
+
+    def __init__(self, db_path: Path, legacy_json: Optional[Path] = None):
+        self._db_path = db_path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, anime_checked_at TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_anime_checked_at ON cache(anime_checked_at)")
+        self._conn.commit()
+        self._shards = [_Shard() for _ in range(_SHARDS)]
+        self._stop_event = threading.Event()
+        if legacy_json:
+            self._migrate_json(legacy_json)
+        self._writer = threading.Thread(target=self._writer_loop, name="shortdrama-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _migrate_json(self, legacy_json: Path):
+        """
+        首次启用时导入旧版 cache.json
+        """
+        if not legacy_json.exists():
+            return
+        with self._db_lock:
+            if self._conn.execute("SELECT 1 FROM cache LIMIT 1").fetchone():
+                return
+            try:
+                data = json.loads(legacy_json.read_text(encoding="utf-8")) or {}
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache(key, data, anime_checked_at) VALUES (?, ?, ?)",
+                    [
+                        (str(k), json.dumps(v, ensure_ascii=False), v.get("anime_checked_at"))
+                        for k, v in data.items() if isinstance(v, dict)
+                    ],
+                )
+                self._conn.commit()
+                logger.info(f"【短剧自动分类】已从 {legacy_json.name} 导入 {len(data)} 条缓存记录")
+            except Exception as e:
+                logger.error(f"【短剧自动分类】导入旧版缓存失败: {e}")
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[zlib.crc32(key.encode("utf-8")) % _SHARDS]
+
+    def _load(self, key: str) -> Any:
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM cache WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return _MISSING
+        try:
+            return json.loads(row[0])
+        except Exception:
+            return _MISSING
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存项（内存未命中时读穿透到 SQLite）
+        """
+        key = str(key)
+        shard = self._shard(key)
+        with shard.lock:
+            item = shard.items.get(key)
+        if item is None:
+            item = self._load(key)
+            with shard.lock:
+                # 加载期间可能已有写入，以内存为准
+                item = shard.items.setdefault(key, item)
+        return None if item is _MISSING else dict(item)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+    def update(self, key: Any, func: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        原子读改写单个缓存项：func 接收现有值（不存在为空字典），返回 None 表示不修改
+        """
+        key = str(key)
+        shard = self._shard(key)
+        current = self.get(key) or {}
+        with shard.lock:
+            item = shard.items.get(key)
+            if item is not None and item is not _MISSING:
+                current = dict(item)
+            new_value = func(current)
+            if new_value is None:
+                return None
+            shard.items[key] = dict(new_value)
+            shard.dirty.add(key)
+        return new_value
+
+    def put(self, key: Any, value: Dict[str, Any]):
+        self.update(key, lambda _: value)
+
+    def expired_anime_keys(self, checked_before: str, limit: int = 200) -> List[str]:
+        """
+        查询动画判定已过期（anime_checked_at 早于指定时间）的缓存键
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT key FROM cache WHERE anime_checked_at IS NULL OR anime_checked_at < ? "
+                "ORDER BY anime_checked_at LIMIT ?",
+                (checked_before, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def touch_anime_checked(self, key: Any, checked_at: str):
+        """
+        直接刷新数据库中的 anime_checked_at（用于内容为空或无法解析的记录，避免被反复取出）
+        """
+        with self._db_lock:
+            try:
+                self._conn.execute("UPDATE cache SET anime_checked_at = ? WHERE key = ?", (checked_at, str(key)))
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"【短剧自动分类】更新动画检查时间失败: {e}")
+
+    def flush(self):
+        """
+        将脏数据批量写入 SQLite；提交成功后才清除脏标记，失败的记录留待下次重试
+        """
+        rows = []
+        written: List[tuple] = []
+        for shard in self._shards:
+            with shard.lock:
+                for key in list(shard.dirty):
+                    item = shard.items.get(key)
+                    if item is None or item is _MISSING:
+                        shard.dirty.discard(key)
+                        continue
+                    rows.append((key, json.dumps(item, ensure_ascii=False), item.get("anime_checked_at")))
+                    written.append((shard, key, item))
+        if not rows:
+            return
+        with self._db_lock:
+            try:
+                self._conn.executemany(
+                    "INSERT INTO cache(key, data, anime_checked_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, anime_checked_at = excluded.anime_checked_at",
+                    rows,
+                )
+                self._conn.commit()
+            except Exception as e:
+                logger.error(f"【短剧自动分类】写入缓存数据库失败: {e}")
+                return
+        for shard, key, item in written:
+            with shard.lock:
+                # 写入期间被再次修改的记录保持脏标记
+                if shard.items.get(key) is item:
+                    shard.dirty.discard(key)
+
+    def _writer_loop(self):
+        # 聚合一个周期内的全部写入，批量提交
+        while not self._stop_event.wait(_FLUSH_INTERVAL):
+            self.flush()
+
+    def close(self):
+        self._stop_event.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()